@@ -0,0 +1,499 @@
+import math
+import re
+from array import array
+from datetime import date
+
+from staging import HAS_TARGET, QUARTERS, format_date_ordinal
+
+# Calendar periods /api/query can total rows by
+PERIODS = ('week', 'month', 'quarter')
+
+
+def previous_fiscal_year(fiscal_year):
+    # Same rule as the dashboard's String(parseInt(year) - 1)
+    match = re.match(r'\s*([+-]?\d+)', fiscal_year or '')
+    return str(int(match.group(1)) - 1) if match else None
+
+
+def build_aggregates(store, metric_groups, fiscal_year, category=None):
+    """Chart series for every (category, metric group) in one pass over the store.
+
+    Yearly series hold the per-year total of each metric; quarterly series hold
+    the cumulative value of each metric through the quarters of ``fiscal_year``
+    and of the year before, as the dashboard charts draw them.
+    """
+    previous_year = previous_fiscal_year(fiscal_year)
+    current_code = store.fiscal_years.code(fiscal_year)
+    previous_code = store.fiscal_years.code(previous_year) if previous_year else None
+    category_code = store.categories.code(category) if category is not None else None
+    if category is not None and category_code is None:
+        return {'fiscal_year': fiscal_year, 'previous_year': previous_year, 'categories': []}
+
+    fiscal_year_col = store.fiscal_year
+    quarter_col = store.quarter
+    category_col = store.category
+    metric_col = store.metric
+    value_col = store.value
+
+    # category code -> group name -> {'metrics': [metric codes], 'years': set(fy codes)}
+    layout = {}
+    group_of = {}    # (category, metric) codes -> entry in layout
+    yearly = {}      # (category, metric, fiscal_year) codes -> total
+    quarterly = {}   # (category, metric, fiscal_year, quarter) codes -> first matching position
+
+    for i in range(len(store)):
+        if not store.is_valid(i):
+            continue
+        cat = category_col[i]
+        if category_code is not None and cat != category_code:
+            continue
+        metric = metric_col[i]
+        fy = fiscal_year_col[i]
+
+        group = group_of.get((cat, metric))
+        if group is None:
+            groups = layout.setdefault(cat, {})
+            group_name = metric_groups.get(store.metrics[metric], 'Other')
+            group = groups.get(group_name)
+            if group is None:
+                group = groups[group_name] = {'metrics': [], 'years': set()}
+            group['metrics'].append(metric)
+            group_of[(cat, metric)] = group
+        group['years'].add(fy)
+
+        key = (cat, metric, fy)
+        yearly[key] = yearly.get(key, 0.0) + value_col[i]
+        if fy == current_code or fy == previous_code:
+            quarterly.setdefault(key + (quarter_col[i],), i)
+
+    quarter_codes = [(quarter, store.quarters.code(quarter)) for quarter in QUARTERS]
+
+    def quarter_series(cat, metric, fy, with_target):
+        series = []
+        cumulative = 0.0
+        if fy is None:
+            return series
+        for quarter, quarter_code in quarter_codes:
+            i = quarterly.get((cat, metric, fy, quarter_code))
+            if i is None:
+                continue
+            cumulative += value_col[i]
+            point = {'quarter': quarter, 'value': cumulative, 'quarterValue': value_col[i]}
+            if with_target:
+                point['target'] = store.get_target(i) or 0
+            series.append(point)
+        return series
+
+    categories = []
+    for cat, groups in layout.items():
+        group_list = []
+        for group_name, group in groups.items():
+            years = sorted(group['years'], key=lambda code: store.fiscal_years[code])
+            yearly_metrics = []
+            quarterly_metrics = []
+            for metric in group['metrics']:
+                name = store.metrics[metric]
+                yearly_metrics.append({
+                    'metric': name,
+                    'values': [{'year': store.fiscal_years[fy], 'value': yearly.get((cat, metric, fy), 0.0)}
+                               for fy in years],
+                })
+                quarterly_metrics.append({
+                    'metric': name,
+                    'currentYear': quarter_series(cat, metric, current_code, True),
+                    'previousYear': quarter_series(cat, metric, previous_code, False),
+                })
+            group_list.append({
+                'group': group_name,
+                'yearly': {'metrics': yearly_metrics},
+                'quarterly': {'metrics': quarterly_metrics},
+            })
+        categories.append({'category': store.categories[cat], 'groups': group_list})
+
+    return {'fiscal_year': fiscal_year, 'previous_year': previous_year, 'categories': categories}
+
+
+def js_round(number):
+    # Math.round semantics: halves round towards +infinity
+    return int(math.floor(number + 0.5))
+
+
+def build_scorecards(store, metric_groups):
+    """Category scorecards for every fiscal year in one pass over the store.
+
+    Each metric row of the year is scored against the previous year's value of
+    the same metric plus 5% (capped at 100%), averaged per metric group, and the
+    groups are weighted equally into a 0-100 score. The trend compares the
+    category total with the previous year's total.
+    """
+    totals = {}          # (category, fiscal_year) codes -> sum of values
+    group_rows = {}      # (category, group, fiscal_year) -> [(metric, value)] in sheet order
+    first_values = {}    # (category, group, fiscal_year, metric) -> first value seen
+    groups_of = {}       # category code -> list of group names in order of appearance
+
+    for i in range(len(store)):
+        if not store.is_valid(i):
+            continue
+        cat = store.category[i]
+        fy = store.fiscal_year[i]
+        metric = store.metric[i]
+        value = store.value[i]
+        group = metric_groups.get(store.metrics[metric], 'Other')
+
+        totals[(cat, fy)] = totals.get((cat, fy), 0.0) + value
+        groups = groups_of.setdefault(cat, [])
+        if group not in groups:
+            groups.append(group)
+        group_rows.setdefault((cat, group, fy), []).append((metric, value))
+        first_values.setdefault((cat, group, fy, metric), value)
+
+    scorecards = {}
+    for fiscal_year in store.distinct_fiscal_years():
+        fy = store.fiscal_years.code(fiscal_year)
+        previous_year = previous_fiscal_year(fiscal_year)
+        prev = store.fiscal_years.code(previous_year) if previous_year else None
+
+        cards = {}
+        for cat, groups in groups_of.items():
+            weight_per_group = 100 / len(groups)
+            score = 0.0
+            for group in groups:
+                rows = group_rows.get((cat, group, fy), ())
+                achievement = 0.0
+                for metric, value in rows:
+                    previous_value = first_values.get((cat, group, prev, metric), 0) if prev is not None else 0
+                    target = previous_value * 1.05 if previous_value > 0 else 0.05
+                    achievement += min(value / target, 1)
+                if rows:
+                    score += achievement / len(rows) * weight_per_group
+
+            current_total = totals.get((cat, fy), 0.0)
+            previous_total = totals.get((cat, prev), 0.0) if prev is not None else 0.0
+            trend = None
+            if previous_total > 0:
+                trend = js_round((current_total - previous_total) / previous_total * 100)
+
+            cards[store.categories[cat]] = {'score': js_round(score), 'trend': trend}
+        scorecards[fiscal_year] = cards
+
+    return scorecards
+
+
+def period_bounds(ordinal, interval):
+    """First and last day (ordinals) of the week (Monday first), month or quarter holding ``ordinal``."""
+    if interval == 'week':
+        first = ordinal - (ordinal - 1) % 7
+        return first, first + 6
+    day = date.fromordinal(ordinal)
+    months = 1 if interval == 'month' else 3
+    month = (day.month - 1) // months * months + 1
+    following = date(day.year + (month + months - 1) // 12, (month + months - 1) % 12 + 1, 1)
+    return date(day.year, month, 1).toordinal(), following.toordinal() - 1
+
+
+def aggregate_periods(store, positions, interval):
+    """Value and target totals of the rows at ``positions`` per (category, metric) and period.
+
+    A row counts towards the period holding its end_date, the day its value
+    is reported for. Series are sorted by category and metric and their
+    points by period; a point's target is None when none of its rows has one.
+    """
+    category, metric, end_date = store.category, store.metric, store.end_date
+    value, target, flags = store.value, store.target, store.flags
+    bounds = {}   # end_date ordinal -> period bounds
+    totals = {}   # (category, metric) codes -> {period bounds: [value, target, has target, rows]}
+    for i in positions:
+        ordinal = end_date[i]
+        if not ordinal:
+            continue
+        period = bounds.get(ordinal)
+        if period is None:
+            period = bounds[ordinal] = period_bounds(ordinal, interval)
+        points = totals.setdefault((category[i], metric[i]), {})
+        point = points.get(period)
+        if point is None:
+            point = points[period] = [0.0, 0.0, False, 0]
+        point[0] += value[i]
+        if flags[i] & HAS_TARGET:
+            point[1] += target[i]
+            point[2] = True
+        point[3] += 1
+
+    series = []
+    for (cat, met), points in totals.items():
+        series.append({
+            'category': store.categories[cat],
+            'metric': store.metrics[met],
+            'points': [{'start': format_date_ordinal(first), 'end': format_date_ordinal(last),
+                        'value': total, 'target': target_total if has_target else None, 'rows': rows}
+                       for (first, last), (total, target_total, has_target, rows) in sorted(points.items())],
+        })
+    series.sort(key=lambda entry: (entry['category'], entry['metric']))
+    return series
+
+
+class Rollups:
+    """Chart and scorecard tables kept up to date as StagingStore rows change.
+
+    Built with one pass over a store (``from_store``), which then reports every
+    append, value change and delete here, so a write only recomputes the
+    (category, metric, fiscal year) entries it touched. ``aggregates`` and
+    ``scorecards`` are read from these tables and return what
+    ``build_aggregates`` and ``build_scorecards`` compute from the rows;
+    ``check_rollups`` compares the two.
+
+    Rows are told apart by a sequence number in store order which, unlike
+    their position, survives deletes.
+    """
+
+    def __init__(self):
+        self.sequence = array('Q')  # store position -> sequence number
+        self.next_sequence = 0
+        self.year_rows = {}     # fiscal_year code -> number of rows, valid or not
+        self.cells = {}         # (category, metric, fiscal_year) codes -> quarter code -> {sequence: (value, target)}
+        self.yearly = {}        # (category, metric, fiscal_year) -> total of its values in store order
+        self.first = {}         # (category, metric, fiscal_year) -> (sequence, value) of its first row
+        self.counts = {}        # (category, metric, fiscal_year) -> number of rows
+        self.achievement = {}   # (category, metric, fiscal_year) -> summed scorecard achievement of its rows
+        self.pair_years = {}    # (category, metric) -> fiscal_year codes with rows
+        self.pair_first = {}    # (category, metric) -> sequence of its first row
+
+    @classmethod
+    def from_store(cls, store):
+        """Build the tables for ``store`` and attach them so its changes keep them current."""
+        rollups = cls()
+        keys = set()
+        for i in range(len(store)):
+            rollups.sequence.append(rollups.next_sequence)
+            rollups.next_sequence += 1
+            keys.add(rollups._count(store, i, 1))
+        keys.discard(None)
+        rollups._refresh(store, keys)
+        store.rollups = rollups
+        return rollups
+
+    def insert(self, store, i):
+        # Row ``i`` was just appended to the store
+        self.sequence.append(self.next_sequence)
+        self.next_sequence += 1
+        self._refresh(store, {self._count(store, i, 1)} - {None})
+
+    def remove(self, store, positions):
+        # Take rows out before their values change; ``restore`` puts them back afterwards
+        self._refresh(store, {self._count(store, i, -1) for i in positions} - {None})
+
+    def restore(self, store, positions):
+        self._refresh(store, {self._count(store, i, 1) for i in positions} - {None})
+
+    def delete(self, store, positions):
+        # Rows about to be dropped from the store
+        dead = set(positions)
+        self.remove(store, dead)
+        self.sequence = array('Q', (sequence for i, sequence in enumerate(self.sequence) if i not in dead))
+
+    def _count(self, store, i, sign):
+        # Add (sign 1) or take out (sign -1) row i; returns its key when the row is charted
+        fy = store.fiscal_year[i]
+        rows = self.year_rows.get(fy, 0) + sign
+        if rows:
+            self.year_rows[fy] = rows
+        else:
+            del self.year_rows[fy]
+        if not store.is_valid(i):
+            return None
+
+        key = (store.category[i], store.metric[i], fy)
+        quarter = store.quarter[i]
+        quarters = self.cells.setdefault(key, {})
+        entries = quarters.setdefault(quarter, {})
+        if sign > 0:
+            entries[self.sequence[i]] = (store.value[i], store.get_target(i))
+        else:
+            del entries[self.sequence[i]]
+            if not entries:
+                del quarters[quarter]
+            if not quarters:
+                del self.cells[key]
+        return key
+
+    def _refresh(self, store, keys):
+        # Recompute the entries of ``keys``, then the achievement that depends on them
+        pairs = set()
+        for key in keys:
+            pair = key[:2]
+            pairs.add(pair)
+            quarters = self.cells.get(key)
+            years = self.pair_years.setdefault(pair, set())
+            if quarters is None:
+                for table in (self.yearly, self.first, self.counts, self.achievement):
+                    table.pop(key, None)
+                years.discard(key[2])
+                continue
+            rows = sorted(row for entries in quarters.values() for row in entries.items())
+            total = 0.0
+            for _, (value, _) in rows:
+                total += value
+            self.yearly[key] = total
+            self.counts[key] = len(rows)
+            self.first[key] = (rows[0][0], rows[0][1][0])
+            years.add(key[2])
+
+        for pair in pairs:
+            years = self.pair_years[pair]
+            if not years:
+                del self.pair_years[pair]
+                self.pair_first.pop(pair, None)
+                continue
+            self.pair_first[pair] = min(self.first[pair + (fy,)][0] for fy in years)
+
+        # A metric's first value in one year is the baseline of its achievement in the next
+        stale = set()
+        for key in keys:
+            stale.add(key)
+            name = store.fiscal_years[key[2]]
+            for fy in self.pair_years.get(key[:2], ()):
+                if previous_fiscal_year(store.fiscal_years[fy]) == name:
+                    stale.add(key[:2] + (fy,))
+        for key in stale:
+            if key in self.cells:
+                self.achievement[key] = self._achievement(store, key)
+
+    def _achievement(self, store, key):
+        cat, metric, fy = key
+        previous_year = previous_fiscal_year(store.fiscal_years[fy])
+        prev = store.fiscal_years.code(previous_year) if previous_year else None
+        previous_value = self.first[(cat, metric, prev)][1] if (cat, metric, prev) in self.first else 0
+        target = previous_value * 1.05 if previous_value > 0 else 0.05
+        rows = sorted(row for entries in self.cells[key].values() for row in entries.items())
+        achievement = 0.0
+        for _, (value, _) in rows:
+            achievement += min(value / target, 1)
+        return achievement
+
+    def fiscal_years(self, store):
+        """Same as ``store.distinct_fiscal_years()`` without reading the column."""
+        present = set(store.fiscal_years[code] for code in self.year_rows)
+        present.discard('None')
+        present.discard('')
+        return sorted(present)
+
+    def _layout(self, store, metric_groups, category_code=None):
+        # category code -> group name -> metric codes, each in order of first appearance
+        layout = {}
+        for cat, metric in sorted(self.pair_first, key=self.pair_first.get):
+            if category_code is not None and cat != category_code:
+                continue
+            group_name = metric_groups.get(store.metrics[metric], 'Other')
+            layout.setdefault(cat, {}).setdefault(group_name, []).append(metric)
+        return layout
+
+    def aggregates(self, store, metric_groups, fiscal_year, category=None):
+        """``build_aggregates`` from the tables."""
+        previous_year = previous_fiscal_year(fiscal_year)
+        current_code = store.fiscal_years.code(fiscal_year)
+        previous_code = store.fiscal_years.code(previous_year) if previous_year else None
+        category_code = store.categories.code(category) if category is not None else None
+        if category is not None and category_code is None:
+            return {'fiscal_year': fiscal_year, 'previous_year': previous_year, 'categories': []}
+
+        quarter_codes = [(quarter, store.quarters.code(quarter)) for quarter in QUARTERS]
+
+        def quarter_series(cat, metric, fy, with_target):
+            series = []
+            cumulative = 0.0
+            quarters = self.cells.get((cat, metric, fy)) if fy is not None else None
+            if not quarters:
+                return series
+            for quarter, quarter_code in quarter_codes:
+                entries = quarters.get(quarter_code)
+                if not entries:
+                    continue
+                value, target = entries[min(entries)]
+                cumulative += value
+                point = {'quarter': quarter, 'value': cumulative, 'quarterValue': value}
+                if with_target:
+                    point['target'] = target or 0
+                series.append(point)
+            return series
+
+        categories = []
+        for cat, groups in self._layout(store, metric_groups, category_code).items():
+            group_list = []
+            for group_name, metrics in groups.items():
+                years = set()
+                for metric in metrics:
+                    years.update(self.pair_years[(cat, metric)])
+                years = sorted(years, key=lambda code: store.fiscal_years[code])
+                yearly_metrics = []
+                quarterly_metrics = []
+                for metric in metrics:
+                    name = store.metrics[metric]
+                    yearly_metrics.append({
+                        'metric': name,
+                        'values': [{'year': store.fiscal_years[fy], 'value': self.yearly.get((cat, metric, fy), 0.0)}
+                                   for fy in years],
+                    })
+                    quarterly_metrics.append({
+                        'metric': name,
+                        'currentYear': quarter_series(cat, metric, current_code, True),
+                        'previousYear': quarter_series(cat, metric, previous_code, False),
+                    })
+                group_list.append({
+                    'group': group_name,
+                    'yearly': {'metrics': yearly_metrics},
+                    'quarterly': {'metrics': quarterly_metrics},
+                })
+            categories.append({'category': store.categories[cat], 'groups': group_list})
+
+        return {'fiscal_year': fiscal_year, 'previous_year': previous_year, 'categories': categories}
+
+    def scorecards(self, store, metric_groups):
+        """``build_scorecards`` from the tables."""
+        layout = self._layout(store, metric_groups)
+        scorecards = {}
+        for fiscal_year in self.fiscal_years(store):
+            fy = store.fiscal_years.code(fiscal_year)
+            previous_year = previous_fiscal_year(fiscal_year)
+            prev = store.fiscal_years.code(previous_year) if previous_year else None
+
+            cards = {}
+            for cat, groups in layout.items():
+                weight_per_group = 100 / len(groups)
+                score = 0.0
+                current_total = 0.0
+                previous_total = 0.0
+                for metrics in groups.values():
+                    rows = 0
+                    achievement = 0.0
+                    for metric in metrics:
+                        rows += self.counts.get((cat, metric, fy), 0)
+                        achievement += self.achievement.get((cat, metric, fy), 0.0)
+                        current_total += self.yearly.get((cat, metric, fy), 0.0)
+                        if prev is not None:
+                            previous_total += self.yearly.get((cat, metric, prev), 0.0)
+                    if rows:
+                        score += achievement / rows * weight_per_group
+
+                trend = None
+                if previous_total > 0:
+                    trend = js_round((current_total - previous_total) / previous_total * 100)
+                cards[store.categories[cat]] = {'score': js_round(score), 'trend': trend}
+            scorecards[fiscal_year] = cards
+
+        return scorecards
+
+
+def check_rollups(store, metric_groups, rollups):
+    """Where ``rollups`` disagree with a full recompute from the rows of ``store``; empty when they agree."""
+    problems = []
+    if rollups.fiscal_years(store) != store.distinct_fiscal_years():
+        problems.append(f"fiscal years: {rollups.fiscal_years(store)} != {store.distinct_fiscal_years()}")
+    for fiscal_year in store.distinct_fiscal_years():
+        if rollups.aggregates(store, metric_groups, fiscal_year) != build_aggregates(store, metric_groups, fiscal_year):
+            problems.append(f"aggregates for {fiscal_year} differ")
+    expected = build_scorecards(store, metric_groups)
+    actual = rollups.scorecards(store, metric_groups)
+    for fiscal_year in sorted(set(expected) | set(actual)):
+        if actual.get(fiscal_year) != expected.get(fiscal_year):
+            problems.append(f"scorecards for {fiscal_year}: {actual.get(fiscal_year)} != {expected.get(fiscal_year)}")
+    return problems
@@ -1,18 +1,37 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+import click
+from flask import Flask, Response, render_template, request, jsonify, redirect, send_file, url_for, flash
+from flask.json.provider import DefaultJSONProvider
 from flask_wtf import FlaskForm
 from flask_wtf.csrf import CSRFProtect
 # from wtforms import SelectField, DateField, FloatField, SubmitField
 #from wtforms.validators import DataRequired
-import openpyxl
 from datetime import datetime
 import os
-from azure.storage.blob import BlobServiceClient
-import io
-import openpyxl
+import json
+import hashlib
+import zlib
 from dotenv import load_dotenv
+from staging import COMPLETE, DATE_COLUMNS, StagingStore, format_date_ordinal, parse_date_ordinal
+from xlsx_reader import LazyWorkbook
+from analytics import PERIODS, Rollups, aggregate_periods, check_rollups
+from writer import WriteConflict, WriteQueue
+from journal import Journal, StorageSegment
+from partitions import PartitionedStorage, PartitionedWorkbook, partition_prefix
+from changes import ChangeFeed, change_from_record, format_event
+from importer import UploadError, read_upload, validate_rows
+from reports import FORMATS as REPORT_FORMATS, ReportJobs, summary_rows
+from storage import AzureBlobStorage, LocalStorage, PreconditionFailed
+from snapshot import SnapshotCache
+from telemetry import Telemetry
 import secrets
 import os
 import logging
+import tempfile
+import threading
+import time
+
+# Start of this process, or of the gunicorn master it was forked from
+STARTED_AT = time.monotonic()
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -20,101 +39,952 @@ logger = logging.getLogger(__name__)
 
 connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
 container_name = os.getenv('AZURE_CONTAINER_NAME')
-blob_name = os.getenv('AZURE_BLOB_NAME')
+blob_name = os.getenv('AZURE_BLOB_NAME', 'CareerCenterMetrics.xlsx')
+
+# Where the workbook lives: 'azure' (default) or 'local' to keep it and its
+# journal as files under WORKBOOK_STORAGE_PATH, for running without Azure.
+WORKBOOK_STORAGE = os.getenv('WORKBOOK_STORAGE', 'azure').lower()
+WORKBOOK_STORAGE_PATH = os.getenv('WORKBOOK_STORAGE_PATH', os.path.dirname(os.path.abspath(__file__)))
+# Connections kept open to Azure per process
+AZURE_POOL_SIZE = int(os.getenv('AZURE_POOL_SIZE', '16'))
+# Workbook downloads are split into ranges of this many bytes, fetched this many at a time
+AZURE_DOWNLOAD_CHUNK_SIZE = int(os.getenv('AZURE_DOWNLOAD_CHUNK_SIZE', str(4 * 1024 * 1024)))
+AZURE_DOWNLOAD_CONCURRENCY = int(os.getenv('AZURE_DOWNLOAD_CONCURRENCY', '4'))
+
+# 'workbook' keeps everything in AZURE_BLOB_NAME; 'partitioned' keeps StagingData as one blob per
+# fiscal year plus a MetricsAndCategories blob under the blob name's stem (see `flask split-workbook`)
+WORKBOOK_LAYOUT = os.getenv('WORKBOOK_LAYOUT', 'workbook').lower()
+
+# How long (in seconds) a cached workbook is served without asking Azure whether
+# the blob changed. Set to 0 to check the ETag on every request.
+WORKBOOK_CACHE_MAX_STALENESS = float(os.getenv('WORKBOOK_CACHE_MAX_STALENESS', '5'))
+# Once the staleness window has passed, keep serving the cached workbook while a background
+# thread checks the ETag and downloads and parses a changed workbook. Set to 0 to do it inline.
+WORKBOOK_PREFETCH = os.getenv('WORKBOOK_PREFETCH', '1') == '1'
+# Each workbook version is turned once into a columnar snapshot here and mmapped by
+# every worker on the host. Set to an empty value to have each worker parse its own copy.
+WORKBOOK_SNAPSHOT_DIR = os.getenv('WORKBOOK_SNAPSHOT_DIR',
+                                  os.path.join(tempfile.gettempdir(), 'careercenter-snapshots'))
+
+# Form submissions arriving within this many seconds are written in one upload
+WRITE_BATCH_WINDOW = float(os.getenv('WRITE_BATCH_WINDOW', '0.05'))
+WRITE_MAX_RETRIES = int(os.getenv('WRITE_MAX_RETRIES', '3'))
+WRITE_TIMEOUT = float(os.getenv('WRITE_TIMEOUT', '60'))
+
+# Journal mode: 'blob' appends form submissions to an append blob next to the
+# workbook (in the same storage), 'file' to local files under WORKBOOK_JOURNAL_PATH.
+# Unset keeps rewriting the whole workbook on every submission.
+WORKBOOK_JOURNAL = os.getenv('WORKBOOK_JOURNAL', '').lower()
+WORKBOOK_JOURNAL_PATH = os.getenv('WORKBOOK_JOURNAL_PATH', 'journal')
+# Fold the journal into the workbook once this many records sit on top of the snapshot
+JOURNAL_COMPACT_RECORDS = int(os.getenv('JOURNAL_COMPACT_RECORDS', '500'))
+
+# /api/changes connections are closed after this many seconds (browsers reconnect and resume)
+CHANGES_STREAM_SECONDS = float(os.getenv('CHANGES_STREAM_SECONDS', '300'))
+CHANGES_KEEPALIVE_SECONDS = 15
+
+# Report exports are written by this many pool processes into REPORTS_DIR, one file per workbook version
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORTS_DIR = os.getenv('REPORTS_DIR', os.path.join(tempfile.gettempdir(), 'careercenter-reports'))
+
+# Requests slower than this many seconds are logged with their phase breakdown; 0 turns the log off
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '0'))
+
+telemetry = Telemetry()
+# Derived workbook values that come from parsing a sheet; every other build is a scan of the store
+PARSE_PHASES = {'staging', 'metrics_and_categories'}
+
+
+def make_storage():
+    if WORKBOOK_STORAGE == 'local':
+        return LocalStorage(WORKBOOK_STORAGE_PATH)
+    return AzureBlobStorage(connection_string, container_name, pool_size=AZURE_POOL_SIZE,
+                            chunk_size=AZURE_DOWNLOAD_CHUNK_SIZE, concurrency=AZURE_DOWNLOAD_CONCURRENCY)
+
+
+storage = make_storage()
+
+
+def workbook_from_blob(blob):
+    # Reads stream the sheets they need out of the raw bytes; openpyxl parses everything only for writes
+    return LazyWorkbook(blob.data)
+
+
+partitions = None
+if WORKBOOK_LAYOUT == 'partitioned':
+    partitions = PartitionedStorage(storage, partition_prefix(blob_name))
+# Partitions are cached per year in memory instead; snapshots cover the single-workbook layout only
+snapshots = SnapshotCache(WORKBOOK_SNAPSHOT_DIR) if WORKBOOK_SNAPSHOT_DIR and partitions is None else None
 
-def load_workbook():
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    container_client = blob_service_client.get_container_client(container_name)
-    blob_client = container_client.get_blob_client(blob_name)
-    
-    download_stream = blob_client.download_blob()
-    file_stream = io.BytesIO()
-    download_stream.readinto(file_stream)
-    file_stream.seek(0)
-    return openpyxl.load_workbook(file_stream, data_only=True)
 
+def fetch_workbook(etag):
+    """The stored workbook unless its ETag is still ``etag`` (then None).
 
-def save_workbook(wb):
-    blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-    container_client = blob_service_client.get_container_client(container_name)
-    blob_client = container_client.get_blob_client(blob_name)
+    Returns (blob, wb, derived values already built for that version). With
+    snapshots only the first worker to see a version downloads and parses
+    it; the others map the snapshot it wrote. Partitioned, only the years
+    whose blob changed are downloaded.
+    """
+    if partitions is not None:
+        fetched = partitions.fetch(etag)
+        if fetched is None:
+            return None
+        blob, wb = fetched
+        return blob, wb, {}
     
-    # Save workbook to a bytes stream
-    file_stream = io.BytesIO()
-    wb.save(file_stream)
-    file_stream.seek(0)
+    if snapshots is None:
+        blob = storage.get_if_changed(blob_name, etag)
+        if blob is None:
+            return None
+        return blob, workbook_from_blob(blob), {}
     
-    # Upload the bytes stream to Azure Storage
-    blob_client.upload_blob(file_stream, overwrite=True)
+    properties = storage.properties(blob_name)
+    if properties.etag == etag:
+        return None
+    snapshot = snapshots.get_or_build(properties.etag, build_snapshot)
+    with telemetry.phase('parse'):
+        Rollups.from_store(snapshot.store)
+    categories_and_metrics, metric_groups = snapshot.extra['metrics_and_categories']
+    derived = {'staging': snapshot.store, 'metrics_and_categories': (categories_and_metrics, metric_groups)}
+    return snapshot, workbook_from_blob(snapshot), derived
+
+
+def build_snapshot():
+    blob = storage.get(blob_name)
+    wb = workbook_from_blob(blob)
+    with telemetry.phase('parse'):
+        store = read_staging_store(wb)
+        metrics_and_categories = build_metrics_and_categories(wb)
+    return blob, store, {'metrics_and_categories': metrics_and_categories}
+
+
+def share_snapshot(blob, data):
+    # Let the other workers map the version this one just uploaded instead of downloading it
+    # Runs on the writer thread, the only one changing the store, so it is written outside the lock
+    with workbook_cache.lock:
+        store = workbook_cache.derived.get('staging')
+        metrics_and_categories = workbook_cache.derived.get('metrics_and_categories')
+    if snapshots is None or store is None or metrics_and_categories is None:
+        return
+    try:
+        snapshots.write(blob.etag, blob.last_modified, blob.metadata, store,
+                        {'metrics_and_categories': metrics_and_categories}, data)
+    except Exception:
+        logger.exception("Could not write workbook snapshot")
+
+
+def make_journal():
+    if WORKBOOK_JOURNAL and partitions is not None:
+        raise RuntimeError("WORKBOOK_JOURNAL cannot be combined with WORKBOOK_LAYOUT=partitioned")
+    if WORKBOOK_JOURNAL == 'file':
+        journal_storage = LocalStorage(WORKBOOK_JOURNAL_PATH)
+        return Journal(lambda generation: StorageSegment(journal_storage, f"{blob_name}.{generation}.jsonl"))
+    if WORKBOOK_JOURNAL == 'blob':
+        return Journal(lambda generation: StorageSegment(storage, f"{blob_name}.journal.{generation}"))
+    return None
+
+
+class WorkbookCache:
+    """Process-wide cache of the parsed workbook, keyed on the blob ETag.
+
+    The blob properties are checked at most once every ``max_staleness``
+    seconds; the workbook is downloaded and parsed again only when the ETag
+    differs from the cached one.
+
+    With ``prefetch`` the check runs on a background thread once the window
+    has passed: reads keep getting the cached workbook until a changed one
+    has been downloaded and the values in ``warm`` built from it. A failed
+    prefetch makes the next read check inline again.
+
+    In journal mode the records appended after the snapshot's journal position
+    (kept in the blob metadata) are replayed on top of it through
+    ``apply_journal`` and re-read on the same staleness schedule.
+
+    The writer edits the cached workbook and store in place before uploading
+    them. ``begin_write`` marks that window: until ``put`` commits the edits
+    or ``invalidate`` drops them, ``data_version`` carries a token no other
+    state ever has, so an ETag handed out for uncommitted rows never matches
+    again.
+    """
+
+    def __init__(self, max_staleness, prefetch=False):
+        self.max_staleness = max_staleness
+        self.prefetch = prefetch and max_staleness > 0
+        self.warm = {}
+        self.prefetching = False
+        self.prefetch_failed = False
+        self.prefetches = 0
+        self.on_reload = None
+        self.lock = threading.RLock()
+        self.workbook = None
+        self.version = None
+        self.last_modified = None
+        self.metadata = {}
+        self.checked_at = 0.0
+        self.derived = {}
+        self.building = 0
+        self.write_token = None
+        self.hits = 0
+        self.misses = 0
+
+        self.journal = None
+        self.apply_journal = None
+        self.journal_position = None
+        self.journal_records = 0
+        self.journal_checked_at = 0.0
+
+    def _refresh(self):
+        # Caller must hold self.lock
+        now = time.monotonic()
+        # While a derived value is being built, nested lookups stay on the same version
+        if self.building:
+            return self.workbook
+        if self.workbook is not None and now - self.checked_at < self.max_staleness:
+            self.hits += 1
+        elif self.workbook is not None and self.prefetch and not self.prefetch_failed:
+            self.hits += 1
+            self._start_prefetch()
+        else:
+            # Downloads only when the ETag moved on; otherwise just confirms it
+            with telemetry.phase('download'):
+                fetched = fetch_workbook(self.version if self.workbook is not None else None)
+            if fetched is None:
+                self.checked_at = now
+                self.hits += 1
+            else:
+                blob, self.workbook, self.derived = fetched
+                self.misses += 1
+                self.version = blob.etag
+                self.last_modified = blob.last_modified
+                self.metadata = blob.metadata
+                self.checked_at = now
+                self.journal_position = None
+                self._reloaded()
+            self.prefetch_failed = False
+
+        if self.journal is not None:
+            self._sync_journal(now)
+        return self.workbook
+
+    def _start_prefetch(self):
+        # Caller must hold self.lock
+        if self.prefetching:
+            return
+        self.prefetching = True
+        threading.Thread(target=self._prefetch, args=(self.version,), name='workbook-prefetch',
+                         daemon=True).start()
+
+    def _prefetch(self, version):
+        try:
+            with telemetry.phase('download'):
+                fetched = fetch_workbook(version)
+            if fetched is not None:
+                blob, wb, derived = fetched
+                # Parse outside the lock so readers keep being served meanwhile
+                for key, build in self.warm.items():
+                    if key not in derived:
+                        with telemetry.phase('parse'):
+                            derived[key] = build(wb)
+            with self.lock:
+                # Someone else (a write or an inline refresh) moved on: nothing to install
+                if self.version == version and not self.building:
+                    if fetched is not None:
+                        self.misses += 1
+                        self.prefetches += 1
+                        self.workbook = wb
+                        self.version = blob.etag
+                        self.last_modified = blob.last_modified
+                        self.metadata = blob.metadata
+                        self.derived = derived
+                        self.journal_position = None
+                        self._reloaded()
+                    self.checked_at = time.monotonic()
+        except Exception:
+            logger.exception("Workbook prefetch failed")
+            with self.lock:
+                self.prefetch_failed = True
+        finally:
+            self.prefetching = False
+
+    def _reloaded(self):
+        # Caller must hold self.lock. Every download after the first replaces data readers already have
+        if self.misses > 1 and self.on_reload is not None:
+            self.on_reload()
+
+    def _sync_journal(self, now):
+        # Caller must hold self.lock
+        if self.journal_position is None:
+            self.journal_position = (int(self.metadata.get('journal_generation', 0)),
+                                     int(self.metadata.get('journal_offset', 0)))
+            self.journal_records = 0
+        elif now - self.journal_checked_at < self.max_staleness:
+            return
+        with telemetry.phase('journal'):
+            records, self.journal_position = self.journal.read(*self.journal_position)
+        self.journal_checked_at = now
+        if records:
+            self.building += 1
+            try:
+                with telemetry.phase('journal'):
+                    self.apply_journal(self.workbook, self.derived, records)
+            finally:
+                self.building -= 1
+            self.journal_records += len(records)
+
+    def after_fork(self):
+        # A forked worker inherits the parent's cache but none of its threads or their locks
+        self.lock = threading.RLock()
+        self.prefetching = False
+        # The parent's copy may be old by now (a recycled worker): the first stale read checks inline
+        self.prefetch_failed = True
+
+    def expire_journal(self):
+        # Make the next read pick up records this process just appended
+        with self.lock:
+            self.journal_checked_at = 0.0
+
+    def get(self):
+        with self.lock:
+            return self._refresh()
+
+    def get_with(self, key, build):
+        """Return the workbook together with a value derived from it.
+
+        ``build(wb)`` runs once per workbook version; the result is kept
+        until the blob changes, so routes share one parse of each sheet.
+        ``build`` may itself look up other derived values of the same version.
+        """
+        with self.lock:
+            wb = self._refresh()
+            if key not in self.derived:
+                name = key[0] if isinstance(key, tuple) else key
+                self.building += 1
+                try:
+                    with telemetry.phase('parse' if name in PARSE_PHASES else 'scan'):
+                        value = build(wb)
+                finally:
+                    self.building -= 1
+                self.derived[key] = value
+            return wb, self.derived[key]
+
+    def memo(self, key, build):
+        return self.get_with(key, build)[1]
+
+    def begin_write(self):
+        # The writer is about to edit the cached workbook and store in place
+        with self.lock:
+            self.write_token = secrets.token_hex(8)
+
+    def put(self, wb, version, last_modified=None, keep=()):
+        # Adopt a workbook we just uploaded so the next read does not download it again.
+        # Derived values named in ``keep`` were updated alongside the same workbook
+        # object by the writer, so they are carried over to the new version.
+        with self.lock:
+            self.write_token = None
+            if wb is self.workbook:
+                self.derived = {key: value for key, value in self.derived.items() if key in keep}
+            else:
+                self.derived = {}
+            self.workbook = wb
+            self.version = version
+            self.last_modified = last_modified
+            self.checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.write_token = None
+            self.workbook = None
+            self.version = None
+            self.last_modified = None
+            self.metadata = {}
+            self.checked_at = 0.0
+            self.derived = {}
+            self.journal_position = None
+
+    def data_version(self):
+        # What routes actually see: the snapshot ETag plus the journal records replayed on it,
+        # and while a write is being applied, that write's token
+        with self.lock:
+            version = f"{self.version}|{self.journal_position}"
+            return version if self.write_token is None else f"{version}|{self.write_token}"
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'last_modified': self.last_modified.isoformat() if self.last_modified else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'prefetches': self.prefetches,
+            'journal_position': self.journal_position,
+            'journal_records': self.journal_records,
+        }
+
+
+workbook_cache = WorkbookCache(WORKBOOK_CACHE_MAX_STALENESS, prefetch=WORKBOOK_PREFETCH)
+change_feed = ChangeFeed()
+# Dashboards cannot patch a workbook replaced by another process: tell them to reload
+workbook_cache.on_reload = lambda: change_feed.publish('reset', {})
+journal = make_journal()
+
+
+def load_workbook():
+    return workbook_cache.get()
+
+
+def read_staging_store(wb):
+    if isinstance(wb, PartitionedWorkbook):
+        # Each year is parsed once and reused until its blob changes; row numbers count per partition
+        for partition in wb.partitions.values():
+            if partition.store is None:
+                partition.store = read_staging_store(partition.wb)
+        return StagingStore.concat([wb.partitions[fiscal_year].store for fiscal_year in sorted(wb.partitions)])
+    return StagingStore.from_rows(wb.rows("StagingData", columns=range(8), date_columns=DATE_COLUMNS))
+
+
+def staging_sheet(wb, fiscal_year):
+    # The sheet holding fiscal_year's rows: StagingData itself, or that year's partition
+    if isinstance(wb, PartitionedWorkbook):
+        return wb.staging_sheet(fiscal_year)
+    return wb["StagingData"]
+
+
+def build_staging_store(wb):
+    # The rollups are built with the store, so the first read after a reload finds them ready
+    store = read_staging_store(wb)
+    Rollups.from_store(store)
+    return store
+
+
+# Built by the prefetch thread as soon as a changed workbook arrives
+workbook_cache.warm['staging'] = build_staging_store
+
+
+def get_staging_store():
+    return workbook_cache.memo('staging', build_staging_store)
+
+
+def load_workbook_and_store():
+    # The workbook and its StagingStore are returned as a pair from the same version
+    return workbook_cache.get_with('staging', build_staging_store)
+
+
+def get_rollups(store):
+    # Kept current by the store's own changes once built
+    with workbook_cache.lock:
+        if store.rollups is None:
+            with telemetry.phase('scan'):
+                Rollups.from_store(store)
+        return store.rollups
+
+
+def get_staging_store_and_version():
+    with workbook_cache.lock:
+        store = get_staging_store()
+        return store, workbook_cache.data_version()
+
+
+def load_workbook_for_write():
+    # Hold the cache lock so the ETag returned is the one the workbook was read at
+    with workbook_cache.lock:
+        wb, store = load_workbook_and_store()
+        # Readers see the batch's edits before they are uploaded: tag them until put() or invalidate()
+        workbook_cache.begin_write()
+        return wb, store, workbook_cache.version
+
+
+def save_workbook(wb, if_match=None):
+    # Upload the workbook, only over the version we read when if_match is given
+    try:
+        # Keep the journal position of the snapshot we are replacing
+        with telemetry.phase('serialize_workbook'):
+            data = wb.to_bytes()
+        with telemetry.phase('upload'):
+            if partitions is not None:
+                # Only the years this write touched, each over the version it was read at
+                result = partitions.put(wb, data)
+            else:
+                result = storage.put(blob_name, data, metadata=workbook_cache.metadata, if_match=if_match)
+    except PreconditionFailed:
+        workbook_cache.invalidate()
+        raise WriteConflict(f"{blob_name} changed since version {if_match}")
+    except Exception:
+        # The cached workbook may already hold the edits that failed to upload
+        workbook_cache.invalidate()
+        raise
+    # The store's rollups were updated by the same edits and travel with it
+    workbook_cache.put(wb, result.etag, result.last_modified, keep=('staging', 'metrics_and_categories'))
+    share_snapshot(result, data)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify() goes through here, so response serialization shows up as its own phase
+    def response(self, *args, **kwargs):
+        with telemetry.phase('serialize'):
+            return super().response(*args, **kwargs)
 
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
+app.json = TimedJSONProvider(app)
 csrf = CSRFProtect(app)
 
-# Get absolute path to the Excel file, let it  be here for future local Dev.
-# Modify the WORKBOOK_PATH to ensure proper file location
-#WORKBOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CareerCenterMetrics.xlsx")
 
-# def load_workbook():
-#     try:
-#         logger.info("Attempting to load workbook from Azure")
-#         if not os.path.exists(WORKBOOK_PATH):
-#             print(f"Excel file not found at: {WORKBOOK_PATH}")
-#             return None
-#         return openpyxl.load_workbook(WORKBOOK_PATH, data_only=True)
-#     except Exception as e:
-#         print(f"Error loading workbook: {str(e)}")
-#         return None
+@app.before_request
+def start_request_timing():
+    telemetry.start_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.after_request
+def add_server_timing(response):
+    timing, total = telemetry.finish_request()
+    if timing is not None:
+        response.headers['Server-Timing'] = timing.server_timing(total)
+        if SLOW_REQUEST_SECONDS and total >= SLOW_REQUEST_SECONDS:
+            logger.warning("Slow request %s %s took %.0f ms: %s", request.method, request.full_path,
+                           total * 1000, timing.breakdown())
+    return response
+
+
+def build_metrics_and_categories(wb):
+    categories_and_metrics = {}
+    metric_groups = {}
+    
+    for _, row in wb.rows("MetricsAndCategories", columns=range(3)):
+        if row and len(row) >= 3 and row[0] and row[1]:
+            category, metric = row[0], row[1].strip()
+            group = row[2] if len(row) >= 3 and row[2] else "Other"
+            
+            # Store category-metric relationship
+            if category not in categories_and_metrics:
+                categories_and_metrics[category] = []
+            categories_and_metrics[category].append(metric)
+            
+            # Store metric-group relationship
+            metric_groups[metric] = group
+    
+    return categories_and_metrics, metric_groups
 
 
 def get_metrics_and_categories():
     try:
-        wb = load_workbook()
-        if not wb:
-            return {}, {}
-            
-        sheet = wb["MetricsAndCategories"]
-        categories_and_metrics = {}
-        metric_groups = {}
-        
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            if row and len(row) >= 3 and row[0] and row[1]:
-                category, metric = row[0], row[1].strip()
-                group = row[2] if len(row) >= 3 and row[2] else "Other"
-                
-                # Store category-metric relationship
-                if category not in categories_and_metrics:
-                    categories_and_metrics[category] = []
-                categories_and_metrics[category].append(metric)
-                
-                # Store metric-group relationship
-                metric_groups[metric] = group
-        
-        return categories_and_metrics, metric_groups
+        return workbook_cache.memo('metrics_and_categories', build_metrics_and_categories)
     except Exception as e:
         print(f"Error in get_metrics_and_categories: {str(e)}")
         return {}, {}
 
 
+workbook_cache.warm['metrics_and_categories'] = build_metrics_and_categories
+
+
 def get_fiscal_years():
     try:
-        wb = load_workbook()
-        if not wb:
-            return ["24/25"]  # Default fallback
-            
-        sheet = wb["StagingData"]
-        fiscal_years = set()
-        
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            if row and row[0]:
-                fiscal_years.add(str(row[0]))
-        
-        return sorted(list(fiscal_years)) if fiscal_years else ["24/25"]
+        store = get_staging_store()
+        fiscal_years = get_rollups(store).fiscal_years(store)
+        return fiscal_years if fiscal_years else ["24/25"]
     except Exception as e:
         print(f"Error in get_fiscal_years: {str(e)}")
         return ["24/25"]
 
+
+def get_previous_values(store, fiscal_year, quarter, category):
+    previous_values = {}
+    for i in store.group(fiscal_year, quarter, category):
+        previous_values[store.metrics[store.metric[i]]] = store.value[i]
+    return previous_values
+
+
+def parse_metric_fields(form_data):
+    """Pull (metric, value, target) out of the ``metrics_*``/``targets_*`` fields.
+
+    Empty metric fields are skipped; a non-numeric value raises ValueError
+    before anything is written.
+    """
+    metrics = []
+    for key, value in form_data.items():
+        if key.startswith('metrics_') and value.strip():
+            metric_name = key[8:]  # Remove 'metrics_' prefix
+            target_value = form_data.get(f'targets_{metric_name}', '')
+            target = float(target_value) if target_value.strip() else None
+            metrics.append((metric_name, float(value), target))
+    return metrics
+
+
+def parse_submission(form_data, replace=False):
+    # Validate a form() POST up front so the writer thread only sees clean edits
+    return {
+        'fiscal_year': form_data.get('fiscal_year'),
+        'quarter': form_data.get('quarter'),
+        'start_date': datetime.strptime(form_data.get('start_date'), '%Y-%m-%d'),
+        'end_date': datetime.strptime(form_data.get('end_date'), '%Y-%m-%d'),
+        'category': form_data.get('category'),
+        'metrics': parse_metric_fields(form_data),
+        'form_data': form_data.to_dict(),
+        'replace': replace,
+    }
+
+
+def delete_group(sheet, store, fiscal_year, quarter, category):
+    # Remove every row of (fiscal_year, quarter, category); sheet is None for store-only edits
+    positions = store.group(fiscal_year, quarter, category)
+    if sheet is not None:
+        # Delete rows in reverse order to avoid index shifting
+        for row_idx in sorted((store.row_number[i] for i in positions), reverse=True):
+            sheet.delete_rows(row_idx)
+    store.delete(positions)
+
+
+def upsert_metrics(sheet, store, fiscal_year, quarter, start_date, end_date, category, metrics, replace=False):
+    """Write (metric, value, target) entries into StagingData.
+
+    ``store`` is kept in step with the sheet so its composite-key index stays
+    valid for the next request; with ``sheet`` set to None only the store is
+    edited. With ``replace`` the existing rows for (fiscal_year, quarter,
+    category) are removed first. Returns (metrics_added, metrics_updated).
+    """
+    # If updating, first remove existing entries
+    if replace:
+        delete_group(sheet, store, fiscal_year, quarter, category)
+    
+    # Add new entries
+    next_row = sheet.max_row + 1 if sheet is not None else 0
+    metrics_added = 0
+    metrics_updated = 0
+    
+    for metric_name, number, target in metrics:
+        # Check if this metric already exists
+        position = store.lookup(fiscal_year, quarter, category, metric_name)
+        
+        if position is not None:
+            # Update existing row
+            if sheet is not None:
+                existing_row = store.row_number[position]
+                sheet.cell(row=existing_row, column=7).value = number
+                sheet.cell(row=existing_row, column=8).value = target
+            store.set_numbers(position, number, target)
+            metrics_updated += 1
+        else:
+            # Add new row
+            row = (fiscal_year, quarter, start_date, end_date, category, metric_name, number, target)
+            if sheet is not None:
+                for column, cell_value in enumerate(row, 1):
+                    sheet.cell(row=next_row, column=column).value = cell_value
+            store.append_row(next_row, row)
+            
+            if sheet is not None:
+                next_row += 1
+            metrics_added += 1
+    
+    return metrics_added, metrics_updated
+
+
+def build_update_message(form_data, previous_values):
+    update_message = []
+    for key, value in form_data.items():
+        if key.startswith('metrics_'):
+            metric_name = key[8:]  # Remove 'metrics_' prefix
+            previous_value = previous_values.get(metric_name, 'N/A')
+            if not value.strip():
+                update_message.append(f"{metric_name}: Reset from {previous_value} to empty")
+            else:
+                update_message.append(f"{metric_name}: Updated from {previous_value} to {value}")
+    return 'Changes confirmed: ' + ', '.join(update_message)
+
+
+def apply_submission(wb, store, submission):
+    # Runs on the writer thread against the batch's workbook
+    fiscal_year = submission['fiscal_year']
+    quarter = submission['quarter']
+    category = submission['category']
+    previous_values = get_previous_values(store, fiscal_year, quarter, category)
+    sheet = staging_sheet(wb, fiscal_year)
+    # Readers hold the cache lock too, so they never see the store and its rollups half-updated
+    with workbook_cache.lock, telemetry.phase('apply'):
+        metrics_added, metrics_updated = upsert_metrics(
+            sheet, store, fiscal_year, quarter, submission['start_date'], submission['end_date'],
+            category, submission['metrics'], replace=submission['replace'])
+    return {
+        'metrics_added': metrics_added,
+        'metrics_updated': metrics_updated,
+        'message': build_update_message(submission['form_data'], previous_values),
+    }
+
+
+def apply_import(wb, store, rows):
+    """Upsert validated /api/import rows; returns {row number: 'added' or 'updated'}."""
+    statuses = {}
+    groups = {}
+    for row in rows:
+        key = (row['fiscal_year'], row['quarter'], row['start_date'], row['end_date'], row['category'])
+        groups.setdefault(key, []).append(row)
+        exists = store.lookup(row['fiscal_year'], row['quarter'], row['category'], row['metric']) is not None
+        statuses[row['row']] = 'updated' if exists else 'added'
+    
+    # Sheets are opened (and parsed) before readers are locked out
+    sheets = {key[0]: staging_sheet(wb, key[0]) if wb is not None else None for key in groups}
+    
+    # One upsert per (fiscal_year, quarter, category) period, as form() would send it
+    with workbook_cache.lock, telemetry.phase('apply'):
+        for (fiscal_year, quarter, start_date, end_date, category), group_rows in groups.items():
+            upsert_metrics(sheets[fiscal_year], store, fiscal_year, quarter, start_date, end_date, category,
+                           [(row['metric'], row['value'], row['target']) for row in group_rows])
+    return statuses
+
+
+def reset_write():
+    # A failed or conflicting batch: drop every cached copy its edits may have reached
+    workbook_cache.invalidate()
+    if partitions is not None:
+        partitions.invalidate()
+
+
+def apply_operation(wb, store, operation):
+    if operation.get('kind') == 'import':
+        return apply_import(wb, store, operation['rows'])
+    return apply_submission(wb, store, operation)
+
+
+write_queue = WriteQueue(
+    load=load_workbook_for_write,
+    apply=apply_operation,
+    save=lambda wb, version: save_workbook(wb, if_match=version),
+    reset=reset_write,
+    batch_window=WRITE_BATCH_WINDOW,
+    max_retries=WRITE_MAX_RETRIES,
+)
+
+
+
+def submission_records(submission):
+    # Journal records for one form() submission, in the order they must be replayed
+    records = []
+    if submission['replace']:
+        records.append({'op': 'd', 'fy': submission['fiscal_year'], 'q': submission['quarter'],
+                        'c': submission['category']})
+    for metric_name, number, target in submission['metrics']:
+        records.append({
+            'op': 'u',
+            'fy': submission['fiscal_year'],
+            'q': submission['quarter'],
+            'sd': submission['start_date'].strftime('%Y-%m-%d'),
+            'ed': submission['end_date'].strftime('%Y-%m-%d'),
+            'c': submission['category'],
+            'm': metric_name,
+            'v': number,
+            't': target,
+        })
+    return records
+
+
+def import_records(rows):
+    return [{
+        'op': 'u',
+        'fy': row['fiscal_year'],
+        'q': row['quarter'],
+        'sd': row['start_date'].strftime('%Y-%m-%d'),
+        'ed': row['end_date'].strftime('%Y-%m-%d'),
+        'c': row['category'],
+        'm': row['metric'],
+        'v': row['value'],
+        't': row['target'],
+    } for row in rows]
+
+
+def apply_journal_records(sheet, store, records):
+    for record in records:
+        if record['op'] == 'd':
+            delete_group(sheet, store, record['fy'], record['q'], record['c'])
+        else:
+            upsert_metrics(sheet, store, record['fy'], record['q'],
+                           datetime.strptime(record['sd'], '%Y-%m-%d'),
+                           datetime.strptime(record['ed'], '%Y-%m-%d'),
+                           record['c'], [(record['m'], record['v'], record['t'])])
+
+
+def apply_journal_overlay(wb, derived, records):
+    # Replay journal records onto the cached StagingStore only; the sheet stays as downloaded
+    store = derived['staging'] if 'staging' in derived else build_staging_store(wb)
+    apply_journal_records(None, store, records)
+    kept = {key: derived[key] for key in ('metrics_and_categories',) if key in derived}
+    derived.clear()
+    derived.update(kept, staging=store)
+    # Records from every process pass through here, so each worker's dashboards hear of all of them
+    publish_changes(records)
+
+
+def publish_changes(records):
+    change_feed.publish('change', {'changes': [change_from_record(record) for record in records]})
+
+
+def append_submission(submission):
+    # Journal mode: record the edit and acknowledge without rewriting the workbook
+    store = get_staging_store()
+    fiscal_year, quarter, category = submission['fiscal_year'], submission['quarter'], submission['category']
+    previous_values = get_previous_values(store, fiscal_year, quarter, category)
+    metrics_updated = 0
+    if not submission['replace']:
+        metrics_updated = sum(1 for metric_name, _, _ in submission['metrics']
+                              if store.lookup(fiscal_year, quarter, category, metric_name) is not None)
+    
+    with telemetry.phase('journal'):
+        journal.append(submission_records(submission))
+    workbook_cache.expire_journal()
+    if workbook_cache.journal_records >= JOURNAL_COMPACT_RECORDS:
+        start_compaction()
+    
+    return {
+        'metrics_added': len(submission['metrics']) - metrics_updated,
+        'metrics_updated': metrics_updated,
+        'message': build_update_message(submission['form_data'], previous_values),
+    }
+
+
+def submit_changes(submission):
+    if journal is not None:
+        # Published to /api/changes once the journal is replayed
+        return append_submission(submission)
+    result = write_queue.submit(submission, timeout=WRITE_TIMEOUT)
+    publish_changes(submission_records(submission))
+    return result
+
+
+def submit_import(rows):
+    # All rows go in one operation: a single upload (or journal append) for the whole file
+    if journal is not None:
+        store = get_staging_store()
+        statuses = {row['row']: 'updated' if store.lookup(row['fiscal_year'], row['quarter'], row['category'],
+                                                          row['metric']) is not None else 'added'
+                    for row in rows}
+        with telemetry.phase('journal'):
+            journal.append(import_records(rows))
+        workbook_cache.expire_journal()
+        if workbook_cache.journal_records >= JOURNAL_COMPACT_RECORDS:
+            start_compaction()
+        return statuses
+    statuses = write_queue.submit({'kind': 'import', 'rows': rows}, timeout=WRITE_TIMEOUT)
+    publish_changes(import_records(rows))
+    return statuses
+
+
+def import_upload(filename, data, dry_run=False):
+    """Validate an uploaded CSV/xlsx and, when every row is valid, write it all at once.
+
+    Nothing is written if any row is invalid (or with ``dry_run``); the
+    report has one entry per row either way.
+    """
+    categories_and_metrics, _ = get_metrics_and_categories()
+    with telemetry.phase('scan'):
+        valid, report = validate_rows(read_upload(filename, data), categories_and_metrics)
+    invalid = sum(1 for entry in report if entry['status'] == 'invalid')
+    result = {
+        'success': not invalid,
+        'dry_run': dry_run,
+        'rows': len(report),
+        'invalid': invalid,
+        'added': 0,
+        'updated': 0,
+        'report': report,
+    }
+    if invalid:
+        result['message'] = f'Nothing was imported: {invalid} invalid rows'
+        return result
+    if dry_run or not valid:
+        return result
+    
+    statuses = submit_import(valid)
+    for entry in report:
+        entry['status'] = statuses[entry['row']]
+        result[entry['status']] += 1
+    result['message'] = f"Imported {result['added']} new and {result['updated']} updated metrics"
+    return result
+
+
+report_jobs = ReportJobs(REPORTS_DIR, workers=REPORT_WORKERS)
+
+
+def start_report(category, output):
+    """Queue a multi-year summary export and return its job id.
+
+    The rows come from the rollups of the current version; the pool process
+    only writes the file. The same report of the same version is one job.
+    """
+    with workbook_cache.lock:
+        store = get_staging_store()
+        job_id = make_etag(workbook_cache.data_version(), 'report', category, output)
+        status = report_jobs.status(job_id)
+        if status is not None and status['status'] != 'failed':
+            return job_id
+        fiscal_years = get_rollups(store).fiscal_years(store)
+        aggregates = get_memo_aggregates(fiscal_years[-1] if fiscal_years else None, category)
+        header, rows = summary_rows(aggregates, fiscal_years)
+    report_jobs.submit(job_id, output, header, rows)
+    return job_id
+
+
+compaction_lock = threading.Lock()
+
+
+def compact_journal():
+    """Fold the journal into StagingData and rewrite the workbook once.
+
+    The segment being folded is sealed so concurrent appends move on to the
+    next one; the new snapshot records the journal position it includes.
+    Returns the number of records folded.
+    """
+    with compaction_lock:
+        for attempt in range(WRITE_MAX_RETRIES + 1):
+            with telemetry.phase('download'):
+                blob = storage.get(blob_name)
+            wb = workbook_from_blob(blob)
+            metadata = blob.metadata
+            start = (int(metadata.get('journal_generation', 0)), int(metadata.get('journal_offset', 0)))
+            
+            records, position = journal.read(*start)
+            journal.seal(position[0])
+            more, position = journal.read(*position)
+            records.extend(more)
+            if not records:
+                return 0
+            
+            with telemetry.phase('apply'):
+                sheet = wb["StagingData"]
+                apply_journal_records(sheet, StagingStore.from_worksheet(sheet), records)
+            with telemetry.phase('serialize_workbook'):
+                data = wb.to_bytes()
+            
+            metadata = dict(metadata, journal_generation=str(position[0]), journal_offset=str(position[1]))
+            try:
+                with telemetry.phase('upload'):
+                    storage.put(blob_name, data, metadata=metadata, if_match=blob.etag)
+            except PreconditionFailed:
+                logger.info("Workbook changed during journal compaction, retrying")
+                continue
+            
+            workbook_cache.invalidate()
+            # Segments before the previous snapshot's position are no longer read by anyone
+            journal.delete_before(start[0])
+            logger.info("Compacted %d journal records into %s", len(records), blob_name)
+            return len(records)
+        raise WriteConflict(f"{blob_name} kept changing during journal compaction")
+
+
+def start_compaction():
+    if compaction_lock.locked():
+        return
+    
+    def run():
+        try:
+            compact_journal()
+        except Exception as e:
+            print(f"Error compacting journal: {str(e)}")
+    
+    threading.Thread(target=run, name='journal-compaction', daemon=True).start()
+
+
+if journal is not None:
+    workbook_cache.journal = journal
+    workbook_cache.apply_journal = apply_journal_overlay
+
+
 @app.route('/')
 def dashboard():
     try:
@@ -157,107 +1027,14 @@ def form():
                             'message': 'All fields are required!'
                         })
                     
-                    # Load previous data for comparison
-                    wb = load_workbook()
-                    if not wb:
-                        return jsonify({
-                            'success': False,
-                            'message': 'Could not open the Excel file for reading.'
-                        })
-                        
-                    sheet = wb["StagingData"]
-                    
-                    # Get previous values for metrics
-                    previous_values = {}
-                    for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-                        if (row and len(row) >= 6 and 
-                            str(row[0]).strip() == fiscal_year and 
-                            str(row[1]).strip() == quarter and 
-                            str(row[4]).strip() == category):
-                            metric_name = row[5]
-                            previous_values[metric_name] = row[6]
-                    
-                    # Process metrics data
-                    metrics_data = []
-                    
-                    # If updating, first remove existing entries
-                    if action == 'update':
-                        rows_to_delete = []
-                        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-                            if (row and len(row) >= 6 and 
-                                str(row[0]).strip() == fiscal_year and 
-                                str(row[1]).strip() == quarter and 
-                                str(row[4]).strip() == category):
-                                rows_to_delete.append(row_idx)
-                        
-                        # Delete rows in reverse order to avoid index shifting
-                        for row_idx in sorted(rows_to_delete, reverse=True):
-                            sheet.delete_rows(row_idx)
-                    
-                    # Add new entries
-                    next_row = sheet.max_row + 1
-                    metrics_added = 0
-                    metrics_updated = 0
-                    
-                    # Get all form fields
-                    for key, value in request.form.items():
-                        if key.startswith('metrics_') and value.strip():
-                            metric_name = key[8:]  # Remove 'metrics_' prefix
-                            target_key = f'targets_{metric_name}'
-                            target_value = request.form.get(target_key, '')
-                            
-                            # Convert dates to datetime objects
-                            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-                            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-                            
-                            # Check if this metric already exists
-                            existing_row = None
-                            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-                                if (row and len(row) >= 6 and 
-                                    str(row[0]).strip() == fiscal_year and 
-                                    str(row[1]).strip() == quarter and 
-                                    str(row[4]).strip() == category and 
-                                    str(row[5]).strip() == metric_name):
-                                    existing_row = row_idx
-                                    break
-                            
-                            if existing_row:
-                                # Update existing row
-                                sheet.cell(row=existing_row, column=7).value = float(value)
-                                sheet.cell(row=existing_row, column=8).value = float(target_value) if target_value.strip() else None
-                                metrics_updated += 1
-                            else:
-                                # Add new row
-                                sheet.cell(row=next_row, column=1).value = fiscal_year
-                                sheet.cell(row=next_row, column=2).value = quarter
-                                sheet.cell(row=next_row, column=3).value = start_date_obj
-                                sheet.cell(row=next_row, column=4).value = end_date_obj
-                                sheet.cell(row=next_row, column=5).value = category
-                                sheet.cell(row=next_row, column=6).value = metric_name
-                                sheet.cell(row=next_row, column=7).value = float(value)
-                                sheet.cell(row=next_row, column=8).value = float(target_value) if target_value.strip() else None
-                                
-                                next_row += 1
-                                metrics_added += 1
-                    
-                    # Save the workbook
-                    save_workbook(wb)
-                    
-                    # Generate update message with previous values
-                    update_message = []
-                    for key, value in request.form.items():
-                        if key.startswith('metrics_'):
-                            metric_name = key[8:]  # Remove 'metrics_' prefix
-                            previous_value = previous_values.get(metric_name, 'N/A')
-                            if not value.strip():
-                                update_message.append(f"{metric_name}: Reset from {previous_value} to empty")
-                            else:
-                                update_message.append(f"{metric_name}: Updated from {previous_value} to {value}")
+                    # Queue the edit; the writer thread batches it with concurrent submissions
+                    submission = parse_submission(request.form, replace=(action == 'update'))
+                    result = submit_changes(submission)
                     
                     return jsonify({
                         'success': True,
-                        'message': 'Changes confirmed: ' + ', '.join(update_message),
-                        'metrics_count': metrics_added + metrics_updated
+                        'message': result['message'],
+                        'metrics_count': result['metrics_added'] + result['metrics_updated']
                     })
                     
                 except Exception as e:
@@ -285,78 +1062,9 @@ def form():
                                             metrics_by_category=categories_and_metrics)
                     
                     # Process metrics data
-                    wb = load_workbook()
-                    if wb:
-                        sheet = wb["StagingData"]
-                        next_row = sheet.max_row + 1
-                        metrics_added = 0
-                        metrics_updated = 0
-                        
-                        # Load previous values for metrics
-                        previous_values = {}
-                        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-                            if (row and len(row) >= 6 and 
-                                str(row[0]).strip() == fiscal_year and 
-                                str(row[1]).strip() == quarter and 
-                                str(row[4]).strip() == category):
-                                metric_name = row[5]
-                                previous_values[metric_name] = row[6]
-                        
-                        for key, value in request.form.items():
-                            if key.startswith('metrics_') and value.strip():
-                                metric_name = key[8:]  # Remove 'metrics_' prefix
-                                target_key = f'targets_{metric_name}'
-                                target_value = request.form.get(target_key, '')
-                                
-                                # Convert dates to datetime objects
-                                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-                                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-                                
-                                # Check if this metric already exists
-                                existing_row = None
-                                for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-                                    if (row and len(row) >= 6 and 
-                                        str(row[0]).strip() == fiscal_year and 
-                                        str(row[1]).strip() == quarter and 
-                                        str(row[4]).strip() == category and 
-                                        str(row[5]).strip() == metric_name):
-                                        existing_row = row_idx
-                                        break
-                                
-                                if existing_row:
-                                    # Update existing row
-                                    sheet.cell(row=existing_row, column=7).value = float(value)
-                                    sheet.cell(row=existing_row, column=8).value = float(target_value) if target_value.strip() else None
-                                    metrics_updated += 1
-                                else:
-                                    # Add new row
-                                    sheet.cell(row=next_row, column=1).value = fiscal_year
-                                    sheet.cell(row=next_row, column=2).value = quarter
-                                    sheet.cell(row=next_row, column=3).value = start_date_obj
-                                    sheet.cell(row=next_row, column=4).value = end_date_obj
-                                    sheet.cell(row=next_row, column=5).value = category
-                                    sheet.cell(row=next_row, column=6).value = metric_name
-                                    sheet.cell(row=next_row, column=7).value = float(value)
-                                    sheet.cell(row=next_row, column=8).value = float(target_value) if target_value.strip() else None
-                                    
-                                    next_row += 1
-                                    metrics_added += 1
-                        
-                        # Save the workbook
-                        save_workbook(wb)
-                        update_message = []
-                        for key, value in request.form.items():
-                            if key.startswith('metrics_'):
-                                metric_name = key[8:]  # Remove 'metrics_' prefix
-                                previous_value = previous_values.get(metric_name, 'N/A')
-                                if not value.strip():
-                                    update_message.append(f"{metric_name}: Reset from {previous_value} to empty")
-                                else:
-                                    update_message.append(f"{metric_name}: Updated from {previous_value} to {value}")
-                        
-                        flash('Changes confirmed: ' + ', '.join(update_message), 'success')
-                    else:
-                        flash('Could not open the Excel file for writing.', 'error')
+                    submission = parse_submission(request.form)
+                    result = submit_changes(submission)
+                    flash(result['message'], 'success')
                     
                     return redirect(url_for('dashboard'))
                     
@@ -382,61 +1090,140 @@ def form():
             return "Error loading form", 500
 
 
+def make_etag(version, *parts):
+    return hashlib.sha1('\x1f'.join([version] + [str(part) for part in parts]).encode('utf-8')).hexdigest()
+
+
+def stream_response(chunks, mimetype, etag=None, headers=None):
+    """Stream text chunks, gzip-compressed when the client accepts it.
+
+    The strong ETag is suffixed per encoding since the bytes differ.
+    """
+    gzip = 'gzip' in request.accept_encodings
+    response_headers = dict(headers or {}, Vary='Accept-Encoding')
+    if gzip:
+        response_headers['Content-Encoding'] = 'gzip'
+    
+    def generate():
+        if not gzip:
+            for chunk in chunks:
+                yield chunk.encode('utf-8')
+            return
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk.encode('utf-8'))
+            size += len(buffer[-1])
+            # Hand the compressor reasonably sized pieces rather than single records
+            if size >= 65536:
+                compressed = compressor.compress(b''.join(buffer))
+                buffer, size = [], 0
+                if compressed:
+                    yield compressed
+        yield compressor.compress(b''.join(buffer)) + compressor.flush()
+    
+    route = telemetry.current_route()
+    
+    def timed(body):
+        # The body is produced after the request has finished, so it is recorded on its own
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(body)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - start
+                yield chunk
+        finally:
+            telemetry.observe_phases(route, {'stream': seconds})
+    
+    response = Response(timed(generate()), mimetype=mimetype, headers=response_headers)
+    if etag:
+        response.set_etag(etag + ('-gz' if gzip else ''))
+    return response
+
+
 @app.route('/get_metrics_data')
 def get_metrics_data():
+    fiscal_year = request.args.get('fiscal_year') or None
+    category = request.args.get('category') or None
+    metric = request.args.get('metric') or None
+    output = request.args.get('format', 'json')
+    
     try:
-        wb = load_workbook()
-        if not wb:
-            return jsonify([])
+        date_from = parse_date_ordinal(request.args.get('start_date'))
+        date_to = parse_date_ordinal(request.args.get('end_date'))
+        cursor = int(request.args.get('cursor') or 0)
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'cursor and limit must be integers'}), 400
+    if cursor < 0 or limit is not None and limit < 1:
+        return jsonify({'error': 'cursor must be 0 or more and limit 1 or more'}), 400
+    if request.args.get('start_date') and not date_from or request.args.get('end_date') and not date_to:
+        return jsonify({'error': 'Dates must be formatted YYYY-MM-DD'}), 400
+    if output not in ('json', 'ndjson', 'columnar'):
+        return jsonify({'error': 'format must be json, ndjson or columnar'}), 400
+    
+    try:
+        # Writes change the store under the same lock: the positions and the view must match the ETag's version
+        with workbook_cache.lock:
+            store, version = get_staging_store_and_version()
+            
+            etag = make_etag(version, fiscal_year, category, metric, date_from, date_to, cursor, limit, output)
+            gzip_etag = etag + '-gz' if 'gzip' in request.accept_encodings else etag
+            if request.if_none_match.contains(gzip_etag):
+                return Response(status=304, headers={'ETag': f'"{gzip_etag}"', 'Vary': 'Accept-Encoding'})
             
-        sheet = wb["StagingData"]
-        data = []
+            with telemetry.phase('scan'):
+                positions = store.select(fiscal_year, category, metric, date_from, date_to)
+            # Streamed after the lock is released; a delete meanwhile swaps the store's arrays, not the view's
+            store = store.view()
+        total = len(positions)
+        end = total if limit is None else min(cursor + limit, total)
+        positions = positions[cursor:end]
+        headers = {'X-Total-Count': str(total)}
+        next_cursor = end if end < total else None
+        if next_cursor is not None:
+            headers['X-Next-Cursor'] = str(next_cursor)
         
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
-            try:
-                if not row or len(row) < 8:
-                    print(f"Skipping row {row_num}: Insufficient columns")
-                    continue
-
-                # Process dates
-                start_date = None
-                end_date = None
-                try:
-                    if row[2]:
-                        start_date = row[2].strftime('%Y-%m-%d') if isinstance(row[2], datetime) else datetime.strptime(str(row[2]), '%Y-%m-%d').strftime('%Y-%m-%d')
-                    if row[3]:
-                        end_date = row[3].strftime('%Y-%m-%d') if isinstance(row[3], datetime) else datetime.strptime(str(row[3]), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, AttributeError) as e:
-                    print(f"Date processing error in row {row_num}: {e}")
-
-                # Process numeric values
-                try:
-                    value = float(str(row[6]).strip()) if row[6] is not None else 0
-                    target = float(str(row[7]).strip()) if row[7] is not None else None
-                except (ValueError, TypeError, AttributeError):
-                    print(f"Numeric value processing error in row {row_num}")
-                    continue
-
-                data.append({
-                    'fiscal_year': str(row[0]).strip(),
-                    'quarter': str(row[1]).strip(),
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'category': str(row[4]).strip(),
-                    'metric': str(row[5]).strip(),
-                    'value': value,
-                    'target': target
-                })
-            except Exception as e:
-                print(f"Error processing row {row_num}: {str(e)}")
-                continue
-                
-        print(f"Successfully processed {len(data)} rows of data")
-        return jsonify(data)
+        records = store.iter_records(positions)
+        if output == 'ndjson':
+            chunks = (json.dumps(record) + '\n' for record in records)
+            return stream_response(chunks, 'application/x-ndjson', etag, headers)
+        
+        if output == 'columnar':
+            return stream_response(columnar_chunks(store, positions, next_cursor),
+                                   'application/json', etag, headers)
+        
+        def array_chunks():
+            # Plain JSON array, as the dashboard has always received it
+            yield '['
+            for n, record in enumerate(records):
+                yield (',' if n else '') + json.dumps(record)
+            yield ']'
+        
+        return stream_response(array_chunks(), 'application/json', etag, headers)
     except Exception as e:
         print(f"Error in get_metrics_data: {str(e)}")
         return jsonify([])
 
+
+def columnar_chunks(store, positions, next_cursor, batch_size=4096):
+    # {"count": n, "next_cursor": c, "columns": {"fiscal_year": [...], ...}}, one column at a time
+    yield json.dumps({'count': len(positions), 'next_cursor': next_cursor})[:-1] + ', "columns": {'
+    for n, name in enumerate(StagingStore.RECORD_FIELDS):
+        yield (', ' if n else '') + json.dumps(name) + ': ['
+        for start in range(0, len(positions), batch_size):
+            values = store.iter_column(name, positions[start:start + batch_size])
+            yield (', ' if start else '') + ', '.join(json.dumps(value) for value in values)
+        yield ']'
+    yield '}}'
+
+
 @app.route('/get_metric_groups')
 def get_metric_groups():
     try:
@@ -455,21 +1242,10 @@ def check_existing_data():
         return jsonify({'exists': False, 'error': 'Missing parameters'})
     
     try:
-        wb = load_workbook()
-        if not wb:
-            return jsonify({'exists': False})
-            
-        sheet = wb["StagingData"]
+        store = get_staging_store()
         
         # Check if data exists for these parameters
-        exists = False
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            if (row and len(row) >= 6 and 
-                str(row[0]).strip() == fiscal_year and 
-                str(row[1]).strip() == quarter and 
-                str(row[4]).strip() == category):
-                exists = True
-                break
+        exists = bool(store.find(fiscal_year, quarter, category))
                 
         return jsonify({'exists': exists})
     except Exception as e:
@@ -486,40 +1262,9 @@ def get_existing_data():
         return jsonify([])
     
     try:
-        wb = load_workbook()
-        if not wb:
-            return jsonify([])
-            
-        sheet = wb["StagingData"]
-        data = []
-        
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            if (row and len(row) >= 8 and 
-                str(row[0]).strip() == fiscal_year and 
-                str(row[1]).strip() == quarter and 
-                str(row[4]).strip() == category):
-                
-                # Process dates
-                start_date = None
-                end_date = None
-                try:
-                    if row[2]:
-                        start_date = row[2].strftime('%Y-%m-%d') if isinstance(row[2], datetime) else datetime.strptime(str(row[2]), '%Y-%m-%d').strftime('%Y-%m-%d')
-                    if row[3]:
-                        end_date = row[3].strftime('%Y-%m-%d') if isinstance(row[3], datetime) else datetime.strptime(str(row[3]), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, AttributeError) as e:
-                    print(f"Date processing error: {e}")
-
-                data.append({
-                    'fiscal_year': str(row[0]).strip(),
-                    'quarter': str(row[1]).strip(),
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'category': str(row[4]).strip(),
-                    'metric': str(row[5]).strip(),
-                    'value': float(str(row[6]).strip()) if row[6] is not None else 0,
-                    'target': float(str(row[7]).strip()) if row[7] is not None else None
-                })
+        store = get_staging_store()
+        data = [store.record(i) for i in store.find(fiscal_year, quarter, category)
+                if store.flags[i] & COMPLETE]
                 
         return jsonify(data)
     except Exception as e:
@@ -527,6 +1272,142 @@ def get_existing_data():
         return jsonify([])
     
 
+def get_memo_aggregates(fiscal_year, category=None):
+    def build(wb):
+        _, metric_groups = get_metrics_and_categories()
+        store = get_staging_store()
+        return get_rollups(store).aggregates(store, metric_groups, fiscal_year, category)
+    
+    # Memoized per workbook version, so repeat views are a dictionary lookup
+    return workbook_cache.memo(('aggregates', fiscal_year, category), build)
+
+
+def get_memo_scorecards():
+    def build(wb):
+        _, metric_groups = get_metrics_and_categories()
+        store = get_staging_store()
+        return get_rollups(store).scorecards(store, metric_groups)
+    
+    # Every fiscal year is scored in one pass and kept for the workbook version
+    return workbook_cache.memo('scorecards', build)
+
+
+@app.route('/api/aggregates')
+def get_aggregates():
+    fiscal_year = request.args.get('fiscal_year')
+    category = request.args.get('category')
+    
+    try:
+        store = get_staging_store()
+        fiscal_years = get_rollups(store).fiscal_years(store)
+        if not fiscal_year:
+            fiscal_year = fiscal_years[-1] if fiscal_years else None
+        return jsonify(dict(get_memo_aggregates(fiscal_year, category), years=fiscal_years))
+    except Exception as e:
+        print(f"Error building aggregates: {str(e)}")
+        return jsonify({'fiscal_year': fiscal_year, 'years': [], 'categories': []})
+
+
+@app.route('/api/scorecards')
+def get_scorecards():
+    fiscal_year = request.args.get('fiscal_year')
+    
+    try:
+        scorecards = get_memo_scorecards()
+        if fiscal_year:
+            scorecards = {fiscal_year: scorecards.get(fiscal_year, {})}
+        return jsonify({'scorecards': scorecards})
+    except Exception as e:
+        print(f"Error building scorecards: {str(e)}")
+        return jsonify({'scorecards': {}})
+
+
+@app.route('/api/bootstrap')
+def bootstrap():
+    """Everything the dashboard draws on load, tagged with the version it shows.
+
+    A client that kept an earlier response sends its ``version`` back as
+    ``since``. When the data has not changed since, the reply only says so
+    (``full`` and ``modified`` false), so an unchanged dashboard costs one
+    small response; otherwise it is the full payload. Versions come from the
+    storage ETag and journal position, the same in every worker and across
+    restarts.
+    """
+    since = request.args.get('since')
+    
+    try:
+        # The version must describe exactly the data returned with it
+        with workbook_cache.lock:
+            store = get_staging_store()
+            version = make_etag(workbook_cache.data_version(), 'bootstrap')
+            if since == version:
+                return jsonify({'version': version, 'full': False, 'modified': False})
+            
+            categories_and_metrics, metric_groups = get_metrics_and_categories()
+            fiscal_years = get_rollups(store).fiscal_years(store)
+            fiscal_year = fiscal_years[-1] if fiscal_years else None
+            payload = {
+                'version': version,
+                'full': True,
+                'modified': True,
+                'fiscal_years': fiscal_years,
+                'fiscal_year': fiscal_year,
+                'metric_groups': metric_groups,
+                'categories': categories_and_metrics,
+                'aggregates': dict(get_memo_aggregates(fiscal_year), years=fiscal_years),
+                'scorecards': get_memo_scorecards(),
+            }
+        return jsonify(payload)
+    except Exception as e:
+        print(f"Error building bootstrap: {str(e)}")
+        return jsonify({'version': None, 'full': True, 'modified': True, 'fiscal_years': [], 'fiscal_year': None,
+                        'metric_groups': {}, 'categories': {}})
+
+
+@app.route('/api/query')
+def query_metrics():
+    """Value and target totals per category, metric and calendar week, month or quarter.
+    
+    Rows whose start_date..end_date period overlaps the ``start_date``/``end_date``
+    window are selected through the store's date index and totalled into the
+    period holding their end_date. ``category`` and ``metric`` may be repeated.
+    """
+    interval = request.args.get('interval', 'month')
+    fiscal_year = request.args.get('fiscal_year') or None
+    categories = [category for category in request.args.getlist('category') if category] or None
+    metrics = [metric for metric in request.args.getlist('metric') if metric] or None
+    date_from = parse_date_ordinal(request.args.get('start_date'))
+    date_to = parse_date_ordinal(request.args.get('end_date'))
+    if request.args.get('start_date') and not date_from or request.args.get('end_date') and not date_to:
+        return jsonify({'error': 'Dates must be formatted YYYY-MM-DD'}), 400
+    if interval not in PERIODS:
+        return jsonify({'error': f"interval must be one of {', '.join(PERIODS)}"}), 400
+    
+    try:
+        # Writes change the store under the same lock, so the totals match the version in the ETag
+        with workbook_cache.lock:
+            store = get_staging_store()
+            etag = make_etag(workbook_cache.data_version(), 'query', fiscal_year, categories, metrics,
+                             date_from, date_to, interval)
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers={'ETag': f'"{etag}"'})
+            with telemetry.phase('scan'):
+                positions = store.select(fiscal_year, categories, metrics, date_from, date_to)
+                series = aggregate_periods(store, positions, interval)
+        response = jsonify({
+            'interval': interval,
+            'start_date': format_date_ordinal(date_from),
+            'end_date': format_date_ordinal(date_to),
+            'rows': len(positions),
+            'series': series,
+        })
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        print(f"Error in query_metrics: {str(e)}")
+        return jsonify({'interval': interval, 'rows': 0, 'series': []})
+
+
 @app.route('/get_metrics_by_category')
 def get_metrics_by_category():
     category = request.args.get('category')
@@ -556,6 +1437,246 @@ def get_metrics_by_category():
         return jsonify([])
 
 
+@app.route('/api/import', methods=['POST'])
+def import_metrics():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'success': False, 'message': 'Upload a CSV or xlsx file as "file"'}), 400
+    dry_run = (request.args.get('dry_run') or request.form.get('dry_run')) in ('1', 'true')
+    
+    try:
+        result = import_upload(upload.filename, upload.read(), dry_run=dry_run)
+        return jsonify(result), 200 if result['success'] else 422
+    except UploadError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error importing metrics: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+
+def report_status(job_id):
+    status = report_jobs.status(job_id)
+    if status is not None and status['status'] == 'done':
+        status['url'] = url_for('download_report', job_id=job_id)
+    return status
+
+
+@app.route('/api/reports', methods=['POST'])
+def create_report():
+    options = request.get_json(silent=True) or request.form
+    category = options.get('category') or None
+    output = (options.get('format') or 'xlsx').lower()
+    if output not in REPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or xlsx'}), 400
+    
+    try:
+        categories_and_metrics, _ = get_metrics_and_categories()
+        if category is not None and category not in categories_and_metrics:
+            return jsonify({'success': False, 'message': f'Unknown category {category}'}), 400
+        job_id = start_report(category, output)
+        status = report_status(job_id) or {'job_id': job_id, 'status': 'pending'}
+        return jsonify(status), 200 if status['status'] == 'done' else 202
+    except Exception as e:
+        print(f"Error starting report: {str(e)}")
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+
+
+@app.route('/api/reports/<job_id>')
+def get_report(job_id):
+    status = report_status(job_id) if report_jobs.valid_id(job_id) else None
+    if status is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+    return jsonify(status)
+
+
+@app.route('/api/reports/<job_id>/download')
+def download_report(job_id):
+    found = report_jobs.find(job_id) if report_jobs.valid_id(job_id) else None
+    if found is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+    path, output = found
+    # Streamed from disk; conditional responses also answer Range and If-None-Match
+    return send_file(path, mimetype=REPORT_FORMATS[output], as_attachment=True,
+                     download_name=f"metrics-summary-{job_id[:8]}.{output}", conditional=True, etag=job_id)
+
+
+@app.route('/api/changes')
+def changes_stream():
+    """Server-sent events with every change to StagingData.
+
+    ``change`` events list the rows upserted and the (fiscal year, quarter,
+    category) groups deleted, in order; ``reset`` means the client must reload
+    everything. Reconnecting clients resume after their Last-Event-ID.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    resume_from = change_feed.parse_event_id(last_event_id)
+    
+    def events():
+        yield 'retry: 3000\n\n'
+        version = resume_from
+        if version is None:
+            version = change_feed.version
+            if last_event_id:
+                # Its events came from another worker or a previous run
+                yield format_event(change_feed.event_id(version), 'reset', {'version': version})
+        deadline = time.monotonic() + CHANGES_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            pending = change_feed.wait(version, CHANGES_KEEPALIVE_SECONDS)
+            if pending is None:
+                version = change_feed.version
+                yield format_event(change_feed.event_id(version), 'reset', {'version': version})
+            elif not pending:
+                yield ': keepalive\n\n'
+            for event_version, kind, data in pending or ():
+                version = event_version
+                yield format_event(change_feed.event_id(version), kind, data)
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Set by warm_up; a worker forked from a preloaded gunicorn master inherits it already ready
+readiness = {'started': False, 'ready': False, 'seconds': None, 'version': None, 'error': None}
+readiness_lock = threading.Lock()
+
+
+def warm_up():
+    """Build what the dashboard's first requests read, so that none of them pays for it.
+    
+    With gunicorn's ``preload_app`` (see gunicorn.conf.py) this runs once in
+    the master and the workers fork with the parsed workbook; otherwise it
+    runs on a thread of each worker. ``/ready`` reports when it has finished.
+    """
+    try:
+        store = get_staging_store()
+        rollups = get_rollups(store)
+        get_metrics_and_categories()
+        fiscal_years = rollups.fiscal_years(store)
+        if fiscal_years:
+            get_memo_aggregates(fiscal_years[-1])
+        get_memo_scorecards()
+        store.date_index()
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        with readiness_lock:
+            # The next start_warm_up (e.g. the next /ready probe) tries again
+            readiness.update(started=False, error=str(e))
+        return False
+    with readiness_lock:
+        readiness.update(started=True, ready=True, error=None, version=workbook_cache.version,
+                         seconds=round(time.monotonic() - STARTED_AT, 3))
+    logger.info("Workbook warm %.2f s after start", readiness['seconds'])
+    return True
+
+
+def after_fork():
+    # Called in each gunicorn worker forked from a preloaded master (see gunicorn.conf.py)
+    workbook_cache.after_fork()
+    change_feed.after_fork()
+
+
+def start_warm_up():
+    # Warm up on a background thread unless that is done or under way
+    with readiness_lock:
+        if readiness['started']:
+            return
+        readiness['started'] = True
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+@app.route('/ready')
+def ready():
+    """200 once the workbook and the dashboard's values are built in this worker, 503 until then."""
+    start_warm_up()
+    with readiness_lock:
+        status = {key: readiness[key] for key in ('ready', 'seconds', 'version', 'error')}
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    cache = workbook_cache.stats()
+    writer = write_queue.stats()
+    gauges = [
+        ('workbook_cache_hits_total', 'Reads served from the cached workbook', cache['hits'], 'counter'),
+        ('workbook_cache_misses_total', 'Reads that downloaded the workbook', cache['misses'], 'counter'),
+        ('workbook_cache_prefetches_total', 'Changed workbooks downloaded in the background',
+         cache['prefetches'], 'counter'),
+        ('workbook_journal_records', 'Journal records replayed on the cached snapshot', cache['journal_records']),
+        ('workbook_writer_batches_total', 'Batches of submissions uploaded', writer['batches'], 'counter'),
+        ('workbook_writer_operations_total', 'Submissions written', writer['operations'], 'counter'),
+        ('workbook_writer_conflicts_total', 'Batches retried after a concurrent write', writer['conflicts'], 'counter'),
+        ('workbook_writer_pending', 'Submissions waiting for the writer', writer['pending']),
+        ('app_ready', 'Whether the workbook has been warmed up (see /ready)', int(readiness['ready'])),
+        ('app_warm_up_seconds', 'Seconds from process start until the workbook was warm',
+         readiness['seconds'] or 0),
+    ]
+    return Response(telemetry.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+@app.cli.command('compact-journal')
+def compact_journal_command():
+    """Fold the change journal into the workbook now."""
+    if journal is None:
+        print("Journal mode is off (set WORKBOOK_JOURNAL=blob or file)")
+        return
+    print(f"Compacted {compact_journal()} journal records")
+
+
+@app.cli.command('split-workbook')
+@click.option('--force', is_flag=True, help='Overwrite partitions that already exist.')
+def split_workbook_command(force):
+    """Split the workbook into the partitioned layout (one StagingData blob per fiscal year).
+
+    The workbook itself is left in place; set WORKBOOK_LAYOUT=partitioned afterwards.
+    The partitions are read back and must hold the same rows as the workbook.
+    """
+    target = PartitionedStorage(storage, partition_prefix(blob_name))
+    if storage.list_blobs(target.prefix) and not force:
+        print(f"{target.prefix} already holds a partitioned layout (use --force to overwrite)")
+        return
+    wb = workbook_from_blob(storage.get(blob_name))
+    staging_rows = [values for _, values in wb.rows("StagingData", columns=range(8), date_columns=DATE_COLUMNS,
+                                                    min_row=1)]
+    metrics_rows = [values for _, values in wb.rows("MetricsAndCategories", min_row=1)]
+    for name, count in target.split(staging_rows, metrics_rows).items():
+        print(f"{name}: {count} rows")
+
+    source = read_staging_store(wb)
+    _, partitioned = target.fetch(None)
+    split = read_staging_store(partitioned)
+    expected = (len(source), len(source.select()))
+    found = (len(split), len(split.select()))
+    if found != expected:
+        raise click.ClickException(f"The partitions hold {found[0]} rows ({found[1]} valid), "
+                                   f"the workbook {expected[0]} ({expected[1]} valid)")
+    print(f"Checked: {found[0]} rows ({found[1]} valid) in both layouts")
+
+
+@app.cli.command('check-rollups')
+def check_rollups_command():
+    """Compare the rollups behind the dashboard with a full recompute from StagingData."""
+    with workbook_cache.lock:
+        store = get_staging_store()
+        _, metric_groups = get_metrics_and_categories()
+        problems = check_rollups(store, metric_groups, get_rollups(store))
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} differences" if problems else "Rollups match a full recompute")
+
+
+@app.cli.command('import-metrics')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Only validate the file.')
+def import_metrics_command(path, dry_run):
+    """Import a CSV or xlsx of StagingData rows in one write."""
+    with open(path, 'rb') as f:
+        result = import_upload(os.path.basename(path), f.read(), dry_run=dry_run)
+    for entry in result['report']:
+        if entry['status'] == 'invalid':
+            print(f"Row {entry['row']}: {'; '.join(entry['errors'])}")
+    print(result.get('message') or f"{result['rows']} rows are valid")
+
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,205 @@
+"""Benchmark the routes and the load/save paths on synthetic workbooks.
+
+The app runs against local storage (WORKBOOK_STORAGE=local) in a fresh
+interpreter per workbook size, so nothing touches Azure and peak RSS is per size:
+
+    python benchmarks/bench_app.py --rows 1000,10000,100000 --requests 50 --json results.json
+
+For every scenario it reports latency percentiles, throughput and the peak
+Python allocation of a single call (tracemalloc, measured after the timed runs).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from generate_workbook import CATEGORIES, metric_name, write_workbook
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BLOB_NAME = 'CareerCenterMetrics.xlsx'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (usage / 1024 if sys.platform == 'darwin' else usage) / 1024
+
+
+def scenarios(app_module, client):
+    """(name, callable) pairs; each callable performs one operation."""
+    fiscal_year, category = '2025', CATEGORIES[0]
+    metric = metric_name(0)
+
+    def get(url, **headers):
+        def call():
+            response = client.get(url, headers=headers)
+            response.get_data()  # drain streamed bodies
+            if response.status_code not in (200, 304):
+                raise RuntimeError(f"{url}: HTTP {response.status_code}")
+        return call
+
+    def load_cold():
+        app_module.workbook_cache.invalidate()
+        app_module.load_workbook_and_store()
+
+    def save():
+        wb, store, version = app_module.load_workbook_for_write()
+        app_module.save_workbook(wb, if_match=version)
+
+    submissions = iter(range(10 ** 9))
+
+    def post_form():
+        n = next(submissions)
+        response = client.post('/form', headers={'X-Requested-With': 'XMLHttpRequest'}, data={
+            'fiscal_year': fiscal_year, 'quarter': 'Q4', 'start_date': '2025-04-01',
+            'end_date': '2025-06-30', 'category': category, 'action': 'create',
+            f'metrics_{metric}': str(n % 500), f'targets_{metric}': '400',
+        })
+        if not response.get_json().get('success'):
+            raise RuntimeError(response.get_json().get('message'))
+
+    return [
+        ('load workbook (cold)', load_cold),
+        ('save workbook', save),
+        ('GET /', get('/')),
+        ('GET /form', get('/form')),
+        ('GET /get_metrics_data', get('/get_metrics_data')),
+        ('GET /get_metrics_data gzip', get('/get_metrics_data', **{'Accept-Encoding': 'gzip'})),
+        ('GET /get_metrics_data filtered', get(f'/get_metrics_data?fiscal_year={fiscal_year}&category={category}')),
+        ('GET /get_metrics_data page', get('/get_metrics_data?limit=500&format=ndjson')),
+        ('GET /get_metric_groups', get('/get_metric_groups')),
+        ('GET /check_existing_data', get(f'/check_existing_data?fiscal_year={fiscal_year}&quarter=Q1&category={category}')),
+        ('GET /get_existing_data', get(f'/get_existing_data?fiscal_year={fiscal_year}&quarter=Q1&category={category}')),
+        ('GET /api/aggregates', get(f'/api/aggregates?fiscal_year={fiscal_year}')),
+        ('GET /api/scorecards', get('/api/scorecards')),
+        ('GET /get_metrics_by_category', get(f'/get_metrics_by_category?category={category}')),
+        ('POST /form', post_form),
+    ]
+
+
+def measure(call, requests, concurrency):
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    call()  # warm-up: first builds of derived values are reported by 'load workbook (cold)'
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(timed, range(requests)))
+    else:
+        for i in range(requests):
+            timed(i)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'throughput_per_s': requests / elapsed if elapsed else 0.0,
+        'peak_alloc_mb': peak / 1024 / 1024,
+    }
+
+
+def run_size(workdir, rows, requests, concurrency, only):
+    os.environ.update({
+        'WORKBOOK_STORAGE': 'local',
+        'WORKBOOK_STORAGE_PATH': workdir,
+        'AZURE_BLOB_NAME': BLOB_NAME,
+        'WORKBOOK_JOURNAL': '',
+    })
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    app_module.app.config['WTF_CSRF_ENABLED'] = False
+    app_module.app.logger.disabled = True
+    client = app_module.app.test_client()
+
+    results = []
+    for name, call in scenarios(app_module, client):
+        if only and not any(part in name for part in only):
+            continue
+        result = {'scenario': name, 'rows': rows}
+        try:
+            result.update(measure(call, requests, concurrency))
+        except Exception as e:
+            result['error'] = str(e)
+        result['peak_rss_mb'] = peak_rss_mb()
+        results.append(result)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,10000,100000', help='comma separated StagingData sizes')
+    parser.add_argument('--requests', type=int, default=20, help='timed calls per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='threads issuing the timed calls')
+    parser.add_argument('--only', default='', help='comma separated substrings of scenario names to run')
+    parser.add_argument('--workdir', default=None, help='where generated workbooks are kept (reused across runs)')
+    parser.add_argument('--json', default=None, help='also write all results to this file')
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = [part for part in args.only.split(',') if part]
+
+    if args.run is not None:
+        run_size(args.workdir, args.run, args.requests, args.concurrency, only)
+        return
+
+    base = args.workdir or os.path.join(tempfile.gettempdir(), 'careercenter-bench')
+    all_results = []
+    for rows in [int(size) for size in args.rows.split(',')]:
+        workdir = os.path.join(base, str(rows))
+        os.makedirs(workdir, exist_ok=True)
+        source = os.path.join(base, f'{rows}.xlsx')
+        if not os.path.exists(source):
+            print(f"Generating {rows} rows...", flush=True)
+            write_workbook(source, rows)
+        # Every run starts from the pristine workbook; the write scenarios change it
+        with open(source, 'rb') as f, open(os.path.join(workdir, BLOB_NAME), 'wb') as out:
+            out.write(f.read())
+
+        output = subprocess.run(
+            [sys.executable, __file__, '--run', str(rows), '--workdir', workdir, '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency), '--only', args.only],
+            check=True, capture_output=True, text=True).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        all_results.extend(results)
+
+        print(f"\n{rows} rows ({os.path.getsize(source) / 1024 / 1024:.1f} MB xlsx)")
+        print(f"{'scenario':<34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'alloc MB':>9} {'RSS MB':>8}")
+        for result in results:
+            if 'error' in result:
+                print(f"{result['scenario']:<34} error: {result['error']}")
+                continue
+            print(f"{result['scenario']:<34} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                  f"{result['p99_ms']:>9.2f} {result['throughput_per_s']:>9.1f} "
+                  f"{result['peak_alloc_mb']:>9.1f} {result['peak_rss_mb']:>8.0f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
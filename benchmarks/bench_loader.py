@@ -0,0 +1,120 @@
+"""Compare the workbook loaders on one xlsx file.
+
+Each loader runs in a fresh interpreter so its peak RSS is measured on its own:
+
+    python benchmarks/bench_loader.py --workbook CareerCenterMetrics.xlsx --repeat 3
+    python benchmarks/bench_loader.py --rows 100000    # on a generated workbook
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from staging import DATE_COLUMNS, StagingStore  # noqa: E402
+from xlsx_reader import XlsxReader  # noqa: E402
+from generate_workbook import write_workbook  # noqa: E402
+
+LOADERS = {}
+
+
+def loader(name):
+    def register(func):
+        LOADERS[name] = func
+        return func
+    return register
+
+
+@loader('openpyxl')
+def load_openpyxl(data):
+    # What every request used to do: full parse of every sheet, then walk StagingData
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True)
+    return len(StagingStore.from_worksheet(wb["StagingData"]))
+
+
+@loader('openpyxl-read-only')
+def load_openpyxl_read_only(data):
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True, read_only=True)
+    return len(StagingStore.from_worksheet(wb["StagingData"]))
+
+
+@loader('lean')
+def load_lean(data):
+    reader = XlsxReader(data)
+    rows = reader.rows("StagingData", columns=range(8), date_columns=DATE_COLUMNS)
+    return len(StagingStore.from_rows(rows))
+
+
+@loader('lean-fiscal-years')
+def load_lean_fiscal_years(data):
+    # Column A only, as get_fiscal_years needs
+    reader = XlsxReader(data)
+    return len({row[0] for _, row in reader.rows("StagingData", columns=[0])})
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def run_one(name, path, repeat):
+    with open(path, 'rb') as f:
+        data = f.read()
+    baseline = peak_rss_kb()
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = LOADERS[name](data)
+        timings.append(time.perf_counter() - start)
+    print(json.dumps({
+        'loader': name,
+        'rows': rows,
+        'best_seconds': min(timings),
+        'mean_seconds': sum(timings) / len(timings),
+        'peak_rss_mb': peak_rss_kb() / 1024,
+        'rss_growth_mb': (peak_rss_kb() - baseline) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workbook', help='xlsx file with a StagingData sheet')
+    parser.add_argument('--rows', type=int, help='generate a synthetic workbook of this many rows instead')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loaders', default=','.join(LOADERS), help='comma separated subset of loaders')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run, args.workbook, args.repeat)
+        return
+    if args.workbook is None:
+        if args.rows is None:
+            parser.error('give --workbook or --rows')
+        args.workbook = os.path.join(tempfile.gettempdir(), f'careercenter-bench-{args.rows}.xlsx')
+        if not os.path.exists(args.workbook):
+            write_workbook(args.workbook, args.rows)
+
+    size_mb = os.path.getsize(args.workbook) / 1024 / 1024
+    print(f"{args.workbook}: {size_mb:.1f} MB")
+    print(f"{'loader':<20} {'rows':>9} {'best s':>9} {'mean s':>9} {'peak MB':>9} {'growth MB':>10}")
+    for name in args.loaders.split(','):
+        output = subprocess.run(
+            [sys.executable, __file__, '--workbook', args.workbook, '--repeat', str(args.repeat), '--run', name],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<20} {result['rows']:>9} {result['best_seconds']:>9.3f} {result['mean_seconds']:>9.3f} "
+              f"{result['peak_rss_mb']:>9.1f} {result['rss_growth_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare incrementally kept rollups with recomputing the dashboard from every row.
+
+Applies random form()-style edits (value changes, new rows, group deletes) to
+a generated StagingData and times, per edit, the full recompute against
+updating the rollups and reading the dashboard from them. Both must agree:
+the run ends with ``check_rollups`` and exits non-zero on any difference.
+
+    python benchmarks/bench_rollups.py --rows 100000 --edits 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from analytics import Rollups, build_aggregates, build_scorecards, check_rollups  # noqa: E402
+from generate_workbook import generate_metrics_and_categories, generate_rows  # noqa: E402
+from staging import QUARTERS, StagingStore  # noqa: E402
+
+
+def random_edit(store, rows, rng):
+    choice = rng.random()
+    if choice < 0.5:
+        store.set_numbers(rng.randrange(len(store)), float(rng.randint(0, 500)), rng.choice([None, 100.0]))
+    elif choice < 0.8:
+        fiscal_year, _, start, end, category, metric = rows[rng.randrange(len(rows))][:6]
+        store.append_row(0, (str(int(fiscal_year) + 1), rng.choice(QUARTERS), start, end, category, metric,
+                             rng.randint(0, 500), None))
+    else:
+        i = rng.randrange(len(store))
+        store.delete(store.group(store.fiscal_years[store.fiscal_year[i]], store.quarters[store.quarter[i]],
+                                 store.categories[store.category[i]]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--edits', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = list(generate_rows(args.rows))
+    metric_groups = {metric: group for _, metric, group in generate_metrics_and_categories(args.rows)}
+    store = StagingStore.from_rows(enumerate(rows, 2))
+    fiscal_year = store.distinct_fiscal_years()[-1]
+
+    start = time.perf_counter()
+    rollups = Rollups.from_store(store)
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    recompute = update = 0.0
+    for _ in range(args.edits):
+        start = time.perf_counter()
+        random_edit(store, rows, rng)
+        rollups.aggregates(store, metric_groups, fiscal_year)
+        rollups.scorecards(store, metric_groups)
+        update += time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_aggregates(store, metric_groups, fiscal_year)
+        build_scorecards(store, metric_groups)
+        recompute += time.perf_counter() - start
+
+    print(f"{len(store)} rows, rollups built in {build_seconds:.3f} s")
+    print(f"per edit: full recompute {recompute / args.edits * 1000:.2f} ms, "
+          f"rollups {update / args.edits * 1000:.2f} ms (edit included)")
+    problems = check_rollups(store, metric_groups, rollups)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} differences" if problems else "Rollups match a full recompute")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Measure cold start: app import time and time to the first dashboard response.
+
+Each scenario runs in a fresh interpreter against local storage:
+
+- import: importing app.py, and which heavy modules that pulled in
+- cold: the first and second GET /api/bootstrap of a worker that starts empty
+- preload: the same in a worker forked after ``warm_up`` ran in its parent,
+  as gunicorn.conf.py does in the master
+
+    python benchmarks/bench_startup.py --rows 10000,100000
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_workbook import write_workbook
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BLOB_NAME = 'CareerCenterMetrics.xlsx'
+HEAVY_MODULES = ('openpyxl', 'azure.storage.blob', 'multiprocessing', 'concurrent.futures.process')
+
+
+def first_requests(app_module):
+    # Milliseconds of the first two GET /api/bootstrap calls
+    client = app_module.app.test_client()
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        response = client.get('/api/bootstrap')
+        response.get_data()
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/bootstrap: HTTP {response.status_code}")
+    return timings
+
+
+def run_scenario(workdir, scenario):
+    # A snapshot directory of its own, so no scenario maps a snapshot an earlier one wrote
+    snapshot_dir = os.path.join(workdir, f'snapshots-{scenario}')
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.environ.update({
+        'WORKBOOK_STORAGE': 'local',
+        'WORKBOOK_STORAGE_PATH': workdir,
+        'AZURE_BLOB_NAME': BLOB_NAME,
+        'WORKBOOK_JOURNAL': '',
+        'WORKBOOK_SNAPSHOT_DIR': snapshot_dir,
+    })
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    import app as app_module
+    result = {'import_ms': (time.perf_counter() - start) * 1000,
+              'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules]}
+    app_module.app.logger.disabled = True
+
+    if scenario == 'cold':
+        result['first_ms'], result['second_ms'] = first_requests(app_module)
+    elif scenario == 'preload':
+        start = time.perf_counter()
+        app_module.warm_up()
+        result['warm_up_ms'] = (time.perf_counter() - start) * 1000
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            app_module.after_fork()
+            os.write(write_end, json.dumps(first_requests(app_module)).encode())
+            os._exit(0)
+        os.waitpid(pid, 0)
+        result['first_ms'], result['second_ms'] = json.loads(os.read(read_end, 1024))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='10000,100000', help='comma separated StagingData sizes')
+    parser.add_argument('--workdir', default=None, help='where generated workbooks are kept (reused across runs)')
+    parser.add_argument('--run', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run_scenario(args.workdir, args.run)
+        return
+
+    base = args.workdir or os.path.join(tempfile.gettempdir(), 'careercenter-bench')
+    print(f"{'rows':>8} {'scenario':<9} {'import ms':>10} {'warm-up ms':>11} {'1st ms':>9} {'2nd ms':>9}  heavy modules")
+    for rows in [int(size) for size in args.rows.split(',')]:
+        workdir = os.path.join(base, str(rows))
+        os.makedirs(workdir, exist_ok=True)
+        source = os.path.join(base, f'{rows}.xlsx')
+        if not os.path.exists(source):
+            print(f"Generating {rows} rows...", flush=True)
+            write_workbook(source, rows)
+        with open(source, 'rb') as f, open(os.path.join(workdir, BLOB_NAME), 'wb') as out:
+            out.write(f.read())
+
+        for scenario in ('import', 'cold', 'preload'):
+            output = subprocess.run([sys.executable, __file__, '--run', scenario, '--workdir', workdir],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{rows:>8} {scenario:<9} {result['import_ms']:>10.1f} {result.get('warm_up_ms', 0):>11.1f} "
+                  f"{result.get('first_ms', 0):>9.1f} {result.get('second_ms', 0):>9.1f}  "
+                  f"{', '.join(result['heavy_modules']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Generate a synthetic career-centre workbook for benchmarks.
+
+    python benchmarks/generate_workbook.py --rows 100000 --output /tmp/CareerCenterMetrics.xlsx
+
+StagingData gets fiscal years x 4 quarters x categories x metrics rows (cut
+to ``--rows``); MetricsAndCategories lists every metric with its group.
+"""
+import argparse
+import math
+import random
+from datetime import datetime
+
+CATEGORIES = [
+    "Appointments", "Workshops", "Career Fairs", "Employer Engagement",
+    "Internships", "Online Resources", "Alumni Mentoring", "Graduate Outcomes",
+]
+GROUPS = ["Engagement", "Participation", "Outcomes", "Satisfaction"]
+METRIC_NAMES = [
+    "Students Served", "Sessions Held", "Attendance", "Repeat Visitors",
+    "Employers Attending", "Placements", "Applications", "Survey Responses",
+]
+# Fiscal years run July to June: quarter -> (start month, end month, end day, year offset)
+QUARTER_MONTHS = {"Q1": (7, 9, 30, -1), "Q2": (10, 12, 31, -1), "Q3": (1, 3, 31, 0), "Q4": (4, 6, 30, 0)}
+
+
+def plan(rows, years=None, categories=len(CATEGORIES)):
+    # Grow the metric count to reach ``rows``; years default to 5 like a real history
+    years = years or 5
+    categories = min(categories, len(CATEGORIES))
+    metrics = max(1, math.ceil(rows / (years * 4 * categories)))
+    return years, categories, metrics
+
+
+def metric_name(index):
+    base = METRIC_NAMES[index % len(METRIC_NAMES)]
+    return base if index < len(METRIC_NAMES) else f"{base} {index // len(METRIC_NAMES) + 1}"
+
+
+def generate_rows(rows, years=None, categories=len(CATEGORIES), last_year=2025, seed=0):
+    """Yield StagingData rows (fiscal_year, quarter, start, end, category, metric, value, target)."""
+    years, categories, metrics = plan(rows, years, categories)
+    rng = random.Random(seed)
+    produced = 0
+    for fiscal_year in range(last_year - years + 1, last_year + 1):
+        for quarter, (start_month, end_month, end_day, offset) in QUARTER_MONTHS.items():
+            start = datetime(fiscal_year + offset, start_month, 1)
+            end = datetime(fiscal_year + offset, end_month, end_day)
+            for category in CATEGORIES[:categories]:
+                for index in range(metrics):
+                    if produced >= rows:
+                        return
+                    value = rng.randint(0, 500)
+                    target = round(value * rng.uniform(0.8, 1.3)) if rng.random() < 0.7 else None
+                    yield (str(fiscal_year), quarter, start, end, category, metric_name(index), value, target)
+                    produced += 1
+
+
+def generate_metrics_and_categories(rows, years=None, categories=len(CATEGORIES)):
+    years, categories, metrics = plan(rows, years, categories)
+    for category in CATEGORIES[:categories]:
+        for index in range(metrics):
+            yield (category, metric_name(index), GROUPS[index % len(GROUPS)])
+
+
+def write_workbook(path, rows, years=None, categories=len(CATEGORIES), seed=0):
+    # Write-only mode streams rows to disk, so even 1M-row workbooks fit in memory
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    staging = wb.create_sheet("StagingData")
+    staging.append(["fiscal_year", "quarter", "start_date", "end_date", "category", "metric", "value", "target"])
+    for row in generate_rows(rows, years, categories, seed=seed):
+        staging.append(row)
+    metrics = wb.create_sheet("MetricsAndCategories")
+    metrics.append(["category", "metric", "group"])
+    for row in generate_metrics_and_categories(rows, years, categories):
+        metrics.append(row)
+    wb.save(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--years', type=int, default=None)
+    parser.add_argument('--categories', type=int, default=len(CATEGORIES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='CareerCenterMetrics.xlsx')
+    args = parser.parse_args()
+    write_workbook(args.output, args.rows, args.years, args.categories, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
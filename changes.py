@@ -0,0 +1,78 @@
+import collections
+import json
+import secrets
+import threading
+
+
+def change_from_record(record):
+    # Journal/submission record -> change as sent to dashboards, using record() field names
+    if record['op'] == 'd':
+        return {'op': 'delete', 'fiscal_year': record['fy'], 'quarter': record['q'], 'category': record['c']}
+    return {
+        'op': 'upsert',
+        'fiscal_year': record['fy'],
+        'quarter': record['q'],
+        'start_date': record['sd'],
+        'end_date': record['ed'],
+        'category': record['c'],
+        'metric': record['m'],
+        'value': record['v'],
+        'target': record['t'],
+    }
+
+
+def format_event(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChangeFeed:
+    """Recent workbook changes, numbered by a version that only goes up.
+
+    Writers ``publish`` events; each /api/changes connection waits for
+    versions above the last one it sent. Only the newest ``capacity`` events
+    are kept: a client further behind than that gets None from ``since`` and
+    must reload everything. Versions are per process, so event ids carry the
+    process ``epoch`` and an id from another process also means a reload.
+    """
+
+    def __init__(self, capacity=1000):
+        self.condition = threading.Condition()
+        self.events = collections.deque(maxlen=capacity)
+        self.version = 0
+        self.epoch = secrets.token_hex(4)
+
+    def after_fork(self):
+        # A worker forked from a preloaded master gets an epoch of its own, so ids from its siblings mean a reload
+        self.condition = threading.Condition()
+        self.epoch = secrets.token_hex(4)
+
+    def publish(self, kind, data):
+        with self.condition:
+            self.version += 1
+            self.events.append((self.version, kind, dict(data, version=self.version)))
+            self.condition.notify_all()
+            return self.version
+
+    def since(self, version):
+        # Caller must hold self.condition
+        if version > self.version:
+            return None
+        if self.events and version < self.events[0][0] - 1 or not self.events and version < self.version:
+            return None
+        return [event for event in self.events if event[0] > version]
+
+    def wait(self, version, timeout):
+        """Events after ``version``, waiting up to ``timeout`` seconds for one; None when too far behind."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.since(version)
+
+    def event_id(self, version):
+        return f"{self.epoch}:{version}"
+
+    def parse_event_id(self, event_id):
+        # The version a reconnecting client has seen, or None if it is not one of ours
+        epoch, _, version = (event_id or '').partition(':')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
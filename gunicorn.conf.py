@@ -0,0 +1,42 @@
+"""gunicorn settings, read automatically when gunicorn is started from this directory.
+
+With GUNICORN_PRELOAD=1 (the default) the master imports the app and warms
+the workbook up once before forking. Every worker then starts with it
+already parsed: the StagingStore's columns live in array buffers (or in the
+mmapped snapshot) that reference counting never writes to, so they stay
+shared copy-on-write between the workers. Without preload each worker warms
+up on a thread after it starts. Either way ``/ready`` answers 200 only once
+the worker's workbook is warm.
+"""
+import gc
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# Every open dashboard holds an /api/changes stream, and with it a thread, for minutes:
+# sync workers would serve nothing else meanwhile and be killed by the worker timeout
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any worker is forked
+    if not preload_app:
+        return
+    import app
+    app.warm_up()
+    # Objects that exist now are never collected, so the collector does not write to their pages in workers
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        app.after_fork()
+
+
+def post_worker_init(worker):
+    # No-op for a worker that inherited a warm workbook from the master (or whose warm-up is under way)
+    import app
+    app.start_warm_up()
@@ -0,0 +1,170 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+
+from staging import QUARTERS, StagingStore
+from xlsx_reader import XlsxReader
+
+REQUIRED = ('fiscal_year', 'quarter', 'start_date', 'end_date', 'category', 'metric', 'value')
+
+
+class UploadError(ValueError):
+    """The uploaded file could not be read as CSV or xlsx."""
+
+
+def read_csv(data):
+    """Yield (line number, {column: text}) for each data row of a CSV upload."""
+    text = data.decode('utf-8-sig') if isinstance(data, (bytes, bytearray)) else data
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_xlsx(data):
+    """Yield (row number, {column: value}) from the StagingData sheet (else the first sheet) of an xlsx upload."""
+    reader = XlsxReader(data)
+    names = reader.sheet_names()
+    sheet = "StagingData" if "StagingData" in names else names[0]
+    header = None
+    for row_number, values in reader.rows(sheet, min_row=1):
+        if header is None:
+            header = [str(value).strip().lower() if value is not None else '' for value in values]
+            continue
+        row = {name: value for name, value in zip(header, values) if name}
+        # Undecoded date cells are Excel serial numbers
+        for column in ('start_date', 'end_date'):
+            if isinstance(row.get(column), (int, float)):
+                row[column] = reader.epoch + timedelta(days=row[column])
+        yield row_number, row
+
+
+def read_upload(filename, data):
+    """All (row number, {column: value}) rows of an upload, by file extension (CSV unless .xlsx)."""
+    try:
+        if (filename or '').lower().endswith(('.xlsx', '.xlsm')):
+            return list(read_xlsx(data))
+        return list(read_csv(data))
+    except (zipfile.BadZipFile, KeyError, UnicodeDecodeError, csv.Error) as e:
+        raise UploadError(f"Could not read {filename or 'upload'}: {e}")
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # 2024.0 from a numeric cell
+    return str(value).strip()
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(_text(value), '%Y-%m-%d')
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(_text(value))
+
+
+def _parse_column(texts, values, parse):
+    # Each distinct text is parsed once; None marks the ones that did not parse
+    parsed = {}
+    for text, value in zip(texts, values):
+        if text and text not in parsed:
+            try:
+                parsed[text] = parse(value)
+            except ValueError:
+                parsed[text] = None
+    return [parsed[text] if text else None for text in texts]
+
+
+def validate_rows(rows, categories_and_metrics):
+    """Check every uploaded row before anything is written.
+
+    Returns (valid, report): ``valid`` holds the parsed rows that passed and
+    ``report`` one entry per input row, with the errors of rows that did not.
+    A composite key (fiscal_year, quarter, category, metric) may appear only
+    once per upload.
+
+    Each check runs over a whole column: set lookups for quarters, categories
+    and metrics, one parse per distinct date or number, and a single pass over
+    the keys for duplicates.
+    """
+    row_numbers, raw, columns = [], [], {name: [] for name in StagingStore.RECORD_FIELDS}
+    for row_number, row in rows:
+        fields = [_text(row.get(name)) for name in StagingStore.RECORD_FIELDS]
+        if not any(fields):
+            continue
+        row_numbers.append(row_number)
+        raw.append(row)
+        for name, text in zip(StagingStore.RECORD_FIELDS, fields):
+            columns[name].append(text)
+    errors = [[] for _ in row_numbers]
+
+    missing = [[] for _ in row_numbers]
+    for name in REQUIRED:
+        for i, text in enumerate(columns[name]):
+            if not text:
+                missing[i].append(name)
+    for i, names in enumerate(missing):
+        if names:
+            errors[i].append(f"missing {', '.join(names)}")
+
+    quarters = set(QUARTERS)
+    for i, quarter in enumerate(columns['quarter']):
+        if quarter and quarter not in quarters:
+            errors[i].append(f"quarter must be one of {', '.join(QUARTERS)}")
+
+    known = {(category, metric) for category, metrics in categories_and_metrics.items() for metric in metrics}
+    for i, (category, metric) in enumerate(zip(columns['category'], columns['metric'])):
+        if category and category not in categories_and_metrics:
+            errors[i].append(f"unknown category {category}")
+        elif category and metric and (category, metric) not in known:
+            errors[i].append(f"unknown metric {metric} for {category}")
+
+    parsed = {name: _parse_column(columns[name], [row.get(name) for row in raw], parse)
+              for name, parse in (('start_date', _date), ('end_date', _date), ('value', _number), ('target', _number))}
+    for name in ('start_date', 'end_date'):
+        for i, (text, date) in enumerate(zip(columns[name], parsed[name])):
+            if text and date is None:
+                errors[i].append(f"{name} must be formatted YYYY-MM-DD")
+    for i, (start, end) in enumerate(zip(parsed['start_date'], parsed['end_date'])):
+        if start is not None and end is not None and start > end:
+            errors[i].append("start_date is after end_date")
+    for name in ('value', 'target'):
+        for i, (text, number) in enumerate(zip(columns[name], parsed[name])):
+            if text and number is None:
+                errors[i].append(f"{name} is not a number")
+
+    seen = {}
+    keys = zip(columns['fiscal_year'], columns['quarter'], columns['category'], columns['metric'])
+    for i, key in enumerate(keys):
+        if key in seen:
+            errors[i].append(f"same fiscal_year, quarter, category and metric as row {seen[key]}")
+        else:
+            seen[key] = row_numbers[i]
+
+    valid = []
+    report = []
+    for i, row_number in enumerate(row_numbers):
+        if errors[i]:
+            report.append({'row': row_number, 'status': 'invalid', 'errors': errors[i]})
+            continue
+        valid.append({
+            'row': row_number,
+            'fiscal_year': columns['fiscal_year'][i],
+            'quarter': columns['quarter'][i],
+            'start_date': parsed['start_date'][i],
+            'end_date': parsed['end_date'][i],
+            'category': columns['category'][i],
+            'metric': columns['metric'][i],
+            'value': parsed['value'][i],
+            'target': parsed['target'][i],
+        })
+        report.append({'row': row_number, 'status': 'valid'})
+    return valid, report
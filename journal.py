@@ -0,0 +1,105 @@
+import json
+
+from storage import BlobSealed
+
+
+# Record layout (one JSON object per line):
+#   {"op": "u", "fy", "q", "sd", "ed", "c", "m", "v", "t"}  upsert one metric row
+#   {"op": "d", "fy", "q", "c"}                            delete a (fiscal_year, quarter, category)
+
+
+class JournalSealed(Exception):
+    """The segment was folded into a snapshot and accepts no more appends."""
+
+
+def encode_records(records):
+    return b''.join(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+                    for record in records)
+
+
+def decode_records(data):
+    """Parse complete lines of ``data``; returns (records, bytes consumed)."""
+    end = data.rfind(b'\n') + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return records, end
+
+
+class StorageSegment:
+    """Journal segment kept as an append object in a storage backend."""
+
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    def exists(self):
+        return self.storage.exists(self.name)
+
+    def is_sealed(self):
+        return self.storage.is_sealed(self.name)
+
+    def read(self, offset):
+        return self.storage.read_from(self.name, offset)
+
+    def append(self, data):
+        try:
+            self.storage.append(self.name, data)
+        except BlobSealed:
+            raise JournalSealed(self.name)
+
+    def seal(self):
+        self.storage.seal(self.name)
+
+    def delete(self):
+        self.storage.delete(self.name)
+
+
+class Journal:
+    """Append-only change log split into numbered segments.
+
+    Writers append to the newest open segment. Compaction seals the segment it
+    is folding so later appends move on to the next one, and records the
+    (generation, offset) it reached in the snapshot it writes; readers replay
+    everything after that position on top of the snapshot.
+    """
+
+    def __init__(self, segment_for):
+        self.segment_for = segment_for
+        self.generation = 0
+
+    def append(self, records):
+        data = encode_records(records)
+        while True:
+            segment = self.segment_for(self.generation)
+            try:
+                segment.append(data)
+                return self.generation
+            except JournalSealed:
+                self.generation += 1
+
+    def read(self, generation, offset):
+        """Records after (generation, offset) and the position reached."""
+        records = []
+        while True:
+            segment = self.segment_for(generation)
+            # Check the seal first: anything appended before it is then read below
+            sealed = segment.is_sealed()
+            new_records, consumed = decode_records(segment.read(offset))
+            records.extend(new_records)
+            offset += consumed
+            if not sealed:
+                break
+            generation += 1
+            offset = 0
+        self.generation = max(self.generation, generation)
+        return records, (generation, offset)
+
+    def seal(self, generation):
+        self.segment_for(generation).seal()
+
+    def delete_before(self, generation):
+        # Segments below ``generation`` are fully folded into a snapshot
+        for old in range(generation - 1, -1, -1):
+            segment = self.segment_for(old)
+            if not segment.exists() and not segment.is_sealed():
+                break
+            segment.delete()
@@ -0,0 +1,225 @@
+import hashlib
+import io
+import threading
+from urllib.parse import quote, unquote
+
+from storage import Blob, BlobNotFound
+from xlsx_reader import LazyWorkbook
+
+METADATA_BLOB = 'MetricsAndCategories.xlsx'
+PARTITION_DIR = 'StagingData/'
+STAGING_HEADER = ["fiscal_year", "quarter", "start_date", "end_date", "category", "metric", "value", "target"]
+
+
+def partition_prefix(blob_name):
+    # CareerCenterMetrics.xlsx -> CareerCenterMetrics/
+    return blob_name.rsplit('.', 1)[0] + '/'
+
+
+def partition_name(prefix, fiscal_year):
+    return prefix + PARTITION_DIR + quote(fiscal_year, safe='') + '.xlsx'
+
+
+def write_workbook(sheet_name, rows):
+    """xlsx bytes of a one-sheet workbook holding ``rows`` (header first), written in write-only mode."""
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet(sheet_name)
+    for row in rows:
+        sheet.append(row)
+    stream = io.BytesIO()
+    wb.save(stream)
+    return stream.getvalue()
+
+
+class Partition:
+    """One blob of the partitioned layout as last fetched or saved by this process."""
+
+    def __init__(self, name, etag, last_modified, wb, fiscal_year=None):
+        self.name = name
+        self.etag = etag
+        self.last_modified = last_modified
+        self.wb = wb
+        self.fiscal_year = fiscal_year
+        self.store = None  # StagingStore of the partition's rows, parsed on demand
+
+
+class PartitionedWorkbook:
+    """The workbook as one StagingData blob per fiscal year plus a MetricsAndCategories blob.
+
+    Reads of other sheets go to the metadata workbook; the app combines the
+    partitions' StagingData itself. Writers take the sheet of one year from
+    ``staging_sheet``, which creates the partition of a new year, and
+    ``to_bytes`` serializes only the partitions touched since the last save.
+    """
+
+    def __init__(self, prefix, metadata, partitions):
+        self.prefix = prefix
+        self.metadata = metadata      # Partition holding MetricsAndCategories
+        self.partitions = partitions  # fiscal year -> Partition
+        self.touched = set()
+
+    def rows(self, sheet_name, columns=None, date_columns=(), min_row=2):
+        return self.metadata.wb.rows(sheet_name, columns=columns, date_columns=date_columns, min_row=min_row)
+
+    def staging_sheet(self, fiscal_year):
+        partition = self.partitions.get(fiscal_year)
+        if partition is None:
+            import openpyxl
+            book = openpyxl.Workbook()
+            sheet = book.active
+            sheet.title = "StagingData"
+            sheet.append(self._header())
+            partition = self.partitions[fiscal_year] = Partition(
+                partition_name(self.prefix, fiscal_year), None, None, LazyWorkbook(None, book), fiscal_year)
+        self.touched.add(fiscal_year)
+        return partition.wb["StagingData"]
+
+    def _header(self):
+        # A new year's sheet gets the header of the latest existing one
+        for fiscal_year in sorted(self.partitions, reverse=True):
+            wb = self.partitions[fiscal_year].wb
+            if wb.data is None:
+                # Created earlier in this batch and not saved yet: only openpyxl has it
+                header = next(wb.workbook["StagingData"].iter_rows(max_row=1, values_only=True), None)
+                if header:
+                    return list(header)
+                continue
+            for _, values in wb.rows("StagingData", min_row=1):
+                return list(values)
+        return list(STAGING_HEADER)
+
+    def to_bytes(self):
+        return {fiscal_year: self.partitions[fiscal_year].wb.to_bytes() for fiscal_year in sorted(self.touched)}
+
+
+class PartitionedStorage:
+    """StagingData kept as one blob per fiscal year under ``prefix``, next to a MetricsAndCategories blob.
+
+    ``fetch`` lists every blob under the prefix in one call and downloads only
+    those whose ETag changed since this process last fetched or saved them;
+    the rest, with their parsed StagingStores, are reused until ``invalidate``. The version of the
+    whole is a hash of all the ETags. ``put`` uploads only the partitions a
+    write touched, each conditionally on the ETag it was read at.
+    """
+
+    def __init__(self, storage, prefix):
+        self.storage = storage
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.partitions = {}  # blob name -> Partition
+
+    @property
+    def metadata_name(self):
+        return self.prefix + METADATA_BLOB
+
+    def fiscal_year_of(self, name):
+        # Fiscal year of a partition blob name, None for any other blob
+        start = self.prefix + PARTITION_DIR
+        if not name.startswith(start) or not name.endswith('.xlsx'):
+            return None
+        return unquote(name[len(start):-len('.xlsx')])
+
+    @staticmethod
+    def version(etags):
+        # ``etags``: {blob name: ETag}
+        text = '\n'.join(f"{name}={etag}" for name, etag in sorted(etags.items()))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def fetch(self, version):
+        """(blob, PartitionedWorkbook) unless ``version`` is still current (then None).
+
+        ``blob`` carries the version and newest modification time of the whole.
+        """
+        listing = self.storage.list_blobs(self.prefix)
+        listing = {name: blob for name, blob in listing.items()
+                   if name == self.metadata_name or self.fiscal_year_of(name) is not None}
+        if self.metadata_name not in listing:
+            raise BlobNotFound(self.metadata_name)
+        if version is not None and self.version({name: blob.etag for name, blob in listing.items()}) == version:
+            return None
+
+        with self.lock:
+            known = dict(self.partitions)
+        fetched = {}
+        for name, listed in listing.items():
+            partition = known.get(name)
+            if partition is None or partition.etag != listed.etag:
+                blob = self.storage.get(name)
+                partition = Partition(name, blob.etag, blob.last_modified, LazyWorkbook(blob.data),
+                                      self.fiscal_year_of(name))
+            fetched[name] = partition
+        with self.lock:
+            self.partitions = fetched
+
+        wb = PartitionedWorkbook(self.prefix, fetched[self.metadata_name],
+                                 {partition.fiscal_year: partition for name, partition in fetched.items()
+                                  if name != self.metadata_name})
+        return self.blob(wb), wb
+
+    def blob(self, wb):
+        partitions = [wb.metadata] + list(wb.partitions.values())
+        etags = {partition.name: partition.etag for partition in partitions}
+        last_modified = max((partition.last_modified for partition in partitions if partition.last_modified),
+                            default=None)
+        return Blob(None, self.version(etags), last_modified)
+
+    def invalidate(self):
+        """Forget every partition a writer opened, so the next fetch downloads it again.
+
+        Called when a write batch fails or conflicts: its edits may already be
+        in those partitions' workbooks and must not reach the next upload.
+        """
+        with self.lock:
+            self.partitions = {name: partition for name, partition in self.partitions.items()
+                               if not partition.wb.opened}
+
+    def put(self, wb, data):
+        """Upload the partitions in ``data`` ({fiscal year: xlsx bytes} from ``wb.to_bytes()``).
+
+        Each is written only over the version it was read at (a new year's
+        only if nobody created it meanwhile), raising PreconditionFailed
+        otherwise; partitions uploaded before the conflict stay written.
+        Returns the Blob of the whole after the upload.
+        """
+        try:
+            for fiscal_year, partition_data in data.items():
+                partition = wb.partitions[fiscal_year]
+                if partition.etag is None:
+                    result = self.storage.put(partition.name, partition_data, if_none_match='*')
+                else:
+                    result = self.storage.put(partition.name, partition_data, if_match=partition.etag)
+                partition.etag = result.etag
+                partition.last_modified = result.last_modified
+                # The combined store holds the edits; this partition's own store is parsed again when needed
+                partition.store = None
+                wb.touched.discard(fiscal_year)
+                with self.lock:
+                    self.partitions[partition.name] = partition
+        except Exception:
+            # Their workbooks hold edits that may not have been uploaded: download them again next time
+            with self.lock:
+                for fiscal_year in data:
+                    self.partitions.pop(wb.partitions[fiscal_year].name, None)
+            raise
+        return self.blob(wb)
+
+    def split(self, staging_rows, metrics_rows):
+        """Upload the partitioned layout of a whole workbook.
+
+        ``staging_rows`` and ``metrics_rows`` are the sheets' rows, header
+        first. The partitions go first and the metadata blob last, so the
+        layout only shows up once it is complete. Returns {blob name: rows}.
+        """
+        header, *rows = staging_rows
+        years = {}
+        for row in rows:
+            years.setdefault(str(row[0]).strip(), []).append(row)
+        written = {}
+        for fiscal_year, year_rows in sorted(years.items()):
+            name = partition_name(self.prefix, fiscal_year)
+            self.storage.put(name, write_workbook("StagingData", [header] + year_rows))
+            written[name] = len(year_rows)
+        self.storage.put(self.metadata_name, write_workbook("MetricsAndCategories", metrics_rows))
+        written[self.metadata_name] = len(metrics_rows) - 1
+        return written
@@ -0,0 +1,185 @@
+import csv
+import os
+import re
+import tempfile
+import threading
+import time
+
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def summary_rows(aggregates, fiscal_years):
+    """(header, rows) of a multi-year summary: per metric, its total in every fiscal year.
+
+    ``aggregates`` is what ``Rollups.aggregates`` returns; years a metric has
+    no rows in are left empty.
+    """
+    header = ['Category', 'Group', 'Metric'] + list(fiscal_years)
+    rows = []
+    for category in aggregates['categories']:
+        for group in category['groups']:
+            for metric in group['yearly']['metrics']:
+                totals = {point['year']: point['value'] for point in metric['values']}
+                rows.append([category['category'], group['group'], metric['metric']]
+                            + [totals.get(year) for year in fiscal_years])
+    return header, rows
+
+
+def write_report(path, output, header, rows):
+    # Runs in a pool process. Written beside ``path`` and renamed, so a report file is always complete
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile('wb', dir=directory, prefix='.tmp-', delete=False) as f:
+        temp_path = f.name
+    try:
+        if output == 'csv':
+            with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+        else:
+            from openpyxl import Workbook
+            # Write-only mode streams rows to disk instead of keeping every cell in memory
+            wb = Workbook(write_only=True)
+            sheet = wb.create_sheet("Summary")
+            sheet.append(header)
+            for row in rows:
+                sheet.append(row)
+            wb.save(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return path
+
+
+class ReportJobs:
+    """Report exports written by a process pool into ``directory``.
+
+    A job id is derived from the workbook version and the report options, so
+    asking for the same report again returns the same job, and a file any
+    worker on the host already wrote is served without running it again.
+    Job state is kept beside the files, so any worker can report it: a
+    ``<job id>.pending`` marker while the report is written and a
+    ``<job id>.failed`` file with the error if writing it failed. Markers
+    older than ``stale_after`` seconds (left by a worker that died) are
+    ignored and pruned. The newest ``keep`` reports are retained.
+
+    The pool is created lazily and again after a fork, and starts its
+    processes with spawn so they never inherit a gunicorn worker's threads.
+    """
+
+    def __init__(self, directory, workers=2, keep=50, stale_after=600):
+        self.directory = directory
+        self.workers = workers
+        self.keep = keep
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.jobs = {}      # job id -> Future
+        self._pool = None
+        self._pid = None
+
+    @property
+    def pool(self):
+        # Caller must hold self.lock
+        if self._pool is None or self._pid != os.getpid():
+            # Imported here: multiprocessing is only needed once someone asks for a report
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+            self._pid = os.getpid()
+            self.jobs = {}
+        return self._pool
+
+    @staticmethod
+    def valid_id(job_id):
+        return re.fullmatch(r'[0-9a-f]{40}', job_id or '') is not None
+
+    def find(self, job_id):
+        """(path, output format) of the finished report, or None."""
+        for output in FORMATS:
+            path = os.path.join(self.directory, f"{job_id}.{output}")
+            if os.path.exists(path):
+                return path, output
+        return None
+
+    def marker(self, job_id, state):
+        return os.path.join(self.directory, f"{job_id}.{state}")
+
+    def read_marker(self, job_id, state):
+        """Contents of a fresh ``state`` marker of the job, or None."""
+        try:
+            with open(self.marker(job_id, state), encoding='utf-8') as f:
+                if time.time() - os.fstat(f.fileno()).st_mtime > self.stale_after:
+                    return None
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def remove_marker(self, job_id, state):
+        try:
+            os.remove(self.marker(job_id, state))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, job_id, output, header, rows):
+        """Start writing the report unless it is already written or being written (by any worker)."""
+        with self.lock:
+            future = self.jobs.get(job_id)
+            if future is not None and not (future.done() and future.exception() is not None):
+                return
+            if self.find(job_id) is not None or self.read_marker(job_id, 'pending') is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.marker(job_id, 'pending'), 'w'):
+                pass
+            self.remove_marker(job_id, 'failed')
+            path = os.path.join(self.directory, f"{job_id}.{output}")
+            future = self.jobs[job_id] = self.pool.submit(write_report, path, output, header, rows)
+        future.add_done_callback(lambda _: self.finished(job_id, future))
+
+    def finished(self, job_id, future):
+        # The failure is recorded before the pending marker goes, so other workers never see the job as unknown
+        if future.exception() is not None:
+            with open(self.marker(job_id, 'failed'), 'w', encoding='utf-8') as f:
+                f.write(str(future.exception()))
+        self.remove_marker(job_id, 'pending')
+        self.prune()
+
+    def status(self, job_id):
+        """{'job_id', 'status': 'pending' | 'done' | 'failed'[, 'error']}, or None for an unknown job."""
+        with self.lock:
+            future = self.jobs.get(job_id)
+        if future is not None and not future.done():
+            return {'job_id': job_id, 'status': 'pending'}
+        if future is not None and future.exception() is not None:
+            return {'job_id': job_id, 'status': 'failed', 'error': str(future.exception())}
+        if self.find(job_id) is not None:
+            return {'job_id': job_id, 'status': 'done'}
+        # Written by another worker
+        if self.read_marker(job_id, 'pending') is not None:
+            return {'job_id': job_id, 'status': 'pending'}
+        error = self.read_marker(job_id, 'failed')
+        if error is not None:
+            return {'job_id': job_id, 'status': 'failed', 'error': error}
+        return None
+
+    def prune(self):
+        try:
+            reports = []
+            for entry in os.scandir(self.directory):
+                extension = entry.name.rpartition('.')[2]
+                if entry.name.startswith('.'):
+                    continue
+                if extension in FORMATS:
+                    reports.append(entry)
+                elif extension in ('pending', 'failed') and time.time() - entry.stat().st_mtime > self.stale_after:
+                    os.remove(entry.path)
+            reports.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+            for entry in reports[self.keep:]:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # removed by another worker's prune meanwhile
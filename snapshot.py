@@ -0,0 +1,165 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent workers may then build the same snapshot twice
+    fcntl = None
+
+from staging import StagingStore
+
+MAGIC = b'CCSNAP01'
+ALIGN = 8
+
+# File layout: MAGIC, header length (uint64 LE), JSON header, padding to 8 bytes,
+# then each column's raw bytes at the (8-byte aligned) offset the header gives
+# relative to the end of that padding.
+
+
+def data_start(header_length):
+    start = len(MAGIC) + 8 + header_length
+    return start + (-start % ALIGN)
+
+
+class Snapshot:
+    """One workbook version opened from disk.
+
+    ``store`` reads its columns from the mapped snapshot file and ``data`` is
+    the mapped xlsx, so every worker on the host shares the same pages.
+    """
+
+    def __init__(self, etag, last_modified, metadata, store, extra, data):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.metadata = metadata
+        self.store = store
+        self.extra = extra
+        self.data = data
+
+
+class SnapshotCache:
+    """Workbook versions kept as columnar snapshot files under ``directory``.
+
+    The first worker to see a version downloads and parses it and writes two
+    files named after its ETag: the xlsx itself and the StagingStore columns
+    with their string tables. Other workers wait on the build lock and then
+    mmap those instead of downloading. Files are renamed into place, so a
+    snapshot is either absent or complete; the newest ``keep`` are retained
+    (a worker still mapping an older one keeps its pages until it lets go).
+    """
+
+    def __init__(self, directory, keep=3):
+        self.directory = directory
+        self.keep = keep
+
+    def paths(self, etag):
+        name = hashlib.sha1(etag.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.snap'), os.path.join(self.directory, name + '.xlsx')
+
+    @contextmanager
+    def build_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.build.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def open(self, etag):
+        """The snapshot of ``etag``, or None when there is none (or it is unreadable)."""
+        snap_path, xlsx_path = self.paths(etag)
+        try:
+            with open(snap_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(xlsx_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if mapped[:len(MAGIC)] != MAGIC:
+            return None
+        header_length, = struct.unpack_from('<Q', mapped, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(mapped[start:start + header_length])
+        base = data_start(header_length)
+        view = memoryview(mapped)
+        columns = {}
+        for name, (typecode, itemsize, offset, length) in header['columns'].items():
+            if array(typecode).itemsize != itemsize:
+                return None  # written on a platform with other C type sizes
+            columns[name] = view[base + offset:base + offset + length].cast(typecode)
+
+        store = StagingStore.from_buffers(header['tables'], columns)
+        last_modified = datetime.fromisoformat(header['last_modified']) if header['last_modified'] else None
+        return Snapshot(header['etag'], last_modified, header['metadata'], store, header['extra'], data)
+
+    def write(self, etag, last_modified, metadata, store, extra, data):
+        os.makedirs(self.directory, exist_ok=True)
+        snap_path, xlsx_path = self.paths(etag)
+        tables, buffers = store.to_buffers()
+
+        columns = {}
+        offset = 0
+        for name, (typecode, column) in buffers.items():
+            length = memoryview(column).nbytes
+            columns[name] = [typecode, array(typecode).itemsize, offset, length]
+            offset += length + (-length % ALIGN)
+        header = {
+            'etag': etag,
+            'last_modified': last_modified.isoformat() if last_modified else None,
+            'metadata': metadata or {},
+            'extra': extra,
+            'tables': tables,
+            'columns': columns,
+        }
+        header_bytes = json.dumps(header).encode('utf-8')
+
+        self._replace(xlsx_path, [data])
+        chunks = [MAGIC, struct.pack('<Q', len(header_bytes)), header_bytes,
+                  b'\0' * (data_start(len(header_bytes)) - len(MAGIC) - 8 - len(header_bytes))]
+        for name, (typecode, column) in buffers.items():
+            length = columns[name][3]
+            chunks.append(memoryview(column).cast('B'))
+            chunks.append(b'\0' * (-length % ALIGN))
+        # The .snap file goes last: its presence means the version is complete
+        self._replace(snap_path, chunks)
+        self.prune()
+
+    def _replace(self, path, chunks):
+        with tempfile.NamedTemporaryFile('wb', dir=self.directory, prefix='.tmp-', delete=False) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(f.name, path)
+
+    def get_or_build(self, etag, build):
+        """The snapshot of ``etag``, built with ``build()`` by whichever worker gets here first.
+
+        ``build()`` returns (blob, store, extra) for the version it downloaded,
+        which may be newer than ``etag``; the snapshot of that one is returned.
+        """
+        snapshot = self.open(etag)
+        if snapshot is not None:
+            return snapshot
+        with self.build_lock():
+            snapshot = self.open(etag)
+            if snapshot is not None:
+                return snapshot
+            blob, store, extra = build()
+            self.write(blob.etag, blob.last_modified, blob.metadata, store, extra, blob.data)
+        return self.open(blob.etag)
+
+    def prune(self):
+        snaps = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.snap')),
+                       key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in snaps[self.keep:]:
+            for path in (entry.path, entry.path[:-len('.snap')] + '.xlsx'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,493 @@
+import copy
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+
+# Bit flags stored per row in StagingStore.flags
+NUMBERS_OK = 1     # value and target columns parsed as numbers (or were empty)
+HAS_TARGET = 2     # target column holds a number
+COMPLETE = 4       # row has all 8 StagingData columns
+
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+
+# Zero-based indexes of the start_date/end_date columns in StagingData
+DATE_COLUMNS = (2, 3)
+
+
+def parse_date_ordinal(value):
+    # Dates are kept as proleptic ordinals, 0 means missing or unparseable
+    if not value:
+        return 0
+    if isinstance(value, datetime):
+        return value.toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').toordinal()
+    except ValueError:
+        return 0
+
+
+def format_date_ordinal(ordinal):
+    if not ordinal:
+        return None
+    return date.fromordinal(ordinal).strftime('%Y-%m-%d')
+
+
+class StringTable:
+    """Interns the strings of one column and hands out small integer codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def intern(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        return self.codes.get(value)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+
+class DateIndex:
+    """Rows of a StagingStore ordered by start_date, for period overlap lookups.
+
+    ``starts`` holds the start dates of every dated row in ascending order and
+    ``order`` their positions. No period is longer than ``longest`` days, so
+    the rows overlapping a window all start within ``longest`` days before
+    it; two binary searches bound them and only those have their end_date
+    checked. The index is tied to the column arrays it was built from.
+    """
+
+    def __init__(self, store, size=0, starts=None, order=None, longest=0):
+        self.start_date = store.start_date
+        self.end_date = store.end_date
+        self.size = size
+        self.starts = starts if starts is not None else array('i')
+        self.order = order if order is not None else array('I')
+        self.longest = longest
+
+    @classmethod
+    def build(cls, store):
+        start_date, end_date = store.start_date, store.end_date
+        order = sorted((i for i in range(len(store)) if start_date[i] and end_date[i]),
+                       key=start_date.__getitem__)
+        longest = max((end_date[i] - start_date[i] for i in order), default=0)
+        return cls(store, len(store), array('i', (start_date[i] for i in order)), array('I', order),
+                   max(longest, 0))
+
+    def covers(self, store):
+        # Deletes (and the first write to a mapped store) swap in new arrays; appends only grow them
+        return self.start_date is store.start_date and self.end_date is store.end_date and self.size <= len(store)
+
+    def extended(self, store):
+        """A new index that also holds the rows appended to ``store`` since this one was built."""
+        index = DateIndex(store, len(store), array('i', self.starts), array('I', self.order), self.longest)
+        start_date, end_date = store.start_date, store.end_date
+        for i in range(self.size, len(store)):
+            if start_date[i] and end_date[i]:
+                k = bisect_right(index.starts, start_date[i])
+                index.starts.insert(k, start_date[i])
+                index.order.insert(k, i)
+                index.longest = max(index.longest, end_date[i] - start_date[i])
+        return index
+
+    def overlapping(self, date_from=0, date_to=0):
+        """Positions of rows whose period overlaps date_from..date_to (ordinals, 0 leaves that side open)."""
+        starts, order, end_date = self.starts, self.order, self.end_date
+        low = bisect_left(starts, date_from - self.longest) if date_from else 0
+        high = bisect_right(starts, date_to) if date_to else len(starts)
+        if not date_from:
+            return list(order[low:high])
+        return [i for i in order[low:high] if end_date[i] >= date_from]
+
+
+class StagingStore:
+    """Columnar, typed copy of the StagingData sheet.
+
+    Each row is spread over parallel arrays: interned codes for the text
+    columns, ordinal integers for the dates and float64 for value/target,
+    with a flag byte recording which values were present. ``row_number``
+    keeps the sheet row each entry came from so writes can find their cell.
+
+    Two hash indexes are maintained alongside the columns: ``key_index`` maps
+    (fiscal_year, quarter, category, metric) codes to the first matching
+    position and ``group_index`` maps (fiscal_year, quarter, category) codes
+    to all matching positions.
+
+    A store opened with ``from_buffers`` reads its columns straight from
+    read-only memoryviews (e.g. over an mmapped snapshot) and copies them
+    into arrays the first time a row is changed.
+
+    When ``rollups`` is set (see ``analytics.Rollups.from_store``) every
+    change to the rows is reported to it as well.
+
+    A ``partitioned`` store holds rows from one sheet per fiscal year (see
+    ``concat``): ``row_number`` counts within each year's sheet.
+
+    Date windows are answered from a ``DateIndex``, built on first use and
+    brought up to date on the next query after the rows change.
+    """
+
+    COLUMNS = ('fiscal_year', 'quarter', 'category', 'metric', 'start_date',
+               'end_date', 'value', 'target', 'flags', 'row_number')
+
+    def __init__(self):
+        self.fiscal_years = StringTable()
+        self.quarters = StringTable()
+        self.categories = StringTable()
+        self.metrics = StringTable()
+
+        self.fiscal_year = array('H')
+        self.quarter = array('H')
+        self.category = array('I')
+        self.metric = array('I')
+        self.start_date = array('i')
+        self.end_date = array('i')
+        self.value = array('d')
+        self.target = array('d')
+        self.flags = bytearray()
+        self.row_number = array('I')
+
+        self.key_index = {}
+        self.group_index = {}
+        self.mapped = False
+        self.rollups = None
+        self.partitioned = False
+        self._date_index = None
+
+    @classmethod
+    def from_worksheet(cls, sheet):
+        return cls.from_rows(enumerate(sheet.iter_rows(min_row=2, values_only=True), 2))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (sheet row number, values) pairs, e.g. ``XlsxReader.rows``."""
+        store = cls()
+        for row_num, row in rows:
+            store.append_row(row_num, row)
+        return store
+
+    TABLES = ('fiscal_years', 'quarters', 'categories', 'metrics')
+    # Code column -> the string table it indexes
+    CODED = (('fiscal_year', 'fiscal_years'), ('quarter', 'quarters'),
+             ('category', 'categories'), ('metric', 'metrics'))
+
+    @classmethod
+    def concat(cls, stores, partitioned=True):
+        """One store with the rows of ``stores`` in order, each keeping its ``row_number``."""
+        combined = cls()
+        for store in stores:
+            for column, table in cls.CODED:
+                target_table = getattr(combined, table)
+                recode = [target_table.intern(value) for value in getattr(store, table).values]
+                getattr(combined, column).extend(map(recode.__getitem__, getattr(store, column)))
+            for name in ('start_date', 'end_date', 'value', 'target', 'row_number'):
+                getattr(combined, name).extend(getattr(store, name))
+            combined.flags.extend(store.flags)
+        combined.partitioned = partitioned
+        combined._rebuild_indexes()
+        return combined
+
+    def to_buffers(self):
+        """String tables and (typecode, buffer) per column, for writing a snapshot."""
+        tables = {name: list(getattr(self, name).values) for name in self.TABLES}
+        columns = {}
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if name == 'flags':
+                typecode = 'B'
+            else:
+                typecode = column.typecode if isinstance(column, array) else column.format
+            columns[name] = (typecode, column)
+        return tables, columns
+
+    @classmethod
+    def from_buffers(cls, tables, columns):
+        """Open a store over ``columns`` ({name: memoryview cast to its typecode}) without copying."""
+        store = cls()
+        for name in cls.TABLES:
+            table = getattr(store, name)
+            for value in tables[name]:
+                table.intern(value)
+        for name in cls.COLUMNS:
+            setattr(store, name, columns[name])
+        store.mapped = True
+        store._rebuild_indexes()
+        return store
+
+    def _make_writable(self):
+        # Copy memoryview columns into arrays before the first change
+        if not self.mapped:
+            return
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if name == 'flags':
+                setattr(self, name, bytearray(column))
+            else:
+                writable = array(column.format)
+                writable.frombytes(column.cast('B'))
+                setattr(self, name, writable)
+        self.mapped = False
+
+    def __len__(self):
+        return len(self.row_number)
+
+    def append_row(self, row_num, row):
+        if not row or len(row) < 6 or all(cell is None for cell in row[:6]):
+            return None
+        self._make_writable()
+
+        flags = 0
+        value = 0.0
+        target = 0.0
+        try:
+            if len(row) > 6 and row[6] is not None:
+                value = float(str(row[6]).strip())
+            flags |= NUMBERS_OK
+        except (ValueError, TypeError):
+            pass
+        if len(row) > 7 and row[7] is not None:
+            try:
+                target = float(str(row[7]).strip())
+                flags |= HAS_TARGET
+            except (ValueError, TypeError):
+                flags &= ~NUMBERS_OK
+        if len(row) >= 8:
+            flags |= COMPLETE
+
+        self.fiscal_year.append(self.fiscal_years.intern(str(row[0]).strip()))
+        self.quarter.append(self.quarters.intern(str(row[1]).strip()))
+        self.category.append(self.categories.intern(str(row[4]).strip()))
+        self.metric.append(self.metrics.intern(str(row[5]).strip()))
+        self.start_date.append(parse_date_ordinal(row[2]))
+        self.end_date.append(parse_date_ordinal(row[3]))
+        self.value.append(value)
+        self.target.append(target)
+        self.flags.append(flags)
+        self.row_number.append(row_num)
+        position = len(self.row_number) - 1
+        self._index(position)
+        if self.rollups is not None:
+            self.rollups.insert(self, position)
+        return position
+
+    def _index(self, i):
+        group = (self.fiscal_year[i], self.quarter[i], self.category[i])
+        self.group_index.setdefault(group, []).append(i)
+        self.key_index.setdefault(group + (self.metric[i],), i)
+
+    def _rebuild_indexes(self):
+        self.key_index = {}
+        self.group_index = {}
+        for i in range(len(self)):
+            self._index(i)
+
+    def set_numbers(self, i, value, target):
+        """Overwrite value/target of an existing row, as form() does in the sheet."""
+        self._make_writable()
+        if self.rollups is not None:
+            self.rollups.remove(self, [i])
+        self.value[i] = value
+        if target is None:
+            self.target[i] = 0.0
+            self.flags[i] = (self.flags[i] | NUMBERS_OK) & ~HAS_TARGET
+        else:
+            self.target[i] = target
+            self.flags[i] |= NUMBERS_OK | HAS_TARGET
+        if self.rollups is not None:
+            self.rollups.restore(self, [i])
+
+    def delete(self, positions):
+        """Drop rows the same way ``sheet.delete_rows`` does.
+
+        Later rows move up, so their ``row_number`` is shifted by the number of
+        deleted sheet rows above them and the indexes are rebuilt.
+        """
+        dead = set(positions)
+        if not dead:
+            return
+        if self.rollups is not None:
+            self.rollups.delete(self, dead)
+        # Row number 0 marks rows that only exist in the store (journal overlay).
+        # Partitioned, only rows of the same fiscal year share a sheet and move up.
+        removed_rows = {}
+        for i in dead:
+            if self.row_number[i]:
+                sheet = self.fiscal_year[i] if self.partitioned else None
+                removed_rows.setdefault(sheet, []).append(self.row_number[i])
+        for rows in removed_rows.values():
+            rows.sort()
+        keep = [i for i in range(len(self)) if i not in dead]
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if name == 'flags':
+                setattr(self, name, bytearray(column[i] for i in keep))
+            else:
+                typecode = column.typecode if isinstance(column, array) else column.format
+                setattr(self, name, array(typecode, (column[i] for i in keep)))
+        self.mapped = False
+        row_number = self.row_number
+        fiscal_year = self.fiscal_year
+        for i, row_num in enumerate(row_number):
+            rows = removed_rows.get(fiscal_year[i] if self.partitioned else None)
+            if rows:
+                row_number[i] = row_num - bisect_left(rows, row_num)
+        self._rebuild_indexes()
+
+    def lookup(self, fiscal_year, quarter, category, metric):
+        """Position of the first row with this composite key, or None."""
+        key = (self.fiscal_years.code(fiscal_year), self.quarters.code(quarter),
+               self.categories.code(category), self.metrics.code(metric))
+        return self.key_index.get(key)
+
+    def group(self, fiscal_year, quarter, category):
+        """Positions of every row for (fiscal_year, quarter, category)."""
+        key = (self.fiscal_years.code(fiscal_year), self.quarters.code(quarter),
+               self.categories.code(category))
+        return list(self.group_index.get(key, ()))
+
+    def is_valid(self, i):
+        # Rows get_metrics_data would return: all columns present and numeric
+        return self.flags[i] & (NUMBERS_OK | COMPLETE) == NUMBERS_OK | COMPLETE
+
+    def get_target(self, i):
+        return self.target[i] if self.flags[i] & HAS_TARGET else None
+
+    def record(self, i):
+        return {
+            'fiscal_year': self.fiscal_years[self.fiscal_year[i]],
+            'quarter': self.quarters[self.quarter[i]],
+            'start_date': format_date_ordinal(self.start_date[i]),
+            'end_date': format_date_ordinal(self.end_date[i]),
+            'category': self.categories[self.category[i]],
+            'metric': self.metrics[self.metric[i]],
+            'value': self.value[i],
+            'target': self.get_target(i),
+        }
+
+    def find(self, fiscal_year=None, quarter=None, category=None, metric=None):
+        """Return the positions of rows matching every given column value.
+
+        Lookups on (fiscal_year, quarter, category) and on the full composite
+        key are answered from the hash indexes; the latter yields only the first
+        matching row, which is the one form() updates.
+        """
+        if fiscal_year is not None and quarter is not None and category is not None:
+            if metric is None:
+                return self.group(fiscal_year, quarter, category)
+            position = self.lookup(fiscal_year, quarter, category, metric)
+            return [] if position is None else [position]
+
+        return self._filter(range(len(self)), fiscal_year, quarter, category, metric)
+
+    def _filter(self, positions, fiscal_year=None, quarter=None, category=None, metric=None):
+        # Each filter is a value or a list of values to match any of
+        filters = []
+        for column, table, wanted in ((self.fiscal_year, self.fiscal_years, fiscal_year),
+                                      (self.quarter, self.quarters, quarter),
+                                      (self.category, self.categories, category),
+                                      (self.metric, self.metrics, metric)):
+            if wanted is None:
+                continue
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            codes = {table.code(value) for value in wanted} - {None}
+            if not codes:
+                return []
+            filters.append((column, codes))
+
+        for column, codes in filters:
+            if len(codes) == 1:
+                code, = codes
+                positions = [i for i in positions if column[i] == code]
+            else:
+                positions = [i for i in positions if column[i] in codes]
+        return list(positions)
+
+    def date_index(self):
+        index = self._date_index
+        if index is None or not index.covers(self):
+            index = DateIndex.build(self)
+        elif index.size < len(self):
+            index = index.extended(self)
+        self._date_index = index
+        return index
+
+    def select(self, fiscal_year=None, category=None, metric=None, date_from=0, date_to=0):
+        """Positions of complete, numeric rows matching the filters, in sheet order.
+
+        ``date_from``/``date_to`` are ordinals; a row matches when its
+        start_date..end_date period overlaps the window. ``category`` and
+        ``metric`` may also be lists.
+        """
+        if date_from or date_to:
+            positions = sorted(self.date_index().overlapping(date_from, date_to))
+            positions = self._filter(positions, fiscal_year, None, category, metric)
+        elif isinstance(category, (list, tuple)) or isinstance(metric, (list, tuple)):
+            positions = self._filter(range(len(self)), fiscal_year, None, category, metric)
+        else:
+            positions = self.find(fiscal_year=fiscal_year, category=category, metric=metric)
+        return [i for i in positions if self.is_valid(i)]
+
+    def view(self):
+        """A read-only copy sharing the current column arrays.
+
+        Deletes swap in new arrays on the store and appends only grow them, so
+        positions selected under the cache lock keep naming the same rows in
+        the view while it is streamed without the lock.
+        """
+        view = copy.copy(self)
+        view.rollups = None
+        return view
+
+    def iter_records(self, positions):
+        """``record(i)`` for each position, from the column arrays as they are now.
+
+        The arrays are bound when this is called, not when iteration starts.
+        """
+        fiscal_year, quarter, category, metric = self.fiscal_year, self.quarter, self.category, self.metric
+        start_date, end_date, value, target, flags = (self.start_date, self.end_date, self.value,
+                                                      self.target, self.flags)
+        fiscal_years, quarters = self.fiscal_years.values, self.quarters.values
+        categories, metrics = self.categories.values, self.metrics.values
+        return ({
+            'fiscal_year': fiscal_years[fiscal_year[i]],
+            'quarter': quarters[quarter[i]],
+            'start_date': format_date_ordinal(start_date[i]),
+            'end_date': format_date_ordinal(end_date[i]),
+            'category': categories[category[i]],
+            'metric': metrics[metric[i]],
+            'value': value[i],
+            'target': target[i] if flags[i] & HAS_TARGET else None,
+        } for i in positions)
+
+    RECORD_FIELDS = ('fiscal_year', 'quarter', 'start_date', 'end_date', 'category', 'metric', 'value', 'target')
+
+    def iter_column(self, name, positions):
+        """Yield the ``record()`` field ``name`` for each position."""
+        column = getattr(self, name)
+        if name in ('fiscal_year', 'quarter', 'category', 'metric'):
+            values = {'fiscal_year': self.fiscal_years, 'quarter': self.quarters,
+                      'category': self.categories, 'metric': self.metrics}[name].values
+            return (values[column[i]] for i in positions)
+        if name in ('start_date', 'end_date'):
+            return (format_date_ordinal(column[i]) for i in positions)
+        if name == 'target':
+            flags = self.flags
+            return (column[i] if flags[i] & HAS_TARGET else None for i in positions)
+        return (column[i] for i in positions)
+
+    def distinct_fiscal_years(self):
+        present = set(self.fiscal_years[code] for code in set(self.fiscal_year))
+        # Rows with an empty fiscal year cell are interned as 'None'
+        present.discard('None')
+        present.discard('')
+        return sorted(present)
@@ -1,8 +1,11 @@
 // graph.js
 // Global variables
 let currentView1 = 'quarter';
-let metricsData = [];
+let scorecards = null;
 let metricGroups = {};
+// Server-side chart series from /api/aggregates, keyed by fiscal year
+const aggregatesByYear = {};
+let currentAggregates = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     // Add toggle button listeners
@@ -15,51 +18,81 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     loadData();
+    subscribeToChanges();
 });
 
 function switchView(view) {
     currentView1 = view;
     document.getElementById('quarterView').classList.toggle('active', view === 'quarter');
     document.getElementById('yearView').classList.toggle('active', view === 'year');
-    if (metricsData.length > 0) {
-        updateGraphs();
+    if (currentAggregates) {
+        renderGraphs(currentAggregates);
     }
 }
 
-function loadData() {
-    // First, fetch metric groups
-    fetch('/get_metric_groups')
+function fetchAggregates(year) {
+    if (year && aggregatesByYear[year]) {
+        return Promise.resolve(aggregatesByYear[year]);
+    }
+    const url = year ? `/api/aggregates?fiscal_year=${encodeURIComponent(year)}` : '/api/aggregates';
+    return fetch(url)
         .then(response => response.json())
-        .then(groups => {
-            metricGroups = groups || {};
-            
-            // Then fetch metrics data
-            return fetch('/get_metrics_data');
-        })
-        .catch(error => {
-            console.error('Error loading metric groups:', error);
-            metricGroups = {}; // Initialize as empty if fetch fails
-            return fetch('/get_metrics_data');
-        })
+        .then(aggregates => {
+            if (aggregates.fiscal_year) {
+                aggregatesByYear[aggregates.fiscal_year] = aggregates;
+            }
+            return aggregates;
+        });
+}
+
+// The last /api/bootstrap payload, so a repeat visit with nothing changed since downloads almost nothing
+const BOOTSTRAP_KEY = 'dashboardBootstrap';
+
+function loadBootstrap() {
+    let saved = null;
+    try {
+        saved = JSON.parse(localStorage.getItem(BOOTSTRAP_KEY));
+    } catch (error) {
+        saved = null;
+    }
+    const url = saved && saved.version
+        ? `/api/bootstrap?since=${encodeURIComponent(saved.version)}` : '/api/bootstrap';
+    return fetch(url)
         .then(response => response.json())
+        .then(update => {
+            let data = update;
+            if (!update.full && saved) {
+                // Nothing changed since the saved payload: keep it under the same version
+                const { full, modified, ...fresh } = update;
+                data = Object.assign(saved, fresh);
+            }
+            if (data.version) {
+                try {
+                    localStorage.setItem(BOOTSTRAP_KEY, JSON.stringify(data));
+                } catch (error) {
+                    // Storage full or disabled: the next visit loads everything again
+                }
+            }
+            return data;
+        });
+}
+
+function loadData() {
+    // Groups, years, the latest year's chart series and the scorecards arrive in one response
+    loadBootstrap()
         .then(data => {
-            if (!data || data.length === 0) {
+            metricGroups = data.metric_groups || {};
+            if (!data.aggregates || !data.fiscal_years || data.fiscal_years.length === 0) {
                 displayNoDataMessage();
                 return;
             }
-            metricsData = data;
+            aggregatesByYear[data.fiscal_year] = data.aggregates;
+            setupYearSelector(data.fiscal_years);
+            renderGraphs(data.aggregates);
             
-            // If metric groups are empty, create default grouping
-            if (Object.keys(metricGroups).length === 0) {
-                const metrics = [...new Set(data.map(d => d.metric))];
-                metrics.forEach(metric => {
-                    metricGroups[metric] = "Default";
-                });
-            }
-            const years = [...new Set(data.map(d => d.fiscal_year))].sort();
-            setupYearSelector(years);
-            updateGraphs();
-            updateMetricCards(data);
+            // Scorecards for every fiscal year arrive at once, so switching years is local
+            scorecards = data.scorecards || {};
+            updateMetricCards();
             setupMetricCardListeners();
         })
         .catch(error => {
@@ -68,191 +101,133 @@ function loadData() {
         });
 }
 
+function setYearOptions(yearSelect, years) {
+    yearSelect.innerHTML = years.map(year => 
+        `<option value="${year}">AY ${year}-${parseInt(year)+1}</option>`
+    ).join('');
+}
+
 function setupYearSelector(years) {
     const yearSelect = document.getElementById('fiscalYearSelect');
     if (!yearSelect) return;
     
-    yearSelect.innerHTML = years.map(year => 
-        `<option value="${year}">AY ${year}-${parseInt(year)+1}</option>`
-    ).join('');
+    setYearOptions(yearSelect, years);
     yearSelect.value = years[years.length - 1];
     yearSelect.addEventListener('change', function() {
         updateGraphs();
-        updateMetricCards(metricsData);
+        updateMetricCards();
     });
 }
 
-function updateGraphs() {
-    if (!metricsData.length) return;
-    
-    const selectedYear = document.getElementById('fiscalYearSelect')?.value || 
-                         [...new Set(metricsData.map(d => d.fiscal_year))].sort().pop();
-    
-    const categories = [...new Set(metricsData.map(d => d.category))];
-    
-    categories.forEach(category => {
-        const categoryData = metricsData.filter(d => d.category === category);
-        if (categoryData.length > 0) {
-            // Get the container for this category
-            const containerId = `graph-${category.toLowerCase().replace(/\s+/g, '-')}`;
-            const container = document.getElementById(containerId);
-            
-            if (container) {
-                // Clear the container
-                container.innerHTML = '';
-                
-                // Group data by MetricGroup
-                const groupedByMetricGroup = groupDataByMetricGroup(categoryData);
-                
-                // Create a graph for each metric group
-                Object.entries(groupedByMetricGroup).forEach(([group, groupData]) => {
-                    // Create a container for this group
-                    const groupContainer = document.createElement('div');
-                    groupContainer.className = 'metric-group-container col-md-6 mb-4';
-                    
-                    // Add a title for the group
-                    const groupTitle = document.createElement('h6');
-                    groupTitle.className = 'metric-group-title';
-                    groupTitle.textContent = group;
-                    groupContainer.appendChild(groupTitle);
-                    
-                    // Create a container for the graph
-                    const graphContainer = document.createElement('div');
-                    graphContainer.id = `${containerId}-${group.toLowerCase().replace(/\s+/g, '-')}`;
-                    graphContainer.className = 'graph-container';
-                    groupContainer.appendChild(graphContainer);
-                    
-                    // Add the group container to the category container
-                    container.appendChild(groupContainer);
-                    
-                    // Create the graph
-                    if (currentView1 === 'year') {
-                        createYearlyGraph(graphContainer.id, processYearlyData(groupData));
-                    } else {
-                        createQuarterlyGraph(graphContainer.id, processQuarterlyData(groupData, selectedYear));
-                    }
-                });
-            }
-        }
+// Live updates: /api/changes pushes the rows each form submission changed
+let pendingChangeYears = null;
+let changeTimer = null;
+
+function subscribeToChanges() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/changes');
+    source.addEventListener('change', event => {
+        const { changes } = JSON.parse(event.data);
+        // A row shows up in its own year's charts and, as the previous year, in the next one's
+        const years = pendingChangeYears || new Set();
+        changes.forEach(change => {
+            years.add(change.fiscal_year);
+            years.add(String(parseInt(change.fiscal_year) + 1));
+        });
+        scheduleRefresh(years);
     });
+    source.addEventListener('reset', () => scheduleRefresh('all'));
 }
 
+function scheduleRefresh(years) {
+    // Coalesce bursts of events (a batch of submissions) into one refresh
+    pendingChangeYears = years === 'all' || pendingChangeYears === 'all' ? 'all' : years;
+    clearTimeout(changeTimer);
+    changeTimer = setTimeout(refreshChangedData, 250);
+}
 
-function groupDataByMetricGroup(data) {
-    const result = {};
-    
-    if (!data || !Array.isArray(data)) {
-        return result;
-    }
-    
-    data.forEach(d => {
-        if (!d || !d.metric) return; // Skip invalid data entries
-        
-        const metric = d.metric;
-        // Get the group for this metric, or use "Other" if not found
-        const group = metricGroups[metric] || "Other";
-
-        if (group == "Other") {
-            //console.log(metric);
-            //console.log(metricGroups[metric]);
-            //console.log(metricGroups);
-        }        
-        if (!result[group]) {
-            result[group] = [];
+function refreshChangedData() {
+    const years = pendingChangeYears;
+    pendingChangeYears = null;
+    Object.keys(aggregatesByYear).forEach(year => {
+        if (years === 'all' || years.has(year)) {
+            delete aggregatesByYear[year];
         }
-        
-        result[group].push(d);
     });
     
-    return result;
+    const yearSelect = document.getElementById('fiscalYearSelect');
+    const selectedYear = yearSelect?.value;
+    // Only the year on screen is fetched again; other years are fetched when selected
+    fetchAggregates(selectedYear || null)
+        .then(aggregates => {
+            if (yearSelect && aggregates.years && aggregates.years.join() !== Array.from(yearSelect.options, o => o.value).join()) {
+                setYearOptions(yearSelect, aggregates.years);
+                yearSelect.value = selectedYear && aggregates.years.includes(selectedYear)
+                    ? selectedYear : aggregates.years[aggregates.years.length - 1];
+            }
+            if (aggregates.categories) {
+                renderGraphs(aggregates);
+            }
+            return fetch('/api/scorecards');
+        })
+        .then(response => response.json())
+        .then(data => {
+            scorecards = data.scorecards || {};
+            updateMetricCards();
+        })
+        .catch(error => console.error('Error applying changes:', error));
 }
 
-
-function processYearlyData(data) {
-    if (!data || !Array.isArray(data)) return { metrics: [] };
-    
-    const metrics = [...new Set(data.map(d => d.metric))];
-    const years = [...new Set(data.map(d => d.fiscal_year))].sort();
+function updateGraphs() {
+    const selectedYear = document.getElementById('fiscalYearSelect')?.value;
     
-    return {
-        metrics: metrics.map(metric => ({
-            metric,
-            values: years.map(year => ({
-                year,
-                value: data
-                    .filter(d => d.fiscal_year === year && d.metric === metric)
-                    .reduce((acc, d) => acc + (parseFloat(d.value) || 0), 0)
-            }))
-        }))
-    };
+    fetchAggregates(selectedYear)
+        .then(renderGraphs)
+        .catch(error => console.error('Error loading aggregates:', error));
 }
 
-function processQuarterlyData(data, selectedYear) {
-    if (!data || !Array.isArray(data)) return { metrics: [] };
-    
-    const metrics = [...new Set(data.map(d => d.metric))];
-    const quarters = ['Q1', 'Q2', 'Q3', 'Q4'];
+function renderGraphs(aggregates) {
+    currentAggregates = aggregates;
     
-    return {
-        metrics: metrics.map(metric => {
-            // Process current year data with cumulative totals
-            let currentYearCumulative = 0;
-            const currentYear = quarters.filter(quarter => {
-                const match = data.find(d => 
-                    d.fiscal_year === selectedYear && 
-                    d.metric === metric && 
-                    d.quarter === quarter
-                );
-                return match !== undefined;
-            }).map(quarter => {
-                const match = data.find(d => 
-                    d.fiscal_year === selectedYear && 
-                    d.metric === metric && 
-                    d.quarter === quarter
-                );
-                const quarterValue = match ? parseFloat(match.value) : 0;
-                currentYearCumulative += quarterValue;
-                
-                return {
-                    quarter,
-                    value: currentYearCumulative,
-                    quarterValue: quarterValue, // Store individual quarter value for tooltips
-                    target: match?.target ? parseFloat(match.target) : 0
-                };
-            });
+    aggregates.categories.forEach(({ category, groups }) => {
+        // Get the container for this category
+        const containerId = `graph-${category.toLowerCase().replace(/\s+/g, '-')}`;
+        const container = document.getElementById(containerId);
+        
+        if (container) {
+            // Clear the container
+            container.innerHTML = '';
             
-            // Process previous year data with cumulative totals
-            let previousYearCumulative = 0;
-            const previousYear = quarters.filter(quarter => {
-                const match = data.find(d => 
-                    d.fiscal_year === String(parseInt(selectedYear) - 1) && 
-                    d.metric === metric && 
-                    d.quarter === quarter
-                );
-                return match !== undefined;
-            }).map(quarter => {
-                const match = data.find(d => 
-                    d.fiscal_year === String(parseInt(selectedYear) - 1) && 
-                    d.metric === metric && 
-                    d.quarter === quarter
-                );
-                const quarterValue = match ? parseFloat(match.value) : 0;
-                previousYearCumulative += quarterValue;
+            // Create a graph for each metric group
+            groups.forEach(({ group, yearly, quarterly }) => {
+                // Create a container for this group
+                const groupContainer = document.createElement('div');
+                groupContainer.className = 'metric-group-container col-md-6 mb-4';
                 
-                return {
-                    quarter,
-                    value: previousYearCumulative,
-                    quarterValue: quarterValue // Store individual quarter value for tooltips
-                };
+                // Add a title for the group
+                const groupTitle = document.createElement('h6');
+                groupTitle.className = 'metric-group-title';
+                groupTitle.textContent = group;
+                groupContainer.appendChild(groupTitle);
+                
+                // Create a container for the graph
+                const graphContainer = document.createElement('div');
+                graphContainer.id = `${containerId}-${group.toLowerCase().replace(/\s+/g, '-')}`;
+                graphContainer.className = 'graph-container';
+                groupContainer.appendChild(graphContainer);
+                
+                // Add the group container to the category container
+                container.appendChild(groupContainer);
+                
+                // Create the graph
+                if (currentView1 === 'year') {
+                    createYearlyGraph(graphContainer.id, yearly);
+                } else {
+                    createQuarterlyGraph(graphContainer.id, quarterly);
+                }
             });
-            
-            return {
-                metric,
-                currentYear,
-                previousYear
-            };
-        })
-    };
+        }
+    });
 }
 
 
@@ -883,70 +858,18 @@ function createYearlyGraph(containerId, data) {
     }
     
     
-    function updateMetricCards(data) {
-        const categories = [...new Set(data.map(d => d.category))];
+    function updateMetricCards() {
+        if (!scorecards) return;
         const selectedYear = document.getElementById('fiscalYearSelect').value;
-        const previousYear = String(parseInt(selectedYear) - 1);
+        const cards = scorecards[selectedYear] || {};
         
-        categories.forEach(category => {
-            const categoryData = data.filter(d => d.category === category);
-            
-            // Group by metric groups
-            const metricGroups = {};
-            
-            categoryData.forEach(d => {
-                const group = metricGroups[d.metric] || "Default";
-                //console.log(group);
-                if (!metricGroups[group]) {
-                    metricGroups[group] = [];
-                }
-                metricGroups[group].push(d);
-            });
-            
-            // Calculate scores for each group
-            const groupScores = [];
-            //console.log(metricGroups,Object.keys(metricGroups));
-            const groupCount = Object.keys(metricGroups).length;
-            const weightPerGroup = 100 / groupCount; // Equal weight distribution
-            
-            Object.entries(metricGroups).forEach(([group, groupData]) => {
-                const currentYearData = groupData.filter(d => d.fiscal_year === selectedYear);
-                const previousYearData = groupData.filter(d => d.fiscal_year === previousYear);
-                
-                // Calculate achievement vs targets
-                let totalAchievement = 0;
-                currentYearData.forEach(d => {
-                    const prevValue = previousYearData.find(p => p.metric === d.metric)?.value || 0;
-                    const target = prevValue>0?prevValue * 1.05:0.05;
-                    // Target is previous + 5%
-                    const achievement = target > 0 ? (d.value / target) : 0;
-                    totalAchievement += Math.min(achievement, 1); // Cap at 100%
-                    //console.log(d.metric, d.value, prevValue, target, achievement, totalAchievement,currentYearData.length,weightPerGroup);
-                });
-                
-                // Calculate group score
-                const groupScore = currentYearData.length > 0 ? 
-                    (totalAchievement / currentYearData.length) * weightPerGroup : 0;
-                
-                groupScores.push(groupScore);
-            });
-            
-            // Calculate total score
-            const totalScore = Math.round(groupScores.reduce((sum, score) => sum + score, 0));
-            
-            // Calculate trend
-            const currentTotal = categoryData.filter(d => d.fiscal_year === selectedYear)
-                .reduce((sum, d) => sum + d.value, 0);
-            const previousTotal = categoryData.filter(d => d.fiscal_year === previousYear)
-                .reduce((sum, d) => sum + d.value, 0);
-            
-            let trendPercent = 0;
+        Object.entries(cards).forEach(([category, card]) => {
+            // Scores and trends are computed on the server by /api/scorecards
+            const trendPercent = card.trend === null ? 0 : card.trend;
             let trendSymbol = '';
             let trendClass = '';
             
-            if (previousTotal > 0) {
-                trendPercent = Math.round(((currentTotal - previousTotal) / previousTotal) * 100);
-                
+            if (card.trend !== null) {
                 if (trendPercent > 0) {
                     trendSymbol = '▲';
                     trendClass = 'trend-up';
@@ -963,7 +886,7 @@ function createYearlyGraph(containerId, data) {
             const valueElement = document.getElementById(`value-${category.toLowerCase().replace(/\s+/g, '-')}`);
             const trendElement = document.getElementById(`trend-${category.toLowerCase().replace(/\s+/g, '-')}`);
             
-            if (valueElement) valueElement.textContent = totalScore;
+            if (valueElement) valueElement.textContent = card.score;
             if (trendElement) {
                 trendElement.textContent = `${trendSymbol} ${trendPercent}%`;
                 trendElement.className = `metric-trend ${trendClass}`;
@@ -986,8 +909,9 @@ function createYearlyGraph(containerId, data) {
         
     const selectedYear = document.getElementById('fiscalYearSelect').value;
     const previousYear = String(parseInt(selectedYear) - 1);
-    const categoryData = metricsData.filter(d => d.category === category);
-    //console.log(categoryData,"-----");
+    // Yearly totals per metric come from the aggregates already loaded for the charts
+    const categoryAggregates = currentAggregates?.categories.find(c => c.category === category);
+    const categoryMetrics = categoryAggregates ? categoryAggregates.groups.flatMap(g => g.yearly.metrics) : [];
     
 //modal html
     const modalHtml = `
@@ -1011,7 +935,7 @@ function createYearlyGraph(containerId, data) {
                             </tr>
                         </thead>
                         <tbody>
-                            ${generateMetricTableRows(categoryData, selectedYear)}
+                            ${generateMetricTableRows(categoryMetrics, selectedYear)}
                         </tbody>
                     </table>
                 </div>
@@ -1035,18 +959,13 @@ function createYearlyGraph(containerId, data) {
     });
     }
     
-    function generateMetricTableRows(data, selectedYear) {
+    function generateMetricTableRows(metrics, selectedYear) {
         const previousYear = String(parseInt(selectedYear) - 1);
-        const metrics = [...new Set(data.map(d => d.metric))];
         
-        return metrics.map(metric => {
-            // Get all entries for this metric in the selected year and previous year
-            const currentYearEntries = data.filter(d => d.fiscal_year === selectedYear && d.metric === metric);
-            const previousYearEntries = data.filter(d => d.fiscal_year === previousYear && d.metric === metric);
-            
-            // Sum up values across all quarters for each year
-            const currentValue = currentYearEntries.reduce((sum, entry) => sum + (parseFloat(entry.value) || 0), 0);
-            const previousValue = previousYearEntries.reduce((sum, entry) => sum + (parseFloat(entry.value) || 0), 0);
+        return metrics.map(({ metric, values }) => {
+            // Yearly totals of this metric for the selected year and previous year
+            const currentValue = values.find(v => v.year === selectedYear)?.value || 0;
+            const previousValue = values.find(v => v.year === previousYear)?.value || 0;
             
             // Calculate target as previous year + 5%
             const target = previousValue>0?previousValue * 1.05:0.05;
@@ -0,0 +1,402 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: local storage is then only safe within one process
+    fcntl = None
+
+
+class BlobNotFound(Exception):
+    """The named object does not exist."""
+
+
+class PreconditionFailed(Exception):
+    """A conditional put found a different version than the one it was given."""
+
+
+class BlobSealed(Exception):
+    """The append object was sealed and accepts no more data."""
+
+
+class Blob:
+    """Contents and properties of a stored object; ``data`` is None when only the properties were fetched."""
+
+    def __init__(self, data, etag, last_modified=None, metadata=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.metadata = metadata or {}
+
+
+class BufferWriter(io.RawIOBase):
+    """Seekable stream writing into one preallocated bytearray.
+
+    Parallel ranged downloads seek to each chunk's offset and write it in
+    place, so the body is never copied into a growing buffer.
+    """
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.buffer)
+        self.position = offset
+        return offset
+
+    def write(self, data):
+        size = len(data)
+        self.view[self.position:self.position + size] = data
+        self.position += size
+        return size
+
+    def getvalue(self):
+        self.view.release()
+        return self.buffer
+
+
+class AzureBlobStorage:
+    """Objects in one Azure Blob Storage container.
+
+    One BlobServiceClient and container client are kept per process, so every
+    call goes through the same pooled HTTP session instead of opening new
+    connections. The clients are created lazily and again after a fork, as
+    gunicorn workers must not share sockets with their parent.
+
+    Downloads are split into ``chunk_size`` ranges fetched ``concurrency`` at
+    a time, all pinned to the ETag of the first, and written straight into a
+    buffer sized from the first response.
+    """
+
+    def __init__(self, connection_string, container_name, pool_size=16, chunk_size=4 * 1024 * 1024, concurrency=4):
+        self.connection_string = connection_string
+        self.container_name = container_name
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self._container = None
+        self._pid = None
+
+    @property
+    def container(self):
+        if self._container is None or self._pid != os.getpid():
+            with self.lock:
+                if self._container is None or self._pid != os.getpid():
+                    self._container = self._connect()
+                    self._pid = os.getpid()
+        return self._container
+
+    def _connect(self):
+        import requests
+        from azure.core.pipeline.transport import RequestsTransport
+        from azure.storage.blob import BlobServiceClient
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        service = BlobServiceClient.from_connection_string(
+            self.connection_string, transport=RequestsTransport(session=session, session_owner=False),
+            max_single_get_size=self.chunk_size, max_chunk_get_size=self.chunk_size)
+        return service.get_container_client(self.container_name)
+
+    def blob_client(self, name):
+        return self.container.get_blob_client(name)
+
+    def _download(self, name, **conditions):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            # The first range comes back with the blob size; the rest are fetched in parallel
+            stream = self.blob_client(name).download_blob(max_concurrency=self.concurrency, **conditions)
+        except ResourceNotFoundError:
+            raise BlobNotFound(name)
+        writer = BufferWriter(stream.size)
+        stream.readinto(writer)
+        properties = stream.properties
+        return Blob(writer.getvalue(), properties.etag, properties.last_modified, properties.metadata)
+
+    def get(self, name):
+        return self._download(name)
+
+    def get_if_changed(self, name, etag):
+        # One round trip: the service answers 304 when ``etag`` is still current
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceNotModifiedError
+        if etag is None:
+            return self.get(name)
+        try:
+            return self._download(name, etag=etag, match_condition=MatchConditions.IfModified)
+        except ResourceNotModifiedError:
+            return None
+
+    def properties(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            properties = self.blob_client(name).get_blob_properties()
+        except ResourceNotFoundError:
+            raise BlobNotFound(name)
+        return Blob(None, properties.etag, properties.last_modified, properties.metadata)
+
+    def put(self, name, data, metadata=None, if_match=None, if_none_match=None):
+        # if_none_match='*' only creates the object, failing when it already exists
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+        conditions = {}
+        if if_match:
+            conditions = {'etag': if_match, 'match_condition': MatchConditions.IfNotModified}
+        elif if_none_match == '*':
+            conditions = {'etag': '*', 'match_condition': MatchConditions.IfMissing}
+        try:
+            result = self.blob_client(name).upload_blob(data, overwrite=True, metadata=metadata or None,
+                                                        **conditions)
+        except ResourceModifiedError:
+            raise PreconditionFailed(f"{name} changed since version {if_match}")
+        except ResourceExistsError:
+            raise PreconditionFailed(f"{name} already exists")
+        return Blob(None, result.get('etag'), result.get('last_modified'), metadata)
+
+    def list_blobs(self, prefix):
+        # {name: properties} of every blob under ``prefix``, from one listing call
+        return {blob.name: Blob(None, blob.etag, blob.last_modified, blob.metadata)
+                for blob in self.container.list_blobs(name_starts_with=prefix, include=['metadata'])}
+
+    def read_from(self, name, offset):
+        # Bytes of an append object from ``offset`` on; empty when missing or fully read
+        from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+        try:
+            return self.blob_client(name).download_blob(offset=offset).readall()
+        except ResourceNotFoundError:
+            return b''
+        except HttpResponseError as e:
+            # Asking for a range that starts at the end of the blob
+            if e.status_code == 416:
+                return b''
+            raise
+
+    def append(self, name, data):
+        from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+        blob_client = self.blob_client(name)
+        try:
+            try:
+                blob_client.append_block(data)
+            except ResourceNotFoundError:
+                try:
+                    blob_client.create_append_blob(if_none_match='*')
+                except HttpResponseError:
+                    pass  # created by another writer in the meantime
+                blob_client.append_block(data)
+        except HttpResponseError as e:
+            if e.error_code == 'BlobIsSealed':
+                raise BlobSealed(name)
+            raise
+
+    def seal(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        blob_client = self.blob_client(name)
+        try:
+            blob_client.seal_append_blob()
+        except ResourceNotFoundError:
+            blob_client.create_append_blob(if_none_match='*')
+            blob_client.seal_append_blob()
+
+    def is_sealed(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return bool(self.blob_client(name).get_blob_properties().is_append_blob_sealed)
+        except ResourceNotFoundError:
+            return False
+
+    def exists(self, name):
+        return self.blob_client(name).exists()
+
+    def delete(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            self.blob_client(name).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+
+class LocalStorage:
+    """Objects kept as files under ``root``, with the same semantics as Azure.
+
+    Every replacement writes a new file, with an mtime later than the one it
+    replaces, and renames it into place, so the ETag (derived from the file's
+    identity and mtime) changes on each put and nowhere else. Metadata lives in a ``.meta.json`` file beside the data and
+    sealing is marked by a ``.sealed`` file. A lock file per object, held
+    shared for reads and exclusive for writes, keeps conditional puts and
+    appends atomic across processes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    @contextmanager
+    def locked(self, name, exclusive):
+        path = self.path(name)
+        if not exclusive and not os.path.exists(path):
+            # Nothing to read: leave no lock file behind for an object that
+            # does not exist (journal readers probe the next segment this way)
+            yield path
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield path
+
+    @staticmethod
+    def etag(stat):
+        token = f"{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}".encode('ascii')
+        return '"' + hashlib.md5(token).hexdigest() + '"'
+
+    def _blob(self, path, stat, data):
+        metadata = {}
+        if os.path.exists(path + '.meta.json'):
+            with open(path + '.meta.json') as f:
+                metadata = json.load(f)
+        last_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        return Blob(data, self.etag(stat), last_modified, metadata)
+
+    def _current_etag(self, path):
+        try:
+            return self.etag(os.stat(path))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _advance_mtime(new_path, path):
+        # A replacement within the filesystem's timestamp tick can reuse the
+        # old file's inode and size; keep mtimes strictly increasing per object
+        # so its ETag still changes
+        try:
+            previous = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        stat = os.stat(new_path)
+        if stat.st_mtime_ns <= previous:
+            os.utime(new_path, ns=(stat.st_atime_ns, previous + 1))
+
+    def get(self, name):
+        return self.get_if_changed(name, None)
+
+    def get_if_changed(self, name, etag):
+        with self.locked(name, exclusive=False) as path:
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                raise BlobNotFound(name)
+            with f:
+                stat = os.fstat(f.fileno())
+                if etag is not None and self.etag(stat) == etag:
+                    return None
+                data = bytearray(stat.st_size)
+                f.readinto(data)
+                return self._blob(path, stat, data)
+
+    def properties(self, name):
+        with self.locked(name, exclusive=False) as path:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                raise BlobNotFound(name)
+            return self._blob(path, stat, None)
+
+    def put(self, name, data, metadata=None, if_match=None, if_none_match=None):
+        with self.locked(name, exclusive=True) as path:
+            if if_match and self._current_etag(path) != if_match:
+                raise PreconditionFailed(f"{name} changed since version {if_match}")
+            if if_none_match == '*' and os.path.exists(path):
+                raise PreconditionFailed(f"{name} already exists")
+            directory = os.path.dirname(path) or '.'
+            with tempfile.NamedTemporaryFile('wb', dir=directory, prefix='.tmp-', delete=False) as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._advance_mtime(f.name, path)
+            if metadata:
+                with open(path + '.meta.json', 'w') as meta:
+                    json.dump(metadata, meta)
+            elif os.path.exists(path + '.meta.json'):
+                os.remove(path + '.meta.json')
+            os.replace(f.name, path)
+            return self._blob(path, os.stat(path), None)
+
+    def list_blobs(self, prefix):
+        blobs = {}
+        # Walk only the directory the prefix names, not the whole root
+        directory = self.path(prefix.rpartition('/')[0]) if '/' in prefix else self.root
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.startswith('.tmp-') or filename.endswith(('.lock', '.meta.json', '.sealed')):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not name.startswith(prefix):
+                    continue
+                try:
+                    blobs[name] = self._blob(path, os.stat(path), None)
+                except FileNotFoundError:
+                    pass  # replaced or deleted while listing
+        return blobs
+
+    def read_from(self, name, offset):
+        with self.locked(name, exclusive=False) as path:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    return f.read()
+            except FileNotFoundError:
+                return b''
+
+    def append(self, name, data):
+        with self.locked(name, exclusive=True) as path:
+            if os.path.exists(path + '.sealed'):
+                raise BlobSealed(name)
+            with open(path, 'ab') as f:
+                f.write(data)
+
+    def seal(self, name):
+        with self.locked(name, exclusive=True) as path:
+            open(path + '.sealed', 'a').close()
+
+    def is_sealed(self, name):
+        return os.path.exists(self.path(name) + '.sealed')
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def delete(self, name):
+        with self.locked(name, exclusive=True) as path:
+            for suffix in ('', '.meta.json', '.sealed'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        # The lock file goes last, once no one holds it
+        try:
+            os.remove(self.path(name) + '.lock')
+        except FileNotFoundError:
+            pass
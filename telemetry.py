@@ -0,0 +1,154 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; Prometheus' default buckets stretched to cover multi-second workbook loads
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Timing:
+    """Phase durations collected for one request (or one background task)."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.stack = []
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total):
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(entries)
+
+    def breakdown(self):
+        return ' '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.phases.items())
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Telemetry:
+    """Per-process timing histograms by route and phase, rendered for Prometheus.
+
+    A request is bracketed by ``start_request``/``finish_request``; code in
+    between marks its phases with ``with telemetry.phase('download'):``.
+    Phases are exclusive: while a nested phase runs, its parent's clock is
+    paused, so the phases of a request add up to at most its total. Phases
+    run outside a request (writer or compaction threads) are recorded under
+    the thread's name as their route.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.requests = {}   # route -> Histogram
+        self.phases = {}     # (route, phase) -> Histogram
+
+    def start_request(self, route):
+        self.local.timing = Timing(route)
+
+    def finish_request(self):
+        # Returns the request's Timing and its total duration in seconds
+        timing = getattr(self.local, 'timing', None)
+        self.local.timing = None
+        if timing is None:
+            return None, 0.0
+        total = time.perf_counter() - timing.started
+        with self.lock:
+            self._histogram(self.requests, timing.route).observe(total)
+            for name, seconds in timing.phases.items():
+                self._histogram(self.phases, (timing.route, name)).observe(seconds)
+        return timing, total
+
+    def current_route(self):
+        timing = getattr(self.local, 'timing', None)
+        return timing.route if timing is not None else threading.current_thread().name
+
+    @contextmanager
+    def phase(self, name):
+        timing = getattr(self.local, 'timing', None)
+        standalone = timing is None
+        if standalone:
+            timing = self.local.timing = Timing(threading.current_thread().name)
+        now = time.perf_counter()
+        if timing.stack:
+            parent = timing.stack[-1]
+            timing.add(parent[0], now - parent[1])
+        entry = [name, now]
+        timing.stack.append(entry)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            timing.stack.pop()
+            timing.add(name, now - entry[1])
+            if timing.stack:
+                timing.stack[-1][1] = now
+            if standalone:
+                self.local.timing = None
+                self.observe_phases(timing.route, timing.phases)
+
+    def observe_phases(self, route, phases):
+        with self.lock:
+            for name, seconds in phases.items():
+                self._histogram(self.phases, (route, name)).observe(seconds)
+
+    @staticmethod
+    def _histogram(histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        return histogram
+
+    def render(self, gauges=()):
+        """Prometheus text exposition of the histograms plus ``gauges``.
+
+        ``gauges`` is a list of (name, help, value) or (name, help, value, type).
+        """
+        lines = []
+        with self.lock:
+            lines += self._render_histograms('app_request_duration_seconds', 'Request duration by route',
+                                             {(('route', route),): h for route, h in self.requests.items()})
+            lines += self._render_histograms('app_phase_duration_seconds', 'Time spent per phase of a request',
+                                             {(('route', route), ('phase', phase)): h
+                                              for (route, phase), h in self.phases.items()})
+        for gauge in gauges:
+            name, help_text, value = gauge[:3]
+            metric_type = gauge[3] if len(gauge) > 3 else 'gauge'
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(name, help_text, histograms):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, histogram in sorted(histograms.items()):
+            label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+        return lines
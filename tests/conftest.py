@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+BLOB_NAME = 'CareerCenterMetrics.xlsx'
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """app.py on local storage over a generated 500-row workbook, imported once per test run."""
+    pytest.importorskip('flask')
+    pytest.importorskip('openpyxl')
+    from generate_workbook import write_workbook
+
+    workdir = tmp_path_factory.mktemp('workbook')
+    write_workbook(str(workdir / BLOB_NAME), 500)
+    os.environ.update({
+        'WORKBOOK_STORAGE': 'local',
+        'WORKBOOK_STORAGE_PATH': str(workdir),
+        'AZURE_BLOB_NAME': BLOB_NAME,
+        'WORKBOOK_JOURNAL': '',
+        'WORKBOOK_LAYOUT': 'workbook',
+        'WORKBOOK_SNAPSHOT_DIR': '',
+        'WORKBOOK_PREFETCH': '0',
+        'WORKBOOK_CACHE_MAX_STALENESS': '0',
+        'WRITE_BATCH_WINDOW': '0',
+    })
+    import app
+    app.app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,34 @@
+from test_write_path import XHR, submission
+
+
+def bootstrap(client, since=None):
+    return client.get('/api/bootstrap', query_string={'since': since} if since else {}).get_json()
+
+
+def test_unchanged_data_is_not_sent_again(client):
+    first = bootstrap(client)
+    assert first['full'] and first['modified']
+    assert 'aggregates' in first and 'categories' in first
+
+    again = bootstrap(client, first['version'])
+    assert again == {'version': first['version'], 'full': False, 'modified': False}
+
+
+def test_version_holds_across_workers_and_restarts(app_module, client):
+    version = bootstrap(client)['version']
+    # What another worker, or this one after a restart, starts with: its own change feed and no cache
+    app_module.change_feed.after_fork()
+    app_module.change_feed.publish('change', {'changes': []})
+    app_module.workbook_cache.invalidate()
+
+    assert bootstrap(client, version)['modified'] is False
+
+
+def test_a_write_sends_the_full_payload(client):
+    version = bootstrap(client)['version']
+    assert client.post('/form', headers=XHR, data=submission('2038', 4)).get_json()['success'] is True
+
+    after = bootstrap(client, version)
+    assert after['version'] != version
+    assert after['full'] and after['modified']
+    assert '2038' in after['fiscal_years']
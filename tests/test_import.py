@@ -0,0 +1,79 @@
+import io
+
+from generate_workbook import CATEGORIES, metric_name
+
+from importer import read_csv, validate_rows
+
+HEADER = 'fiscal_year,quarter,start_date,end_date,category,metric,value,target\n'
+CATEGORIES_AND_METRICS = {'Workshops': ['Attendance', 'Sessions Held']}
+
+
+def csv_row(fiscal_year, quarter, category, metric, value, start='2034-07-01', end='2034-09-30'):
+    return f'{fiscal_year},{quarter},{start},{end},{category},{metric},{value},\n'
+
+
+def validate(text):
+    return validate_rows(read_csv((HEADER + text).encode()), CATEGORIES_AND_METRICS)
+
+
+def test_each_row_reports_its_own_errors():
+    valid, report = validate(csv_row('2034', 'Q1', 'Workshops', 'Attendance', 5)
+                             + csv_row('2034', 'Q5', 'Workshops', 'Attendance', 'x')
+                             + csv_row('2034', 'Q1', 'Workshops', 'Tours', 5, start='2034-10-01')
+                             + csv_row('2034', 'Q1', 'Careers', 'Attendance', 5, end='2034/09/30')
+                             + ',,,,,,,\n')
+    assert [row['row'] for row in valid] == [2]
+    assert valid[0]['value'] == 5.0 and valid[0]['target'] is None
+    assert [entry['row'] for entry in report] == [2, 3, 4, 5]
+    assert report[1]['errors'] == ['quarter must be one of Q1, Q2, Q3, Q4', 'value is not a number']
+    assert report[2]['errors'] == ['unknown metric Tours for Workshops', 'start_date is after end_date']
+    assert report[3]['errors'] == ['unknown category Careers', 'end_date must be formatted YYYY-MM-DD']
+
+
+def test_duplicate_keys_within_one_file_are_caught():
+    valid, report = validate(csv_row('2034', 'Q1', 'Workshops', 'Attendance', 5)
+                             + csv_row('2034', 'Q1', 'Workshops', 'Sessions Held', 6)
+                             + csv_row('2034', 'Q1', 'Workshops', 'Attendance', 7))
+    assert [entry['status'] for entry in report] == ['valid', 'valid', 'invalid']
+    assert report[2]['errors'] == ['same fiscal_year, quarter, category and metric as row 2']
+    assert len(valid) == 2
+
+
+def post_import(client, text):
+    data = {'file': (io.BytesIO((HEADER + text).encode()), 'metrics.csv')}
+    return client.post('/api/import', data=data, content_type='multipart/form-data')
+
+
+def test_one_bad_row_rejects_the_whole_import(client):
+    before = client.get('/get_metrics_data')
+    category = CATEGORIES[0]
+    response = post_import(client, csv_row('2035', 'Q1', category, metric_name(0), 5)
+                           + csv_row('2035', 'Q2', category, metric_name(1), 6)
+                           + csv_row('2035', 'Q3', category, 'No Such Metric', 7))
+    assert response.status_code == 422
+    result = response.get_json()
+    assert result['success'] is False
+    assert (result['invalid'], result['added'], result['updated']) == (1, 0, 0)
+
+    after = client.get('/get_metrics_data', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 304
+    assert client.get('/get_metrics_data', query_string={'fiscal_year': '2035'}).get_json() == []
+
+
+def test_duplicate_keys_reject_the_whole_import(client):
+    category = CATEGORIES[0]
+    response = post_import(client, csv_row('2036', 'Q1', category, metric_name(0), 5)
+                           + csv_row('2036', 'Q1', category, metric_name(0), 6))
+    assert response.status_code == 422
+    assert response.get_json()['report'][1]['status'] == 'invalid'
+    assert client.get('/get_metrics_data', query_string={'fiscal_year': '2036'}).get_json() == []
+
+
+def test_valid_import_is_written(client):
+    category = CATEGORIES[0]
+    response = post_import(client, csv_row('2037', 'Q1', category, metric_name(0), 5)
+                           + csv_row('2037', 'Q2', category, metric_name(0), 6))
+    assert response.status_code == 200
+    assert response.get_json()['added'] == 2
+    values = client.get('/get_metrics_data', query_string={'fiscal_year': '2037'}).get_json()
+    assert sorted(record['value'] for record in values) == [5, 6]
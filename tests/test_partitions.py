@@ -0,0 +1,77 @@
+import pytest
+
+from generate_workbook import generate_metrics_and_categories, generate_rows
+from partitions import STAGING_HEADER, PartitionedStorage
+from staging import DATE_COLUMNS, StagingStore
+from storage import LocalStorage
+from writer import WriteQueue
+
+pytest.importorskip('openpyxl')
+
+
+@pytest.fixture
+def partitioned(tmp_path):
+    target = PartitionedStorage(LocalStorage(str(tmp_path)), 'CareerCenterMetrics/')
+    target.split([STAGING_HEADER] + [list(row) for row in generate_rows(400)],
+                 [['Category', 'Metric', 'Group']] + [list(row) for row in generate_metrics_and_categories(400)])
+    return target
+
+
+def read_values(target, fiscal_year):
+    # Value column of a partition as uploaded
+    _, wb = PartitionedStorage(target.storage, target.prefix).fetch(None)
+    rows = wb.partitions[fiscal_year].wb.rows("StagingData", columns=range(8), date_columns=DATE_COLUMNS)
+    return [values[6] for _, values in rows]
+
+
+def test_split_keeps_every_row(partitioned):
+    _, wb = partitioned.fetch(None)
+    stores = [StagingStore.from_rows(wb.partitions[fiscal_year].wb.rows("StagingData", columns=range(8),
+                                                                         date_columns=DATE_COLUMNS))
+              for fiscal_year in sorted(wb.partitions)]
+    assert len(StagingStore.concat(stores).select()) == 400
+
+
+def test_failed_batch_does_not_reach_the_next_upload(partitioned):
+    _, wb = partitioned.fetch(None)
+    fiscal_year = sorted(wb.partitions)[-1]
+    before = read_values(partitioned, fiscal_year)
+    loaded = {}
+
+    def load():
+        # What the app does: a cached workbook, fetched again only after a reset
+        if 'wb' not in loaded:
+            loaded['wb'] = partitioned.fetch(None)[1]
+        return loaded['wb'], None, None
+
+    def apply(wb, store, operation):
+        sheet = wb.staging_sheet(fiscal_year)
+        if operation == 'bad':
+            sheet.cell(row=3, column=7).value = 999
+            raise ValueError('half applied')
+        sheet.cell(row=2, column=7).value = operation
+        return operation
+
+    def reset():
+        loaded.clear()
+        partitioned.invalidate()
+
+    writer = WriteQueue(load, apply, lambda wb, version: partitioned.put(wb, wb.to_bytes()), reset,
+                        batch_window=0)
+    with pytest.raises(ValueError):
+        writer.submit('bad', timeout=10)
+    assert writer.submit(5.0, timeout=10) == 5.0
+
+    after = read_values(partitioned, fiscal_year)
+    assert after[0] == 5
+    assert after[1:] == before[1:]
+
+
+def test_invalidate_keeps_partitions_no_writer_opened(partitioned):
+    _, wb = partitioned.fetch(None)
+    fiscal_years = sorted(wb.partitions)
+    wb.staging_sheet(fiscal_years[-1])
+    partitioned.invalidate()
+    kept = {partition.fiscal_year for partition in partitioned.partitions.values()}
+    assert fiscal_years[-1] not in kept
+    assert set(fiscal_years[:-1]) <= kept
@@ -0,0 +1,38 @@
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from analytics import Rollups, check_rollups  # noqa: E402
+from generate_workbook import generate_metrics_and_categories, generate_rows  # noqa: E402
+from staging import QUARTERS, StagingStore  # noqa: E402
+
+
+def random_edit(store, rows, rng):
+    # The changes form() and /api/import make: value/target updates, new rows and group deletes
+    choice = rng.random()
+    if choice < 0.4:
+        store.set_numbers(rng.randrange(len(store)), float(rng.randint(0, 500)), rng.choice([None, 100.0]))
+    elif choice < 0.8:
+        fiscal_year, _, start, end, category, metric = rows[rng.randrange(len(rows))][:6]
+        store.append_row(0, (str(int(fiscal_year) + rng.choice([0, 1])), rng.choice(QUARTERS), start, end,
+                             category, metric, rng.randint(0, 500), rng.choice([None, 250])))
+    else:
+        i = rng.randrange(len(store))
+        store.delete(store.group(store.fiscal_years[store.fiscal_year[i]], store.quarters[store.quarter[i]],
+                                 store.categories[store.category[i]]))
+
+
+def test_rollups_match_a_full_recompute_after_random_edits():
+    rows = list(generate_rows(3000))
+    metric_groups = {metric: group for _, metric, group in generate_metrics_and_categories(3000)}
+    for seed in range(3):
+        store = StagingStore.from_rows(enumerate(rows, 2))
+        rollups = Rollups.from_store(store)
+        rng = random.Random(seed)
+        for n in range(150):
+            random_edit(store, rows, rng)
+            if n % 50 == 49:
+                assert check_rollups(store, metric_groups, rollups) == []
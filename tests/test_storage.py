@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from storage import BlobNotFound, BlobSealed, LocalStorage, PreconditionFailed
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorage(str(tmp_path))
+
+
+def test_if_match_rejects_a_stale_etag(storage):
+    first = storage.put('book.xlsx', b'one')
+    second = storage.put('book.xlsx', b'two', if_match=first.etag)
+    with pytest.raises(PreconditionFailed):
+        storage.put('book.xlsx', b'three', if_match=first.etag)
+    assert bytes(storage.get('book.xlsx').data) == b'two'
+    assert storage.get('book.xlsx').etag == second.etag
+
+
+def test_if_none_match_rejects_an_existing_object(storage):
+    storage.put('book.xlsx', b'one', if_none_match='*')
+    with pytest.raises(PreconditionFailed):
+        storage.put('book.xlsx', b'two', if_none_match='*')
+    assert bytes(storage.get('book.xlsx').data) == b'one'
+
+
+def test_etag_changes_on_every_put(storage):
+    etags = [storage.put('book.xlsx', b'same size').etag for _ in range(50)]
+    assert len(set(etags)) == len(etags)
+    assert storage.get_if_changed('book.xlsx', etags[-1]) is None
+    assert storage.get_if_changed('book.xlsx', etags[-2]).etag == etags[-1]
+
+
+def test_put_within_one_timestamp_tick_still_changes_the_etag(storage):
+    storage.put('book.xlsx', b'one')
+    path = storage.path('book.xlsx')
+    # The mtime a coarse clock would give the next write too
+    tick = os.stat(path).st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(tick, tick))
+    before = storage.properties('book.xlsx').etag
+
+    after = storage.put('book.xlsx', b'two')
+    assert os.stat(path).st_mtime_ns > tick
+    assert after.etag != before
+
+
+def test_append_until_sealed(storage):
+    assert storage.read_from('journal/0001', 0) == b''
+    storage.append('journal/0001', b'first\n')
+    storage.append('journal/0001', b'second\n')
+    assert storage.read_from('journal/0001', 0) == b'first\nsecond\n'
+    assert storage.read_from('journal/0001', len(b'first\n')) == b'second\n'
+
+    storage.seal('journal/0001')
+    assert storage.is_sealed('journal/0001')
+    with pytest.raises(BlobSealed):
+        storage.append('journal/0001', b'third\n')
+    assert storage.read_from('journal/0001', 0) == b'first\nsecond\n'
+    assert list(storage.list_blobs('journal/')) == ['journal/0001']
+
+
+def test_delete_removes_the_object_and_its_side_files(storage):
+    storage.put('journal/0001', b'data', metadata={'kind': 'segment'})
+    storage.seal('journal/0001')
+    storage.delete('journal/0001')
+    assert not storage.exists('journal/0001')
+    assert os.listdir(os.path.dirname(storage.path('journal/0001'))) == []
+    with pytest.raises(BlobNotFound):
+        storage.get('journal/0001')
@@ -0,0 +1,46 @@
+from generate_workbook import CATEGORIES, metric_name
+
+XHR = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def submission(fiscal_year, value):
+    return {
+        'fiscal_year': fiscal_year, 'quarter': 'Q1', 'start_date': '2031-07-01', 'end_date': '2031-09-30',
+        'category': CATEGORIES[0], 'action': 'create', f'metrics_{metric_name(0)}': str(value),
+    }
+
+
+def test_failed_upload_leaves_readers_and_etags_on_committed_data(app_module, client, monkeypatch):
+    committed = client.get('/get_metrics_data')
+    rows = len(committed.get_json())
+    seen = {}
+
+    def failing_put(name, data, **kwargs):
+        # A reader between the apply and the upload sees the batch's rows under a version of their own
+        response = client.get('/get_metrics_data')
+        seen['rows'] = len(response.get_json())
+        seen['etag'] = response.headers['ETag']
+        raise OSError('upload failed')
+
+    monkeypatch.setattr(app_module.storage, 'put', failing_put)
+    response = client.post('/form', headers=XHR, data=submission('2031', 7))
+    monkeypatch.undo()
+
+    assert response.get_json()['success'] is False
+    assert seen['rows'] == rows + 1
+    assert seen['etag'] != committed.headers['ETag']
+
+    after = client.get('/get_metrics_data', headers={'If-None-Match': seen['etag']})
+    assert after.status_code == 200
+    assert len(after.get_json()) == rows
+    assert after.headers['ETag'] == committed.headers['ETag']
+
+
+def test_committed_write_gets_a_new_version(app_module, client):
+    before = client.get('/get_metrics_data')
+    response = client.post('/form', headers=XHR, data=submission('2032', 9))
+    assert response.get_json()['success'] is True
+
+    after = client.get('/get_metrics_data', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert len(after.get_json()) == len(before.get_json()) + 1
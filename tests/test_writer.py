@@ -0,0 +1,113 @@
+import json
+import threading
+
+import pytest
+
+from storage import LocalStorage, PreconditionFailed
+from writer import WriteConflict, WriteQueue
+
+NAME = 'entries.json'
+
+
+class Entries:
+    """A JSON list on LocalStorage, written through a WriteQueue the way app.py writes the workbook."""
+
+    def __init__(self, root, batch_window=0):
+        self.storage = LocalStorage(root)
+        self.storage.put(NAME, b'[]')
+        self.loads = 0
+        self.puts = 0
+        self.before_put = None
+        self.writer = WriteQueue(self.load, self.apply, self.save, lambda: None, batch_window=batch_window)
+
+    def load(self):
+        self.loads += 1
+        blob = self.storage.get(NAME)
+        return json.loads(bytes(blob.data)), None, blob.etag
+
+    def apply(self, entries, store, operation):
+        if operation == 'bad':
+            entries.append('half applied')
+            raise ValueError('bad operation')
+        entries.append(operation)
+        return len(entries)
+
+    def save(self, entries, version):
+        if self.before_put is not None:
+            self.before_put()
+        try:
+            self.storage.put(NAME, json.dumps(entries).encode(), if_match=version)
+        except PreconditionFailed as e:
+            raise WriteConflict(str(e))
+        self.puts += 1
+
+    def stored(self):
+        return json.loads(bytes(self.storage.get(NAME).data))
+
+
+def test_etag_changed_between_read_and_put_retries(tmp_path):
+    entries = Entries(str(tmp_path))
+
+    def someone_else_writes():
+        # Only once: the retry must then go through
+        entries.before_put = None
+        entries.storage.put(NAME, json.dumps(['theirs']).encode())
+
+    entries.before_put = someone_else_writes
+    assert entries.writer.submit('ours', timeout=10) == 2
+    assert entries.stored() == ['theirs', 'ours']
+    assert entries.writer.stats()['conflicts'] == 1
+    assert entries.loads == 2
+
+
+def test_conflicts_past_max_retries_fail_the_batch(tmp_path):
+    entries = Entries(str(tmp_path))
+    entries.before_put = lambda: entries.storage.put(NAME, b'["theirs"]')
+    with pytest.raises(WriteConflict):
+        entries.writer.submit('ours', timeout=10)
+    assert entries.stored() == ['theirs']
+
+
+def test_failed_operation_fails_only_its_caller(tmp_path):
+    entries = Entries(str(tmp_path), batch_window=0.5)
+    results = {}
+    barrier = threading.Barrier(3)
+
+    def submit(operation):
+        barrier.wait()
+        try:
+            results[operation] = entries.writer.submit(operation, timeout=10)
+        except Exception as e:
+            results[operation] = e
+
+    threads = [threading.Thread(target=submit, args=(operation,)) for operation in ('a', 'bad', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert isinstance(results['bad'], ValueError)
+    assert sorted(entries.stored()) == ['a', 'b']
+    assert sorted([results['a'], results['b']]) == [1, 2]
+    assert entries.puts == 1
+
+
+def test_concurrent_submissions_coalesce_into_one_upload(tmp_path):
+    entries = Entries(str(tmp_path), batch_window=0.5)
+    operations = [f'entry-{n}' for n in range(8)]
+    barrier = threading.Barrier(len(operations))
+
+    def submit(operation):
+        barrier.wait()
+        entries.writer.submit(operation, timeout=10)
+
+    threads = [threading.Thread(target=submit, args=(operation,)) for operation in operations]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(entries.stored()) == operations
+    assert entries.puts == 1
+    assert entries.writer.stats()['batches'] == 1
+    assert entries.writer.stats()['operations'] == len(operations)
@@ -0,0 +1,68 @@
+import io
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from staging import DATE_COLUMNS, StagingStore  # noqa: E402
+from xlsx_reader import XlsxReader  # noqa: E402
+
+HEADER = ["fiscal_year", "quarter", "start_date", "end_date", "category", "metric", "value", "target"]
+
+
+def cell(column, row, value):
+    ref = f"{column}{row}"
+    if isinstance(value, str):
+        return f'<c r="{ref}" t="inlineStr"><is><t>{value}</t></is></c>'
+    return f'<c r="{ref}"><v>{value}</v></c>'
+
+
+def make_xlsx(rows, dimension=None):
+    # A one-sheet StagingData workbook; like openpyxl's write-only mode, no <dimension> unless given
+    sheet_rows = ''.join(
+        f'<row r="{r}">' + ''.join(cell(chr(65 + i), r, value) for i, value in enumerate(values) if value is not None)
+        + '</row>'
+        for r, values in enumerate(rows, 1))
+    dimension = f'<dimension ref="{dimension}"/>' if dimension else ''
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    relationships = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    package = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, 'w') as z:
+        z.writestr('xl/workbook.xml', f'<workbook xmlns="{main}" xmlns:r="{relationships}"><sheets>'
+                                      f'<sheet name="StagingData" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels', f'<Relationships xmlns="{package}">'
+                                                 f'<Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+                                                 f'</Relationships>')
+        z.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{main}">{dimension}'
+                                               f'<sheetData>{sheet_rows}</sheetData></worksheet>')
+    return stream.getvalue()
+
+
+ROWS = [
+    HEADER,
+    ["2025", "Q1", 45474, 45565, "Employer Relations", "Job Postings", 120, 100],
+    ["2025", "Q1", 45474, 45565, "Employer Relations", "Career Fairs", 3, None],
+    ["2025", "Q2", 45566, 45657, "Employer Relations", "Job Postings", 80, None],
+]
+
+
+def test_rows_without_dimension_keep_empty_trailing_cells():
+    reader = XlsxReader(make_xlsx(ROWS))
+    rows = [values for _, values in reader.rows("StagingData")]
+    assert [len(values) for values in rows] == [8, 8, 8]
+    assert rows[1][7] is None
+
+
+def test_rows_are_padded_to_the_requested_columns():
+    reader = XlsxReader(make_xlsx(ROWS[2:]))
+    rows = [values for _, values in reader.rows("StagingData", columns=range(8), min_row=1)]
+    assert [len(values) for values in rows] == [8, 8]
+
+
+def test_rows_without_target_stay_valid():
+    for dimension in (None, 'A1:H4'):
+        reader = XlsxReader(make_xlsx(ROWS, dimension))
+        store = StagingStore.from_rows(reader.rows("StagingData", columns=range(8), date_columns=DATE_COLUMNS))
+        assert len(store.select()) == 3
@@ -0,0 +1,123 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class WriteConflict(Exception):
+    """The stored workbook changed since it was loaded (ETag precondition failed)."""
+
+
+class WriteQueue:
+    """Coalesces workbook edits into batches applied by one writer thread.
+
+    Callers ``submit`` an operation and block on its result. The writer thread
+    takes everything queued within ``batch_window`` seconds, applies it to a
+    single loaded workbook and saves once. ``load()`` returns ``(wb, store,
+    version)``, ``apply(wb, store, operation)`` performs one edit and returns
+    its result, and ``save(wb, version)`` uploads conditionally, raising
+    WriteConflict when someone else wrote first. Conflicts and failed
+    operations restart the batch from a fresh copy via ``reset()``.
+    """
+
+    def __init__(self, load, apply, save, reset, batch_window=0.05, max_retries=3):
+        self.load = load
+        self.apply = apply
+        self.save = save
+        self.reset = reset
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.pending = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.conflicts = 0
+
+    def submit(self, operation, timeout=None):
+        future = Future()
+        self.pending.put((operation, future))
+        self._ensure_thread()
+        return future.result(timeout)
+
+    def _ensure_thread(self):
+        # Started lazily so forked gunicorn workers each get their own writer
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='workbook-writer', daemon=True)
+                self.thread.start()
+
+    def _next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.batch_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.exception("Workbook write failed")
+                self.reset()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(self, batch):
+        attempts = 0
+        while batch:
+            wb, store, version = self.load()
+            results = []
+            failed = None
+            for operation, future in batch:
+                try:
+                    results.append(self.apply(wb, store, operation))
+                except Exception as e:
+                    failed = (operation, future, e)
+                    break
+
+            if failed is not None:
+                # The workbook may hold part of the failed edit: drop it and
+                # replay the rest of the batch on a clean copy
+                operation, future, error = failed
+                future.set_exception(error)
+                batch = [item for item in batch if item[1] is not future]
+                self.reset()
+                continue
+
+            try:
+                self.save(wb, version)
+            except WriteConflict:
+                self.conflicts += 1
+                attempts += 1
+                self.reset()
+                if attempts > self.max_retries:
+                    raise
+                logger.info("Workbook changed during write, retrying batch of %d", len(batch))
+                continue
+
+            self.batches += 1
+            self.operations += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            return
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'operations': self.operations,
+            'conflicts': self.conflicts,
+            'pending': self.pending.qsize(),
+        }
@@ -0,0 +1,230 @@
+import io
+import posixpath
+import re
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+EPOCH_1900 = datetime(1899, 12, 30)
+EPOCH_1904 = datetime(1904, 1, 1)
+
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def column_index(letters):
+    # 'A' -> 0, 'Z' -> 25, 'AA' -> 26
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only file over any buffer (e.g. an mmap), with its own position per reader."""
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = offset
+        return offset
+
+    def readinto(self, buffer):
+        chunk = self.view[self.position:self.position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+
+class XlsxReader:
+    """Streams rows out of selected sheets of an xlsx file.
+
+    Only the workbook index, the shared strings and the requested sheet XML
+    are read, each with ``iterparse`` so memory stays bounded by one row plus
+    the shared string table. Cell values come back as openpyxl's
+    ``data_only=True`` would give them for plain data sheets.
+    """
+
+    def __init__(self, data):
+        # A memoryview over the bytes lets mmapped snapshots be read without copying them
+        self.zip = zipfile.ZipFile(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else BufferReader(data))
+        self.sheet_paths, self.epoch = self._read_workbook()
+        self._shared_strings = None
+
+    def _read_workbook(self):
+        targets = {}
+        with self.zip.open('xl/_rels/workbook.xml.rels') as f:
+            for _, element in iterparse(f):
+                if element.tag == PACKAGE_REL_NS + 'Relationship':
+                    target = element.get('Target')
+                    if target.startswith('/'):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join('xl', target))
+                    targets[element.get('Id')] = target
+
+        sheet_paths = {}
+        epoch = EPOCH_1900
+        with self.zip.open('xl/workbook.xml') as f:
+            for _, element in iterparse(f):
+                if element.tag == MAIN_NS + 'sheet':
+                    sheet_paths[element.get('name')] = targets.get(element.get(REL_NS + 'id'))
+                elif element.tag == MAIN_NS + 'workbookPr' and element.get('date1904') in ('1', 'true'):
+                    epoch = EPOCH_1904
+        return sheet_paths, epoch
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            strings = []
+            if 'xl/sharedStrings.xml' in self.zip.namelist():
+                with self.zip.open('xl/sharedStrings.xml') as f:
+                    for _, element in iterparse(f):
+                        if element.tag == MAIN_NS + 'si':
+                            # Rich text keeps its runs in several <t> elements
+                            strings.append(''.join(t.text or '' for t in element.iter(MAIN_NS + 't')))
+                            element.clear()
+            self._shared_strings = strings
+        return self._shared_strings
+
+    def sheet_names(self):
+        return list(self.sheet_paths)
+
+    def rows(self, sheet_name, columns=None, date_columns=(), min_row=2):
+        """Yield (row_number, values) for every row of ``sheet_name`` from ``min_row``.
+
+        ``values`` is a tuple as wide as the sheet's dimension, the widest row
+        so far and the highest index in ``columns``, whichever is largest, as
+        openpyxl pads rows to the sheet's width (some writers, e.g. openpyxl's
+        write-only mode, leave the dimension out). Only the column indexes in
+        ``columns`` (all when None) are decoded, the rest are None. Numbers in
+        ``date_columns`` are Excel serial dates and come back as datetimes.
+        Blank rows are skipped.
+        """
+        path = self.sheet_paths.get(sheet_name)
+        if path is None:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        wanted = set(columns) if columns is not None else None
+        date_columns = set(date_columns)
+        shared_strings = None
+        width = max(wanted) + 1 if wanted else 0
+        sheet_data = None
+
+        with self.zip.open(path) as f:
+            for event, element in iterparse(f, events=('start', 'end')):
+                tag = element.tag
+                if event == 'start':
+                    if tag == MAIN_NS + 'sheetData':
+                        sheet_data = element
+                    elif tag == MAIN_NS + 'dimension':
+                        match = CELL_REF.match(element.get('ref', '').split(':')[-1])
+                        if match:
+                            width = max(width, column_index(match.group(1)) + 1)
+                    continue
+                if tag != MAIN_NS + 'row':
+                    continue
+
+                row_number = int(element.get('r'))
+                # Drop finished rows from the tree so memory does not grow with the sheet
+                if sheet_data is not None:
+                    sheet_data.clear()
+                if row_number < min_row:
+                    continue
+
+                cells = {}
+                position = -1
+                for cell in element.iter(MAIN_NS + 'c'):
+                    ref = cell.get('r')
+                    position = column_index(CELL_REF.match(ref).group(1)) if ref else position + 1
+                    if wanted is not None and position not in wanted:
+                        continue
+                    cell_type = cell.get('t', 'n')
+                    if cell_type == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(MAIN_NS + 't'))
+                    else:
+                        v = cell.find(MAIN_NS + 'v')
+                        if v is None or v.text is None:
+                            continue
+                        text = v.text
+                        if cell_type == 's':
+                            if shared_strings is None:
+                                shared_strings = self.shared_strings
+                            value = shared_strings[int(text)]
+                        elif cell_type == 'n':
+                            value = float(text) if any(c in text for c in '.eE') else int(text)
+                            if position in date_columns:
+                                value = self.epoch + timedelta(days=value)
+                        elif cell_type == 'b':
+                            value = text == '1'
+                        elif cell_type == 'd':
+                            value = datetime.fromisoformat(text)
+                        else:
+                            value = text
+                    cells[position] = value
+
+                if not cells:
+                    continue
+                # A row with empty trailing cells keeps the width of the rows before it
+                width = max(width, max(cells) + 1)
+                yield row_number, tuple(cells.get(i) for i in range(width))
+
+
+class LazyWorkbook:
+    """A downloaded workbook: raw xlsx bytes, parsed fully by openpyxl only on demand.
+
+    Reads go through ``rows()``, the streaming reader; writers index sheets
+    with ``wb[name]`` as on an openpyxl workbook, which triggers the full
+    parse. ``to_bytes()`` serializes the edited workbook and makes those
+    bytes the new ``data``.
+    """
+
+    def __init__(self, data, workbook=None):
+        # ``workbook``: an openpyxl workbook not saved yet, for which ``data`` is None
+        self.data = data
+        self._workbook = workbook
+        self._reader = None
+
+    @property
+    def workbook(self):
+        if self._workbook is None:
+            import openpyxl
+            self._workbook = openpyxl.load_workbook(io.BytesIO(self.data), data_only=True)
+        return self._workbook
+
+    @property
+    def opened(self):
+        # Parsed by openpyxl, i.e. opened by a writer: it may hold edits ``data`` does not
+        return self._workbook is not None
+
+    def __getitem__(self, sheet_name):
+        return self.workbook[sheet_name]
+
+    def rows(self, sheet_name, columns=None, date_columns=(), min_row=2):
+        if self._reader is None:
+            self._reader = XlsxReader(self.data)
+        return self._reader.rows(sheet_name, columns=columns, date_columns=date_columns, min_row=min_row)
+
+    def to_bytes(self):
+        file_stream = io.BytesIO()
+        self.workbook.save(file_stream)
+        self.data = file_stream.getvalue()
+        self._reader = None
+        return self.data